@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+"""
+Load test: replay a production-like mix of operations against excel_operations.py
+
+Each mode gets its own generated dataset (a copy of excel_operations.py next
+to a data/excel directory in a temporary folder), then N concurrent clients
+send operations at a target total rate for a fixed duration:
+- cli:   one `python excel_operations.py <operation> ...` process per call,
+         the way data-access.js calls it with EXCEL_WORKER=0
+- serve: one long-running `excel_operations.py serve` process shared by all
+         clients, the way the persistent worker is used
+
+Latency is measured from the time a call was scheduled, so calls that queue
+up behind a slow server count the wait too. Every call ends up as:
+- ok:       the operation returned a result
+- rejected: the operation answered null (e.g. completing a request the user
+            does not take part in), which real traffic also produces
+- error:    a crash, a non-zero exit, an error response or unreadable output
+
+Afterwards the workbook is checked: it must load, hold exactly the seeded
+and created requests with unique ids, decode cleanly and match its stats
+sidecar; in serve mode the served snapshot must match the file.
+
+Usage:
+    python scripts/benchmarks/load_test.py [--mode cli|serve|both] [--clients N]
+        [--rate OPS_PER_SECOND] [--duration SECONDS] [--requests ROWS]
+        [--mix operation=weight,...] [--json PATH]
+
+The default mix is 70% reads (get_requests, filter_requests), 20% state
+changes (accept, complete, abandon) and 10% creates. A rate of 0 sends
+the next call as soon as the previous one returns.
+"""
+
+import sys
+import os
+import json
+import time
+import shutil
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+import importlib.util
+import openpyxl
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPTS_DIR)
+import excel_operations
+
+DEFAULT_MIX = {
+    'get_requests': 35,
+    'filter_requests': 35,
+    'accept_request': 8,
+    'complete_request': 6,
+    'abandon_request': 6,
+    'create_request': 10
+}
+DEPARTMENTS = ['IT', 'HR', 'Finance', 'Operations']
+USER_COUNT = 200
+CALL_TIMEOUT = 300
+
+def make_dataset(directory, request_count):
+    """Lay out a scripts/ + data/excel/ tree with generated users and requests.
+
+    Returns the path of the excel_operations.py copy and the seeded ids.
+    """
+    scripts_dir = os.path.join(directory, 'scripts')
+    excel_dir = os.path.join(directory, 'data', 'excel')
+    os.makedirs(scripts_dir)
+    os.makedirs(excel_dir)
+    script = os.path.join(scripts_dir, 'excel_operations.py')
+    shutil.copy(excel_operations.__file__, script)
+
+    excel_operations.write_xlsx(os.path.join(excel_dir, 'departments.xlsx'),
+                                [('id', 'name')] + [(name, name) for name in DEPARTMENTS])
+    excel_operations.write_xlsx(os.path.join(excel_dir, 'users.xlsx'),
+                                [('id', 'username', 'password', 'fullName', 'department', 'role')] +
+                                [(f"u{i}", f"user{i}", 'pw', f"User {i}", DEPARTMENTS[i % len(DEPARTMENTS)], 'user')
+                                 for i in range(USER_COUNT)])
+
+    rng = random.Random(0)
+    columns = excel_operations.REQUEST_COLUMNS
+    ids = [f"#{i:06X}" for i in range(request_count)]
+
+    def rows():
+        yield tuple(columns)
+        for i, request_id in enumerate(ids):
+            department = DEPARTMENTS[i % len(DEPARTMENTS)]
+            project = rng.random() < 0.2
+            request = {
+                'id': request_id,
+                'title': f"Request {i}",
+                'description': 'Generated load test request',
+                'department': department,
+                'status': 'Pending',
+                'dateCreated': '01/01/2030',
+                'creator': f"user{rng.randrange(USER_COUNT)}",
+                'type': 'project' if project else 'request',
+                'multiDepartment': project,
+                'usersNeeded': 2 if project else 1,
+                'archived': False,
+                'acceptedBy': '[]',
+                'usersAccepted': 0,
+                'departments': json.dumps([department]),
+                'rejections': '[]',
+                'participantsCompleted': '[]',
+                'createdAt': '2030-01-01T09:00:00'
+            }
+            yield tuple(request.get(column) for column in columns)
+
+    excel_operations.write_xlsx(os.path.join(excel_dir, 'requests.xlsx'), rows(), 'Sheet',
+                                (request_count + 1, len(columns)))
+    return script, ids
+
+class CliTransport:
+    """Run every call as its own excel_operations.py process."""
+
+    def __init__(self, script):
+        self.script = script
+
+    def call(self, args):
+        completed = subprocess.run([sys.executable, self.script] + args, capture_output=True,
+                                   text=True, timeout=CALL_TIMEOUT)
+        if completed.returncode != 0:
+            raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip()
+                               else f"exit code {completed.returncode}")
+        return json.loads(completed.stdout)
+
+    def close(self):
+        pass
+
+class ServeTransport:
+    """Share one excel_operations.py serve process between all clients."""
+
+    def __init__(self, script):
+        self.process = subprocess.Popen([sys.executable, script, 'serve'], stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                        text=True, bufsize=1)
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.next_id = 0
+        self.reader = threading.Thread(target=self.read_responses, daemon=True)
+        self.reader.start()
+
+    def read_responses(self):
+        for line in self.process.stdout:
+            try:
+                response = json.loads(line)
+            except ValueError:
+                continue
+            with self.lock:
+                waiter = self.pending.pop(response.get('id'), None)
+            if waiter:
+                waiter['response'] = response
+                waiter['done'].set()
+
+        # The process is gone; fail everyone still waiting
+        with self.lock:
+            waiters = list(self.pending.values())
+            self.pending.clear()
+        for waiter in waiters:
+            waiter['done'].set()
+
+    def call(self, args):
+        waiter = {'done': threading.Event(), 'response': None}
+        with self.lock:
+            self.next_id += 1
+            message_id = self.next_id
+            self.pending[message_id] = waiter
+            self.process.stdin.write(json.dumps({'id': message_id, 'args': args}) + '\n')
+            self.process.stdin.flush()
+
+        if not waiter['done'].wait(CALL_TIMEOUT) or waiter['response'] is None:
+            raise RuntimeError('no response from serve process')
+        if 'error' in waiter['response']:
+            raise RuntimeError(waiter['response']['error'])
+        return waiter['response']['result']
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait(CALL_TIMEOUT)
+
+class Client(threading.Thread):
+    """One simulated user sending operations on a fixed schedule."""
+
+    def __init__(self, index, count, transport, mix, interval, deadline, shared):
+        super().__init__(daemon=True)
+        self.rng = random.Random(index + 1)
+        self.transport = transport
+        self.operations = list(mix)
+        self.weights = [mix[name] for name in self.operations]
+        self.interval = interval
+        self.deadline = deadline
+        self.shared = shared
+        self.username = f"user{index % USER_COUNT}"
+        # (request id, username) pairs this client accepted and may complete or abandon
+        self.accepted = []
+        self.samples = []
+        # Stagger the clients so they do not all fire at once
+        self.next_call = time.perf_counter() + interval * index / count
+
+    def pick_request(self):
+        with self.shared['lock']:
+            return self.rng.choice(self.shared['ids'])
+
+    def build_call(self, operation):
+        """Get (operation name, args, on_success) for the next call."""
+        if operation in ('complete_request', 'abandon_request') and not self.accepted:
+            operation = 'accept_request'
+
+        if operation == 'get_requests':
+            return operation, ['get_requests'], None
+
+        if operation == 'filter_requests':
+            filters = {'status': self.rng.choice(excel_operations.REQUEST_STATUSES),
+                       'department': self.rng.choice(DEPARTMENTS)}
+            return operation, ['filter_requests', json.dumps(filters)], None
+
+        if operation == 'accept_request':
+            request_id = self.pick_request()
+            return operation, ['accept_request', request_id, self.username], \
+                lambda result: self.accepted.append(request_id)
+
+        if operation in ('complete_request', 'abandon_request'):
+            request_id = self.accepted.pop(self.rng.randrange(len(self.accepted)))
+            return operation, [operation, request_id, self.username], None
+
+        if operation == 'create_request':
+            department = self.rng.choice(DEPARTMENTS)
+            title = f"Load test request {self.rng.getrandbits(48):012x}"
+            data = {'title': title, 'description': 'Created by the load test', 'department': department,
+                    'departments': [department], 'status': 'Pending', 'type': 'request',
+                    'creator': self.username, 'usersNeeded': 1, 'acceptedBy': [], 'usersAccepted': 0,
+                    'multiDepartment': False, 'archived': False}
+
+            def created(result):
+                with self.shared['lock']:
+                    self.shared['ids'].append(result['id'])
+                    self.shared['created'][result['id']] = title
+            return operation, ['create_request', json.dumps(data)], created
+
+        raise ValueError(f"Unknown operation in mix: {operation}")
+
+    def run(self):
+        while True:
+            if self.interval:
+                now = time.perf_counter()
+                if self.next_call > now:
+                    time.sleep(self.next_call - now)
+                scheduled = self.next_call
+                self.next_call += self.interval
+            else:
+                scheduled = time.perf_counter()
+            if scheduled >= self.deadline:
+                return
+
+            operation, args, on_success = self.build_call(self.rng.choices(self.operations, self.weights)[0])
+            try:
+                result = self.transport.call(args)
+                outcome = 'rejected' if result is None or result == {'success': False} else 'ok'
+                if outcome == 'ok' and on_success:
+                    on_success(result)
+            except Exception as e:
+                outcome = 'error'
+                with self.shared['lock']:
+                    self.shared['errors'].append(f"{operation}: {str(e)}")
+            self.samples.append((operation, outcome, time.perf_counter() - scheduled))
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(int(round(fraction * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+def summarize(samples, elapsed):
+    """Group samples into per-operation counts and latency percentiles (ms)."""
+    summary = {}
+    for operation in sorted(set(sample[0] for sample in samples)):
+        latencies = sorted(latency for name, _, latency in samples if name == operation)
+        outcomes = [outcome for name, outcome, _ in samples if name == operation]
+        summary[operation] = {
+            'count': len(latencies),
+            'ok': outcomes.count('ok'),
+            'rejected': outcomes.count('rejected'),
+            'errors': outcomes.count('error'),
+            'p50': percentile(latencies, 0.50) * 1000,
+            'p95': percentile(latencies, 0.95) * 1000,
+            'p99': percentile(latencies, 0.99) * 1000
+        }
+    return {'elapsed': elapsed, 'throughput': len(samples) / elapsed if elapsed else 0.0,
+            'operations': summary}
+
+def load_operations_module(script):
+    """Import a dataset's copy of excel_operations.py, bound to that dataset's files."""
+    spec = importlib.util.spec_from_file_location(f"load_test_{abs(hash(script))}", script)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def verify_dataset(script, seeded_ids, created, served_requests=None):
+    """Check the workbook after a run; returns a list of problems found."""
+    ops = load_operations_module(script)
+    problems = []
+
+    try:
+        wb = openpyxl.load_workbook(ops.REQUESTS_FILE)
+        loaded_rows = ops.rows_to_dicts(wb.active)
+        wb.close()
+    except Exception as e:
+        return [f"requests.xlsx does not load: {str(e)}"]
+
+    raw_rows = ops.rows_to_dicts(ops.REQUESTS_FILE)
+    if raw_rows != loaded_rows:
+        problems.append('direct sheet reader and openpyxl disagree on the rows')
+
+    ids = [str(row.get('id')) for row in raw_rows]
+    if len(set(ids)) != len(ids):
+        problems.append(f"{len(ids) - len(set(ids))} duplicate request ids")
+    expected = set(seeded_ids) | set(created)
+    missing = expected - set(ids)
+    unexpected = set(ids) - expected
+    if missing:
+        problems.append(f"{len(missing)} requests lost (e.g. {sorted(missing)[0]})")
+    if unexpected:
+        problems.append(f"{len(unexpected)} requests nobody created (e.g. {sorted(unexpected)[0]})")
+
+    requests = ops.get_requests()
+    titles = {str(request.get('id')): request.get('title') for request in requests}
+    wrong_titles = [request_id for request_id, title in created.items() if titles.get(request_id) != title]
+    if wrong_titles:
+        problems.append(f"{len(wrong_titles)} created requests have the wrong title")
+    for request in requests:
+        if request.get('status') not in ops.REQUEST_STATUSES:
+            problems.append(f"{request.get('id')} has status {request.get('status')!r}")
+        for field in ops.REQUEST_LIST_FIELDS:
+            if request.get(field) is not None and not isinstance(request.get(field), list):
+                problems.append(f"{request.get('id')} has an undecodable {field}")
+
+    meta = ops.load_requests_meta()
+    if meta.get('signature') != ops.file_signature(ops.REQUESTS_FILE):
+        problems.append('requests sidecar does not match requests.xlsx')
+    elif json.loads(json.dumps(meta.get('stats'))) != json.loads(json.dumps(ops.build_request_stats(raw_rows))):
+        problems.append('sidecar stats differ from a rebuild')
+
+    if served_requests is not None and served_requests != requests:
+        problems.append('served snapshot differs from requests.xlsx')
+    return problems
+
+def run_mode(mode, args, mix):
+    """Run one load test against a fresh dataset and verify it."""
+    with tempfile.TemporaryDirectory() as directory:
+        script, seeded_ids = make_dataset(directory, args.requests)
+        transport = ServeTransport(script) if mode == 'serve' else CliTransport(script)
+        shared = {'lock': threading.Lock(), 'ids': list(seeded_ids), 'created': {}, 'errors': []}
+
+        # Warm the serve process (first read builds its snapshot) outside the timed run
+        if mode == 'serve':
+            transport.call(['get_request_stats'])
+
+        interval = args.clients / args.rate if args.rate > 0 else 0
+        start = time.perf_counter()
+        clients = [Client(index, args.clients, transport, mix, interval, start + args.duration, shared)
+                   for index in range(args.clients)]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        elapsed = time.perf_counter() - start
+
+        served_requests = None
+        if mode == 'serve':
+            try:
+                served_requests = transport.call(['get_requests'])
+            except Exception as e:
+                shared['errors'].append(f"final get_requests: {str(e)}")
+        transport.close()
+
+        samples = [sample for client in clients for sample in client.samples]
+        result = summarize(samples, elapsed)
+        result['mode'] = mode
+        result['errorMessages'] = sorted(set(shared['errors']))[:10]
+        result['problems'] = verify_dataset(script, seeded_ids, shared['created'], served_requests)
+        return result
+
+def print_report(result):
+    print(f"\n{result['mode']}: {sum(op['count'] for op in result['operations'].values())} calls "
+          f"in {result['elapsed']:.1f}s, {result['throughput']:.1f} ops/s")
+    print(f"  {'operation':<18}{'count':>7}{'ok':>7}{'rejected':>10}{'errors':>8}"
+          f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, op in result['operations'].items():
+        print(f"  {name:<18}{op['count']:>7}{op['ok']:>7}{op['rejected']:>10}{op['errors']:>8}"
+              f"{op['p50']:>10.1f}{op['p95']:>10.1f}{op['p99']:>10.1f}")
+    for message in result['errorMessages']:
+        print(f"  error: {message}")
+    if result['problems']:
+        for problem in result['problems']:
+            print(f"  CORRUPTION: {problem}")
+    else:
+        print('  workbook consistent')
+
+def parse_mix(value):
+    """Parse 'operation=weight,...' into a mix dictionary."""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown operation {name.strip()!r}")
+        mix[name.strip()] = float(weight)
+    return mix
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test excel_operations.py with a mix of operations.')
+    parser.add_argument('--mode', choices=['cli', 'serve', 'both'], default='both')
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=4.0, help='target calls per second over all clients')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to send calls for')
+    parser.add_argument('--requests', type=int, default=2000, help='requests in the generated workbook')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    modes = ['cli', 'serve'] if args.mode == 'both' else [args.mode]
+    results = []
+    for mode in modes:
+        result = run_mode(mode, args, args.mix)
+        print_report(result)
+        results.append(result)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    failed = any(result['problems'] or any(op['errors'] for op in result['operations'].values())
+                 for result in results)
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
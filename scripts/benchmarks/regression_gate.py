@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Performance regression gate for excel_operations.py and import_excel_data.py
+
+Runs a fixed set of benchmarks against generated data, compares them with
+a baseline and exits with status 1 and a diff table when one of them got
+slower.
+
+Every benchmark is timed as the whole process the server would spawn
+(interpreter start, imports, work), repeated --runs times. A benchmark
+regresses only when both its median and its fastest run are over the
+baseline median by more than --tolerance (a fraction) and by at least
+--min-delta-ms, so a single slow run caused by a busy machine does not
+fail the gate.
+
+Usage:
+    python scripts/benchmarks/regression_gate.py [--runs N] [--tolerance 0.25]
+        [--min-delta-ms 25] [--baseline PATH | --against REF] [--only NAME,...] [--update]
+
+Timings depend on the host, so the baseline has to come from the host that
+runs the gate. There are two ways to get one:
+
+- --against REF (what CI should use, e.g. --against origin/main): the
+  scripts of git revision REF are benchmarked in the same job, on the same
+  host and data, with their runs alternating with those of the working
+  tree, and the working tree is compared with that run.
+- The baseline file (scripts/benchmarks/baseline.json by default), recorded
+  with --update on the machine that runs the gate. The file names the host
+  it was recorded on, and the gate warns when it runs anywhere else; the
+  committed file only holds for its own host.
+"""
+
+import sys
+import os
+import json
+import time
+import shutil
+import argparse
+import platform
+import statistics
+import tempfile
+import subprocess
+import openpyxl
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+import load_test
+
+DEFAULT_BASELINE = os.path.join(BENCHMARKS_DIR, 'baseline.json')
+DATASET_REQUESTS = 5000
+IMPORT_ROWS = 5000
+
+def excel_benchmarks(ids):
+    """Get the excel_operations.py benchmarks as (name, args for run i)."""
+    filters = json.dumps({'status': 'Pending', 'department': 'IT', 'search': 'request 1'})
+    return [
+        ('get_requests', lambda i: ['get_requests']),
+        ('get_request_stats', lambda i: ['get_request_stats']),
+        ('filter_requests', lambda i: ['filter_requests', filters]),
+        ('get_users', lambda i: ['get_users']),
+        ('login_user', lambda i: ['login_user', f"user{i}", 'pw']),
+        ('export_requests', lambda i: ['export_requests', os.devnull, '--format', 'csv']),
+        ('accept_request', lambda i: ['accept_request', ids[i], f"user{i}"]),
+        ('create_request', lambda i: ['create_request', json.dumps({'title': f"Gate request {i}", 'department': 'IT',
+                                                                    'type': 'request', 'creator': 'user0'})])
+    ]
+
+def make_import_source(path, rows):
+    """Write a source workbook with the sheets import_excel_data.py reads."""
+    wb = openpyxl.Workbook(write_only=True)
+    departments = wb.create_sheet('Departments')
+    departments.append(['id', 'name'])
+    for name in load_test.DEPARTMENTS:
+        departments.append([name, name])
+
+    users = wb.create_sheet('Users')
+    users.append(['username', 'password', 'fullName', 'email', 'role', 'department', 'phone'])
+    for i in range(rows // 10):
+        users.append([f"user{i}", 'pw', f"User {i}", f"user{i}@example.com", 'user',
+                      load_test.DEPARTMENTS[i % len(load_test.DEPARTMENTS)], '123-456-7890'])
+
+    requests = wb.create_sheet('Requests')
+    requests.append(['id', 'title', 'description', 'department', 'departments', 'status', 'creator', 'createdAt',
+                     'type', 'multiDepartment', 'acceptedBy', 'usersAccepted', 'usersNeeded', 'archived', 'archivedAt'])
+    for i in range(rows):
+        department = load_test.DEPARTMENTS[i % len(load_test.DEPARTMENTS)]
+        requests.append([f"#{i:06X}", f"Request {i}", 'Imported request', department, json.dumps([department]),
+                         'Pending', f"user{i % 100}", '2030-01-01T09:00:00', 'request', False, '[]', 0, 1,
+                         False, None])
+    wb.save(path)
+
+def time_process(args):
+    """Run a command and return its wall time in seconds; fails on a non-zero exit."""
+    start = time.perf_counter()
+    completed = subprocess.run(args, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if completed.returncode != 0:
+        message = completed.stderr.strip() or completed.stdout.strip()
+        raise RuntimeError(f"{' '.join(args[1:3])} failed: {message.splitlines()[-1] if message else completed.returncode}")
+    return elapsed
+
+def extract_scripts(ref, directory):
+    """Write excel_operations.py and import_excel_data.py as of git revision ref to directory."""
+    os.makedirs(directory)
+    for name in ['excel_operations.py', 'import_excel_data.py']:
+        completed = subprocess.run(['git', 'show', f"{ref}:scripts/{name}"], cwd=SCRIPTS_DIR,
+                                   capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise RuntimeError(f"git show {ref}:scripts/{name} failed: {completed.stderr.strip()}")
+        with open(os.path.join(directory, name), 'w') as f:
+            f.write(completed.stdout)
+    return directory
+
+def run_benchmarks(runs, only, scripts_dirs=(SCRIPTS_DIR,)):
+    """Time every selected benchmark with the scripts in each of scripts_dirs.
+
+    Returns one {name: [seconds per run]} per directory. Each directory gets
+    its own copy of the data, and their runs alternate, so a host that gets
+    busier or quieter during the job slows or speeds them up alike.
+    """
+    timings = [{} for _ in scripts_dirs]
+    with tempfile.TemporaryDirectory() as directory:
+        scripts = []
+        for n, scripts_dir in enumerate(scripts_dirs):
+            script, ids = load_test.make_dataset(os.path.join(directory, f"operations{n}"), DATASET_REQUESTS)
+            # The data is generated the same way for every revision; only the script under test changes
+            shutil.copy(os.path.join(scripts_dir, 'excel_operations.py'), script)
+            scripts.append(script)
+        for name, make_args in excel_benchmarks(ids):
+            if only and name not in only:
+                continue
+            for script, timing in zip(scripts, timings):
+                # One untimed run first, so every timed run sees the same warm sidecars
+                time_process([sys.executable, script] + make_args(runs))
+                timing[name] = []
+            for i in range(runs):
+                for script, timing in zip(scripts, timings):
+                    timing[name].append(time_process([sys.executable, script] + make_args(i)))
+
+        if not only or 'import_excel_data' in only:
+            source = os.path.join(directory, 'import_source.xlsx')
+            make_import_source(source, IMPORT_ROWS)
+            import_scripts = []
+            for n, scripts_dir in enumerate(scripts_dirs):
+                import_dir = os.path.join(directory, f"import{n}", 'scripts')
+                os.makedirs(import_dir)
+                import_scripts.append(os.path.join(import_dir, 'import_excel_data.py'))
+                shutil.copy(os.path.join(scripts_dir, 'import_excel_data.py'), import_scripts[-1])
+            for timing in timings:
+                timing['import_excel_data'] = []
+            for _ in range(runs):
+                for import_script, timing in zip(import_scripts, timings):
+                    timing['import_excel_data'].append(
+                        time_process([sys.executable, import_script, source, '--jobs', '1']))
+    return timings
+
+def summarize(samples):
+    """Reduce the runs of one benchmark to median, fastest run and spread (ms)."""
+    ms = sorted(sample * 1000 for sample in samples)
+    median = statistics.median(ms)
+    return {
+        'median': round(median, 1),
+        'min': round(ms[0], 1),
+        # Median absolute deviation: how far a typical run is from the median
+        'mad': round(statistics.median(abs(value - median) for value in ms), 1),
+        'runs': len(ms)
+    }
+
+def compare(baseline, current, tolerance, min_delta_ms):
+    """Build one diff row per benchmark; status is ok, faster, REGRESSED, new or missing."""
+    rows = []
+    for name in sorted(set(baseline) | set(current)):
+        before = baseline.get(name)
+        after = current.get(name)
+        if before is None or after is None:
+            rows.append({'name': name, 'before': before, 'after': after, 'change': None,
+                         'status': 'new' if before is None else 'missing'})
+            continue
+
+        limit = max(before['median'] * (1 + tolerance), before['median'] + min_delta_ms)
+        if after['median'] > limit and after['min'] > limit:
+            status = 'REGRESSED'
+        elif after['median'] < min(before['median'] * (1 - tolerance), before['median'] - min_delta_ms):
+            status = 'faster'
+        else:
+            status = 'ok'
+        rows.append({'name': name, 'before': before, 'after': after,
+                     'change': after['median'] / before['median'] - 1 if before['median'] else None,
+                     'status': status})
+    return rows
+
+def print_table(rows, tolerance):
+    print(f"{'benchmark':<20}{'baseline ms':>13}{'current ms':>12}{'+/- ms':>9}{'change':>9}  status")
+    for row in rows:
+        before = f"{row['before']['median']:.0f}" if row['before'] else '-'
+        after = f"{row['after']['median']:.0f}" if row['after'] else '-'
+        spread = f"{row['after']['mad']:.0f}" if row['after'] else '-'
+        change = f"{row['change'] * 100:+.0f}%" if row['change'] is not None else '-'
+        print(f"{row['name']:<20}{before:>13}{after:>12}{spread:>9}{change:>9}  {row['status']}")
+    print(f"(medians; +/- is the median absolute deviation; tolerance {tolerance * 100:.0f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description='Fail when a benchmark is slower than the baseline.')
+    parser.add_argument('--runs', type=int, default=5, help='timed runs per benchmark')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown as a fraction')
+    parser.add_argument('--min-delta-ms', type=float, default=25.0, help='ignore slowdowns smaller than this')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--against', metavar='REF', help='benchmark git revision REF on this host as the baseline')
+    parser.add_argument('--only', type=lambda value: set(value.split(',')), help='comma-separated benchmarks')
+    parser.add_argument('--update', action='store_true', help='write the results as the new baseline')
+    args = parser.parse_args()
+    if args.against and args.update:
+        parser.error('--update records the working tree; it cannot be combined with --against')
+
+    baseline = None
+    if args.against:
+        with tempfile.TemporaryDirectory() as directory:
+            scripts_dir = extract_scripts(args.against, os.path.join(directory, 'scripts'))
+            print(f"Benchmarking {args.against} as the baseline, alternating with the working tree")
+            before, timings = run_benchmarks(max(args.runs, 1), args.only, [scripts_dir, SCRIPTS_DIR])
+        baseline = {name: summarize(samples) for name, samples in before.items()}
+    else:
+        timings, = run_benchmarks(max(args.runs, 1), args.only)
+    current = {name: summarize(samples) for name, samples in timings.items()}
+
+    if args.update:
+        baseline = {}
+        if args.only and os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f).get('benchmarks', {})
+        baseline.update(current)
+        with open(args.baseline, 'w') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'host': platform.node(),
+                       'datasetRequests': DATASET_REQUESTS, 'importRows': IMPORT_ROWS,
+                       'benchmarks': baseline}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print_table(compare(current, current, args.tolerance, args.min_delta_ms), args.tolerance)
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if baseline is None:
+        if not os.path.exists(args.baseline):
+            print(f"No baseline at {args.baseline}; run with --update to record one")
+            sys.exit(2)
+        with open(args.baseline) as f:
+            recorded = json.load(f)
+        baseline = recorded['benchmarks']
+        if recorded.get('host') != platform.node():
+            print(f"Warning: {args.baseline} was recorded on {recorded.get('host') or 'another host'}, "
+                  f"not {platform.node()}; its timings do not apply here (use --against REF)")
+    if args.only:
+        baseline = {name: value for name, value in baseline.items() if name in args.only}
+
+    rows = compare(baseline, current, args.tolerance, args.min_delta_ms)
+    print_table(rows, args.tolerance)
+
+    regressed = [row['name'] for row in rows if row['status'] == 'REGRESSED']
+    if regressed:
+        print(f"\nRegressed: {', '.join(regressed)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark: openpyxl workbook saves vs the streaming xlsx writer
+
+Compares, for a requests-shaped table, the time and peak Python memory of:
+- openpyxl:     wb.save() of a materialized workbook (the old save path)
+- save_workbook: excel_operations.save_workbook() of the same workbook
+- write_xlsx:    excel_operations.write_xlsx() straight from row tuples
+
+Usage:
+    python scripts/benchmarks/xlsx_writer_benchmark.py [rows ...]
+
+Defaults to 10000 and 100000 rows. Files are written to a temporary
+directory and removed afterwards.
+"""
+
+import sys
+import os
+import json
+import time
+import tempfile
+import tracemalloc
+import openpyxl
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import excel_operations
+
+DEFAULT_ROW_COUNTS = [10000, 100000]
+
+def make_rows(count):
+    """Generate a header and request rows like the ones in requests.xlsx."""
+    columns = excel_operations.REQUEST_COLUMNS
+    yield tuple(columns)
+    for i in range(count):
+        request = {
+            'id': f"#{i:06X}",
+            'title': f"Request {i}",
+            'description': 'Benchmark request with a medium length description text',
+            'department': ['IT', 'HR', 'Finance', 'Operations'][i % 4],
+            'status': ['Pending', 'In Process', 'Completed', 'Rejected'][i % 4],
+            'dateCreated': '01/02/2024',
+            'creator': f"user{i % 500}",
+            'type': 'project' if i % 5 == 0 else 'request',
+            'multiDepartment': i % 3 == 0,
+            'usersNeeded': i % 7,
+            'archived': False,
+            'acceptedBy': json.dumps([f"user{i % 17}"]),
+            'usersAccepted': 1,
+            'departments': json.dumps(['IT', 'HR']),
+            'createdAt': '2024-02-01T10:00:00',
+            'rowVersion': i
+        }
+        yield tuple(request.get(column) for column in columns)
+
+def build_workbook(count):
+    """Materialize the rows as a regular openpyxl workbook."""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    for row in make_rows(count):
+        ws.append(row)
+    return wb
+
+def measure(run):
+    """Run a save twice: once timed, once under tracemalloc for the peak."""
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+def benchmark(count, directory):
+    """Benchmark every save path for one table size."""
+    path = os.path.join(directory, f'requests_{count}.xlsx')
+    wb = build_workbook(count)
+
+    results = {
+        'openpyxl': measure(lambda: wb.save(path)),
+        'save_workbook': measure(lambda: excel_operations.save_workbook(wb, path)),
+        'write_xlsx': measure(lambda: excel_operations.write_xlsx(path, make_rows(count), 'Sheet',
+                                                                  (count + 1, len(excel_operations.REQUEST_COLUMNS))))
+    }
+
+    # The streamed file must read back the same as the source rows
+    check = openpyxl.load_workbook(path, read_only=True)
+    assert list(check.active.iter_rows(values_only=True)) == list(make_rows(count))
+    check.close()
+    return results
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or DEFAULT_ROW_COUNTS
+
+    print(f"{'rows':>8}  {'writer':<14}{'seconds':>9}{'peak MB':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for count in counts:
+            for name, (elapsed, peak) in benchmark(count, directory).items():
+                print(f"{count:>8}  {name:<14}{elapsed:>9.2f}{peak / 1e6:>10.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -15,8 +15,36 @@ import sys
 import os
 import json
 import uuid
-from datetime import datetime
+import hashlib
+import csv
+import io
+import re
+import gzip
+import base64
+import zipfile
+import struct
+import zlib
+import posixpath
+import bisect
+from xml.etree import ElementTree
+import secrets
+import time
+import threading
+import asyncio
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, date
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 import openpyxl
+from openpyxl.utils import get_column_letter, column_index_from_string
+from openpyxl.utils.datetime import from_excel, from_ISO8601
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
 
 # Define the base directory for Excel files
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -31,16 +59,158 @@ DEPARTMENTS_FILE = os.path.join(EXCEL_DIR, 'departments.xlsx')
 USERS_FILE = os.path.join(EXCEL_DIR, 'users.xlsx')
 REQUESTS_FILE = os.path.join(EXCEL_DIR, 'requests.xlsx')
 
+# Cold tier: archived requests are moved here out of requests.xlsx
+ARCHIVE_FILE = os.path.join(EXCEL_DIR, 'requests_archive.xlsx')
+
+# Retention store: expired requests rolled into gzipped per-month JSONL partitions
+RETENTION_DIR = os.path.join(EXCEL_DIR, 'retention')
+RETENTION_MANIFEST_FILE = os.path.join(RETENTION_DIR, 'manifest.json')
+
+# Bloom filter sizing for the per-partition id filters in the manifest
+RETENTION_BLOOM_BITS_PER_ID = 10
+RETENTION_BLOOM_HASHES = 7
+RETENTION_BLOOM_MIN_CAPACITY = 1024
+
+# Session tokens issued at login; only sha256 hashes of the tokens are stored
+SESSIONS_FILE = os.path.join(EXCEL_DIR, 'sessions.json')
+SESSIONS_LOG_FILE = os.path.join(EXCEL_DIR, 'sessions.log')
+# Held while sessions.log is appended to, read or compacted, across processes
+SESSIONS_LOCK_FILE = os.path.join(EXCEL_DIR, 'sessions.lock')
+SESSION_TTL_SECONDS = 8 * 60 * 60
+SESSION_LIMIT = 10000
+# sessions.log lines read before it is folded into sessions.json
+SESSION_LOG_LIMIT = 1000
+# EXCEL_SESSION_FILES=0 keeps serve mode sessions in memory only (lost when the
+# worker restarts); a process per call always uses the files
+SESSION_FILES = os.environ.get('EXCEL_SESSION_FILES', '1') != '0'
+
+# User fields carried by a session
+SESSION_FIELDS = ['id', 'username', 'fullName', 'role', 'department']
+
+# Group commit in serve mode: request writes arriving within this window
+# (milliseconds) are applied to one workbook and saved together; 0 disables
+COMMIT_WINDOW_MS = int(os.environ.get('EXCEL_COMMIT_WINDOW_MS', '5'))
+COMMIT_BATCH_LIMIT = 100
+
+# Serve mode keeps up to this many get_user_requests / filter_requests answers
+# (and at most this many MB of them) between writes; 0 entries disables it
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('EXCEL_RESULT_CACHE_ENTRIES', '256'))
+RESULT_CACHE_MAX_BYTES = int(float(os.environ.get('EXCEL_RESULT_CACHE_MB', '32')) * 1024 * 1024)
+
+# Serve mode runs check_expired_requests itself whenever an expiry, archive or
+# delete deadline comes due; EXCEL_EXPIRY_TIMER=0 leaves it to the endpoint
+EXPIRY_TIMER = os.environ.get('EXCEL_EXPIRY_TIMER', '1') != '0'
+# A request still due right after its pass (a row marked isExpired is deleted
+# by the following pass) is passed again after this many seconds
+EXPIRY_RETRY_SECONDS = 60
+
+# Serve mode answers snapshot reads on this many threads, off the event loop
+READ_THREADS = max(int(os.environ.get('EXCEL_READ_THREADS', '4')), 1)
+
+# Reads that serve mode answers from the requests snapshot (unless they ask for archived rows)
+SNAPSHOT_READ_OPERATIONS = ['get_requests', 'get_user_requests', 'filter_requests', 'get_request_stats',
+                            'explain_filter_requests']
+
+# Operations whose requests.xlsx writes can share a group commit
+GROUP_COMMIT_OPERATIONS = [
+    'create_request', 'update_request', 'delete_request', 'accept_request',
+    'complete_request', 'abandon_request', 'reject_request'
+]
+
+# Serve mode fans heavy reads (filter_requests, export_requests) out to this many
+# worker processes, each holding a row range of requests.xlsx; 0 or 1 disables
+QUERY_WORKERS = int(os.environ.get('EXCEL_QUERY_WORKERS', '0'))
+# Tables with fewer rows are always scanned in-process
+PARALLEL_QUERY_MIN_ROWS = 20000
+
+# filter_requests criteria; equality criteria on the low-cardinality columns are
+# answered from snapshot bitmaps, creator/participant from snapshot hash indexes
+# and time ranges from the sorted time indexes
+FILTER_FIELDS = ['department', 'status', 'type', 'multiDepartment', 'archived', 'search',
+                 'creator', 'participant', 'createdFrom', 'createdTo', 'updatedSince']
+BITMAP_FILTER_FIELDS = ['department', 'status', 'type', 'multiDepartment', 'archived']
+INDEXED_FILTER_FIELDS = ['creator', 'participant']
+# Time range criteria as (time key, lower or upper bound)
+TIME_FILTERS = {'createdFrom': ('createdAt', 'from'), 'createdTo': ('createdAt', 'to'),
+                'updatedSince': ('updatedAt', 'from')}
+
+# Request times kept as epoch seconds in snapshots, and the orderBy values of
+# filter_requests: createdAt (dateCreated when missing), updatedAt (lastStatusUpdate,
+# or the creation time if the status never changed) and archivedAt
+TIME_KEYS = ['createdAt', 'updatedAt', 'archivedAt']
+# Rough cost of checking one criterion on one row, relative to an equality test;
+# fetching a candidate from an index costs INDEX_FETCH_COST on top, and combining
+# bitmaps BITMAP_WORD_COST per 64 rows per bitmap
+FILTER_CHECK_COSTS = {
+    'department': 1, 'status': 1, 'type': 1, 'multiDepartment': 1, 'archived': 1, 'creator': 1,
+    'participant': 2, 'createdFrom': 4, 'createdTo': 4, 'updatedSince': 4, 'search': 8
+}
+INDEX_FETCH_COST = 0.5
+BITMAP_WORD_COST = 0.1
+# Selectivity assumed for criteria the column statistics say nothing about
+DEFAULT_FILTER_SELECTIVITY = {
+    'department': 0.1, 'status': 0.25, 'type': 0.5, 'multiDepartment': 0.3, 'archived': 0.1, 'creator': 0.01,
+    'participant': 0.01, 'createdFrom': 0.5, 'createdTo': 0.5, 'updatedSince': 0.5, 'search': 0.05
+}
+
+# Columns of a newly created requests.xlsx
+REQUEST_COLUMNS = [
+    'id', 'title', 'description', 'department', 'status', 'dateCreated', 
+    'creator', 'type', 'multiDepartment', 'usersNeeded', 'archived', 
+    'archivedAt', 'acceptedBy', 'usersAccepted', 'departments', 
+    'rejections', 'participantsCompleted', 'createdAt', 'creatorDepartment',
+    'creatorRole', 'lastStatusUpdate', 'lastStatusUpdateTime', 'priority',
+    'relatedProject', 'rowVersion'
+]
+
+# Request columns stored as JSON-encoded lists
+REQUEST_LIST_FIELDS = ['acceptedBy', 'departments', 'rejections', 'participantsCompleted']
+
+REQUEST_STATUSES = ['Pending', 'In Process', 'Completed', 'Rejected']
+REQUEST_TYPES = ['request', 'project']
+
+# Rows appended per workbook save by bulk_import_requests
+BULK_IMPORT_CHUNK_SIZE = 5000
+
+# Sidecar file holding aggregates and change tracking for requests.xlsx
+REQUESTS_META_FILE = os.path.join(EXCEL_DIR, 'requests_meta.json')
+
+# Column stamped with the data version of the last write to each request row
+ROW_VERSION_COLUMN = 'rowVersion'
+
+# Number of deleted-request tombstones kept for the change feed
+TOMBSTONE_LIMIT = 5000
+
+# Statuses that count as open work for a user
+OPEN_STATUSES = ['Pending', 'In Process']
+
+# Pending-by-age buckets as (label, min_days, max_days)
+PENDING_AGE_BUCKETS = [
+    ('0-1d', 0, 1),
+    ('1-7d', 1, 7),
+    ('7-30d', 7, 30),
+    ('30d+', 30, None),
+]
+
 def get_column_names(worksheet):
     """Get column names from the first row of a worksheet."""
     return [cell.value for cell in worksheet[1]]
 
 def rows_to_dicts(worksheet):
-    """Convert worksheet rows to list of dictionaries."""
-    columns = get_column_names(worksheet)
+    """Convert worksheet rows to list of dictionaries.
+    
+    worksheet may also be the path of an xlsx file, which is then read
+    with iter_sheet_values instead of being loaded into openpyxl.
+    """
+    if isinstance(worksheet, str):
+        rows = iter_sheet_values(worksheet)
+        columns = list(next(rows, ()))
+    else:
+        columns = get_column_names(worksheet)
+        rows = worksheet.iter_rows(min_row=2, values_only=True)
     result = []
     
-    for row in worksheet.iter_rows(min_row=2, values_only=True):
+    for row in rows:
         item = {}
         for i, value in enumerate(row):
             if i < len(columns):
@@ -50,37 +220,1053 @@ def rows_to_dicts(worksheet):
     
     return result
 
-def get_departments():
-    """Get all departments from Excel."""
+# Package parts of the single-sheet workbooks written by write_xlsx
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="xl/workbook.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+    '</Relationships>'
+)
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{title}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+)
+XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+    '<Relationship Id="rId2" Target="styles.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles"/>'
+    '</Relationships>'
+)
+# Style 0 is the default, style 1 formats date serials (numFmtId 22: m/d/yyyy h:mm)
+XLSX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="22" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+XLSX_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+)
+
+# Control characters that are not allowed in XML text
+XML_ILLEGAL_CHARACTERS_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+EXCEL_EPOCH = datetime(1899, 12, 30)
+
+def xml_text(value):
+    """Escape a string for XML text or attribute content."""
+    value = XML_ILLEGAL_CHARACTERS_RE.sub('', value)
+    return value.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+
+def xlsx_cell(ref, value, date_style=1):
+    """Render one cell of a sheet, or '' for an empty one.
+    
+    Dates are written as serials with the cell style date_style, which
+    must format numbers as dates (style 1 in files from write_xlsx).
+    """
+    if value is None or value == '':
+        return ''
+    if isinstance(value, bool):
+        return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)) and value == value and value not in (float('inf'), float('-inf')):
+        return f'<c r="{ref}"><v>{value!r}</v></c>'
+    if isinstance(value, (datetime, date)):
+        if not isinstance(value, datetime):
+            value = datetime(value.year, value.month, value.day)
+        serial = (value.replace(tzinfo=None) - EXCEL_EPOCH).total_seconds() / 86400
+        return f'<c r="{ref}" s="{date_style}"><v>{serial!r}</v></c>'
+    
+    text = xml_text(str(value))
+    space = ' xml:space="preserve"' if text != text.strip() else ''
+    return f'<c r="{ref}" t="inlineStr"><is><t{space}>{text}</t></is></c>'
+
+def xlsx_row(row_idx, row, letters, date_style=1):
+    """Render one row of a sheet; letters caches column letters between calls."""
+    while len(letters) < len(row):
+        letters.append(get_column_letter(len(letters) + 1))
+    cells = ''.join(xlsx_cell(f'{letters[col_idx]}{row_idx}', value, date_style)
+                    for col_idx, value in enumerate(row))
+    return f'<row r="{row_idx}">{cells}</row>'
+
+def write_xlsx(path, rows, title='Sheet', dimension=None, widths=None):
+    """Write value tuples as a single-sheet xlsx without building cell objects.
+    
+    Strings are written inline (no shared strings table), so rows are
+    streamed into the zip one at a time. dimension is the optional
+    (max_row, max_column) of the sheet, which lets read-only readers size
+    it, and widths an optional {(min, max) column range: width}. The file
+    is written under a temporary name and moved into place.
+    """
+    tmp_path = path + '.tmp'
+    letters = []
+    try:
+        with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr('[Content_Types].xml', XLSX_CONTENT_TYPES)
+            zf.writestr('_rels/.rels', XLSX_ROOT_RELS)
+            zf.writestr('xl/workbook.xml', XLSX_WORKBOOK.format(title=xml_text(title)))
+            zf.writestr('xl/_rels/workbook.xml.rels', XLSX_WORKBOOK_RELS)
+            zf.writestr('xl/styles.xml', XLSX_STYLES)
+            
+            with zf.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as raw:
+                sheet = io.TextIOWrapper(raw, encoding='utf-8')
+                sheet.write(XLSX_SHEET_START)
+                if dimension and dimension[0] and dimension[1]:
+                    sheet.write(f'<dimension ref="A1:{get_column_letter(dimension[1])}{dimension[0]}"/>')
+                if widths:
+                    sheet.write('<cols>' + ''.join(f'<col min="{low}" max="{high}" width="{width!r}" customWidth="1"/>'
+                                                   for (low, high), width in sorted(widths.items())) + '</cols>')
+                sheet.write('<sheetData>')
+                
+                for row_idx, row in enumerate(rows, start=1):
+                    sheet.write(xlsx_row(row_idx, row, letters))
+                
+                sheet.write('</sheetData></worksheet>')
+                sheet.flush()
+                sheet.detach()
+        
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def save_workbook(wb, path):
+    """Save a workbook through write_xlsx, keeping values and column widths.
+    
+    Column widths are kept; fonts, fills and number formats are not (dates
+    get the writer's own date format). Workbooks with more than one sheet
+    are saved by openpyxl.
+    """
+    if len(wb.worksheets) != 1:
+        wb.save(path)
+        return
+    
+    ws = wb.active
+    widths = {}
+    for key, dimension in ws.column_dimensions.items():
+        if dimension.customWidth and dimension.width:
+            low = dimension.min or column_index_from_string(key)
+            widths[(low, dimension.max or low)] = float(dimension.width)
+    write_xlsx(path, ws.iter_rows(values_only=True), ws.title, (ws.max_row, ws.max_column), widths)
+
+# Complete <row> elements of a sheet, and the row number attribute inside one
+SHEET_ROW_RE = re.compile(rb'<row\b([^>]*?)(?:/>|>.*?</row>)', re.S)
+SHEET_ROW_NUMBER_RE = re.compile(rb'\br="(\d+)"')
+PATCH_CHUNK_SIZE = 1 << 20
+
+# Zip records written by patch_xlsx_rows (no zip64: larger packages are saved in full)
+ZIP_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+ZIP_CENTRAL_HEADER = struct.Struct('<4s6H3L5H2L')
+ZIP_END_RECORD = struct.Struct('<4s4H2LH')
+ZIP_LIMIT = 0xFFFFFFFF
+# Flag bit of a member whose sizes follow its data in a descriptor
+ZIP_DATA_DESCRIPTOR = 0x08
+ZIP_UTF8_NAME = 0x800
+
+def zip_member_entry(info, offset):
+    """Get the central directory fields of a member written at offset."""
+    year, month, day, hour, minute, second = info.date_time
+    return {
+        'name': info.filename.encode('utf-8' if info.flag_bits & ZIP_UTF8_NAME else 'cp437'),
+        'made_by': (info.create_system << 8) | info.create_version,
+        'version': info.extract_version,
+        'flags': info.flag_bits & ~ZIP_DATA_DESCRIPTOR,
+        'method': info.compress_type,
+        'time': (hour << 11) | (minute << 5) | (second // 2),
+        'date': ((year - 1980) << 9) | (month << 5) | day,
+        'crc': info.CRC,
+        'compressed': info.compress_size,
+        'size': info.file_size,
+        'internal': info.internal_attr,
+        'external': info.external_attr,
+        'offset': offset
+    }
+
+def write_zip_local_header(f_out, entry):
+    """Write the local header of a member; sizes and CRC are known or patched in later."""
+    f_out.write(ZIP_LOCAL_HEADER.pack(b'PK\x03\x04', entry['version'], entry['flags'], entry['method'],
+                                      entry['time'], entry['date'], entry['crc'], entry['compressed'],
+                                      entry['size'], len(entry['name']), 0))
+    f_out.write(entry['name'])
+
+def copy_zip_member(f_src, f_out, info):
+    """Copy a member of an open zip file to f_out as its stored compressed bytes.
+    
+    Returns its central directory entry.
+    """
+    f_src.seek(info.header_offset)
+    header = f_src.read(ZIP_LOCAL_HEADER.size)
+    if header[:4] != b'PK\x03\x04':
+        raise zipfile.BadZipFile(f"Bad local header for {info.filename}")
+    name_length, extra_length = struct.unpack('<HH', header[26:30])
+    f_src.seek(name_length + extra_length, os.SEEK_CUR)
+    
+    # Sizes and CRC go in the local header, so no data descriptor is needed
+    entry = zip_member_entry(info, f_out.tell())
+    write_zip_local_header(f_out, entry)
+    remaining = info.compress_size
+    while remaining:
+        data = f_src.read(min(remaining, PATCH_CHUNK_SIZE))
+        if not data:
+            raise zipfile.BadZipFile(f"Truncated member {info.filename}")
+        f_out.write(data)
+        remaining -= len(data)
+    return entry
+
+def write_zip_central_directory(f_out, entries):
+    """Write the central directory and end record; False if the package needs zip64."""
+    start = f_out.tell()
+    if len(entries) >= 0xFFFF or any(max(entry['offset'], entry['compressed'], entry['size']) > ZIP_LIMIT
+                                     for entry in entries):
+        return False
+    for entry in entries:
+        f_out.write(ZIP_CENTRAL_HEADER.pack(b'PK\x01\x02', entry['made_by'], entry['version'], entry['flags'],
+                                            entry['method'], entry['time'], entry['date'], entry['crc'],
+                                            entry['compressed'], entry['size'], len(entry['name']), 0, 0, 0,
+                                            entry['internal'], entry['external'], entry['offset']))
+        f_out.write(entry['name'])
+    size = f_out.tell() - start
+    if start + size > ZIP_LIMIT:
+        return False
+    f_out.write(ZIP_END_RECORD.pack(b'PK\x05\x06', 0, 0, len(entries), len(entries), size, start, 0))
+    return True
+
+def patch_sheet_rows(f_in, write, rows, date_style=1):
+    """Stream sheet XML from f_in to the write function, replacing the given rows.
+    
+    rows maps row indexes to value tuples, whose dates get the cell style
+    date_style. Returns how many rows were replaced; everything else is
+    copied byte for byte.
+    """
+    letters = []
+    pending = b''
+    row_idx = 0
+    replaced = 0
+    while True:
+        chunk = f_in.read(PATCH_CHUNK_SIZE)
+        pending += chunk
+        end = 0
+        for match in SHEET_ROW_RE.finditer(pending):
+            number = SHEET_ROW_NUMBER_RE.search(match.group(1))
+            row_idx = int(number.group(1)) if number else row_idx + 1
+            write(pending[end:match.start()])
+            if row_idx in rows:
+                write(xlsx_row(row_idx, rows[row_idx], letters, date_style).encode('utf-8'))
+                replaced += 1
+            else:
+                write(match.group(0))
+            end = match.end()
+        # Keep the unmatched tail, which may be the start of a row cut by the chunk
+        pending = pending[end:]
+        if not chunk:
+            break
+    
+    write(pending)
+    return replaced
+
+def patch_xlsx_rows(path, rows):
+    """Rewrite only some rows of a single-sheet xlsx.
+    
+    The sheet part is streamed through patch_sheet_rows and every other
+    part (styles, shared strings, theme, ...) is copied without being
+    decompressed, so the cost follows the size of the sheet XML rather than
+    of the whole workbook. The new package is written record by record
+    (copy_zip_member, write_zip_central_directory). Replacement rows use inline strings, so the
+    shared strings table never has to change. Dates use a date style that
+    styles.xml already has. The new file is written under a temporary name
+    and moved into place.
+    
+    Returns False, leaving the file untouched, if the package is not one
+    we can patch, a row is not in the sheet, dates are written to a file
+    without a date style, or the new package would need zip64.
+    """
+    try:
+        src = zipfile.ZipFile(path)
+    except (OSError, zipfile.BadZipFile):
+        return False
+    
+    tmp_path = path + '.tmp'
+    try:
+        with src:
+            try:
+                sheet_member = find_sheet_member(src)[0]
+                date_styles = read_date_styles(src)
+            except (KeyError, ValueError, TypeError, ElementTree.ParseError):
+                return False
+            # Style 1 is the date style of files written by write_xlsx
+            date_style = 1 if 1 in date_styles else min(date_styles, default=None)
+            if date_style is None and any(isinstance(value, (datetime, date))
+                                          for row in rows.values() for value in row):
+                return False
+            
+            entries = []
+            with open(path, 'rb') as f_src, open(tmp_path, 'wb') as f_out:
+                for info in src.infolist():
+                    if info.filename != sheet_member:
+                        entries.append(copy_zip_member(f_src, f_out, info))
+                        continue
+                    
+                    entry = zip_member_entry(info, f_out.tell())
+                    entry.update({'version': 20, 'flags': entry['flags'] & ZIP_UTF8_NAME,
+                                  'method': zipfile.ZIP_DEFLATED, 'crc': 0, 'compressed': 0, 'size': 0})
+                    write_zip_local_header(f_out, entry)
+                    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+                    
+                    def write(data):
+                        entry['crc'] = zlib.crc32(data, entry['crc'])
+                        entry['size'] += len(data)
+                        compressed = compressor.compress(data)
+                        entry['compressed'] += len(compressed)
+                        f_out.write(compressed)
+                    
+                    with src.open(info) as f_in:
+                        replaced = patch_sheet_rows(f_in, write, rows, date_style)
+                    tail = compressor.flush()
+                    entry['compressed'] += len(tail)
+                    f_out.write(tail)
+                    
+                    # Fill in the CRC and sizes now that the member is written
+                    end = f_out.tell()
+                    f_out.seek(entry['offset'] + 14)
+                    f_out.write(struct.pack('<3L', entry['crc'] & ZIP_LIMIT, min(entry['compressed'], ZIP_LIMIT),
+                                            min(entry['size'], ZIP_LIMIT)))
+                    f_out.seek(end)
+                    entries.append(entry)
+                
+                complete = replaced == len(rows) and write_zip_central_directory(f_out, entries)
+        
+        if not complete:
+            os.remove(tmp_path)
+            return False
+        os.replace(tmp_path, path)
+        return True
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+# XML names used by the direct sheet reader
+SHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+RELATIONSHIP_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+SHEET_ROW = SHEET_NS + 'row'
+SHEET_CELL = SHEET_NS + 'c'
+SHEET_VALUE = SHEET_NS + 'v'
+SHEET_TEXT = SHEET_NS + 't'
+SHEET_INLINE_STRING = SHEET_NS + 'is'
+SHEET_DATA = SHEET_NS + 'sheetData'
+SHEET_DIMENSION = SHEET_NS + 'dimension'
+
+def read_shared_strings(zf, member):
+    """Read a shared strings table (plain and rich text entries)."""
+    strings = []
+    with zf.open(member) as f:
+        for _, elem in ElementTree.iterparse(f):
+            if elem.tag != SHEET_NS + 'si':
+                continue
+            # Rich text is split over <r><t> runs; phonetic hints (<rPh>) are not part of the text
+            text = elem.find(SHEET_TEXT)
+            if text is not None:
+                strings.append(text.text or '')
+            else:
+                strings.append(''.join(run.findtext(SHEET_TEXT) or '' for run in elem.iter(SHEET_NS + 'r')))
+            elem.clear()
+    return strings
+
+def read_date_styles(zf):
+    """Get the indexes of cell styles that format numbers as dates."""
+    if 'xl/styles.xml' not in zf.namelist():
+        return set()
+    
+    styles = ElementTree.fromstring(zf.read('xl/styles.xml'))
+    formats = dict(BUILTIN_FORMATS)
+    for num_fmt in styles.iter(SHEET_NS + 'numFmt'):
+        formats[int(num_fmt.get('numFmtId'))] = num_fmt.get('formatCode')
+    
+    date_styles = set()
+    cell_xfs = styles.find(SHEET_NS + 'cellXfs')
+    for idx, xf in enumerate(cell_xfs if cell_xfs is not None else []):
+        num_fmt = formats.get(int(xf.get('numFmtId', 0)))
+        if num_fmt and is_date_format(num_fmt):
+            date_styles.add(idx)
+    return date_styles
+
+def find_sheet_member(zf):
+    """Get the (sheet, shared strings) part names of a single-sheet package.
+    
+    The shared strings name is None when the package has none. Raises
+    ValueError (or KeyError for missing parts) for other packages.
+    """
+    names = set(zf.namelist())
+    workbook = ElementTree.fromstring(zf.read('xl/workbook.xml'))
+    sheets = workbook.findall(f'{SHEET_NS}sheets/{SHEET_NS}sheet')
+    if len(sheets) != 1:
+        raise ValueError('not a single-sheet workbook')
+    
+    relationships = ElementTree.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+    members = {}
+    for relationship in relationships:
+        target = relationship.get('Target', '')
+        member = target.lstrip('/') if target.startswith('/') else posixpath.normpath('xl/' + target)
+        members[relationship.get('Id')] = member
+        if relationship.get('Type', '').endswith('/sharedStrings'):
+            members['sharedStrings'] = member
+    
+    sheet_member = members.get(sheets[0].get(RELATIONSHIP_ID))
+    if sheet_member not in names:
+        raise ValueError('sheet part not found')
+    shared_strings_member = members.get('sharedStrings')
+    return sheet_member, shared_strings_member if shared_strings_member in names else None
+
+def open_sheet_xml(path):
+    """Open the sheet of a single-sheet xlsx for direct reading.
+    
+    Returns (zip file, sheet member, shared strings, date style indexes),
+    or None if the package does not look like one we can read directly.
+    """
+    zf = zipfile.ZipFile(path)
+    try:
+        sheet_member, shared_strings_member = find_sheet_member(zf)
+        shared_strings = []
+        if shared_strings_member:
+            shared_strings = read_shared_strings(zf, shared_strings_member)
+        
+        return zf, sheet_member, shared_strings, read_date_styles(zf)
+    except (KeyError, ValueError, TypeError, ElementTree.ParseError):
+        zf.close()
+        return None
+
+def sheet_cell_value(cell, shared_strings, date_styles):
+    """Convert a <c> element to the value openpyxl would give for it."""
+    cell_type = cell.get('t', 'n')
+    if cell_type == 'inlineStr':
+        inline = cell.find(SHEET_INLINE_STRING)
+        return ''.join(text.text or '' for text in inline.iter(SHEET_TEXT)) if inline is not None else None
+    
+    formula = cell.findtext(SHEET_NS + 'f')
+    if formula is not None:
+        return '=' + formula
+    value = cell.findtext(SHEET_VALUE)
+    if not value:
+        return None
+    if cell_type == 's':
+        return shared_strings[int(value)]
+    if cell_type == 'b':
+        return value == '1'
+    if cell_type in ('str', 'e'):
+        return value
+    if cell_type == 'd':
+        return from_ISO8601(value)
+    
+    number = float(value) if ('.' in value or 'E' in value or 'e' in value) else int(value)
+    if date_styles and cell.get('s') and int(cell.get('s')) in date_styles:
+        return from_excel(number)
+    return number
+
+def iter_sheet_xml_rows(zf, sheet_member, shared_strings, date_styles):
+    """Stream the rows of a sheet part as value tuples.
+    
+    Like openpyxl's read-only rows, every row (missing ones included) is
+    padded with None to the sheet width: the <dimension> if the sheet has
+    one, otherwise the header row.
+    """
+    with zf.open(sheet_member) as f:
+        sheet_data = None
+        width = 0
+        next_row = 1
+        for event, elem in ElementTree.iterparse(f, events=('start', 'end')):
+            if event == 'start':
+                if elem.tag == SHEET_DATA:
+                    sheet_data = elem
+                elif elem.tag == SHEET_DIMENSION:
+                    last_cell = (elem.get('ref') or '').split(':')[-1].rstrip('0123456789')
+                    width = column_index_from_string(last_cell) if last_cell.isalpha() else 0
+                continue
+            if elem.tag != SHEET_ROW:
+                continue
+            
+            row_idx = int(elem.get('r') or next_row)
+            while next_row < row_idx:
+                yield (None,) * width
+                next_row += 1
+            
+            values = []
+            for cell in elem.iter(SHEET_CELL):
+                ref = cell.get('r')
+                if ref:
+                    col_idx = column_index_from_string(ref.rstrip('0123456789')) - 1
+                    if col_idx > len(values):
+                        values.extend([None] * (col_idx - len(values)))
+                values.append(sheet_cell_value(cell, shared_strings, date_styles))
+            
+            if row_idx == 1:
+                width = max(width, len(values))
+            if len(values) < width:
+                values.extend([None] * (width - len(values)))
+            yield tuple(values)
+            next_row = row_idx + 1
+            # Drop parsed rows so memory does not grow with the sheet
+            if sheet_data is not None:
+                sheet_data.clear()
+
+def iter_sheet_values(path):
+    """Yield the rows of the first sheet of an xlsx file as value tuples.
+    
+    Our own files (one sheet of plain values, as written by write_xlsx or
+    openpyxl) are parsed straight from the sheet XML with iterparse; any
+    other package falls back to openpyxl in read-only mode, as does the rest
+    of a sheet holding a cell the XML parser does not understand.
+    """
+    sheet = open_sheet_xml(path)
+    read_rows = 0
+    if sheet is not None:
+        zf, sheet_member, shared_strings, date_styles = sheet
+        try:
+            for row in iter_sheet_xml_rows(zf, sheet_member, shared_strings, date_styles):
+                yield row
+                read_rows += 1
+            return
+        except Exception as e:
+            print(f"Error parsing sheet XML of {path}, reading on with openpyxl: {str(e)}", file=sys.stderr)
+        finally:
+            zf.close()
+    
+    wb = openpyxl.load_workbook(path, read_only=True)
+    try:
+        yield from wb.active.iter_rows(min_row=read_rows + 1, values_only=True)
+    finally:
+        wb.close()
+
+def row_to_dict(worksheet, row_idx, columns):
+    """Read a single worksheet row into a dictionary."""
+    return {col_name: worksheet.cell(row=row_idx, column=col_idx).value
+            for col_idx, col_name in enumerate(columns, start=1)}
+
+def parse_json_list(value):
+    """Parse a JSON list stored in a cell, returning [] for anything else."""
+    if isinstance(value, list):
+        return value
+    if not value:
+        return []
+    try:
+        parsed = json.loads(value)
+    except:
+        return []
+    return parsed if isinstance(parsed, list) else []
+
+def parse_created_date(request):
+    """Get the creation date of a request from createdAt or dateCreated."""
+    try:
+        created_at = request.get('createdAt')
+        if isinstance(created_at, datetime):
+            return created_at
+        if created_at:
+            return datetime.fromisoformat(str(created_at))
+        date_created = request.get('dateCreated')
+        if isinstance(date_created, datetime):
+            return date_created
+        if date_created:
+            return datetime.strptime(str(date_created), "%d/%m/%Y")
+    except:
+        pass
+    return None
+
+def file_signature(path):
+    """Get a cheap [mtime, size] signature used to detect changes to a file."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+def dataset_tag(path, *extra):
+    """Get a version tag for the data stored in a file.
+    
+    The tag is derived from the file signature (plus any query parameters
+    that shape the result), so computing it costs a single stat call.
+    """
+    snapshot = reading_snapshot()
+    # Snapshot readers must not see the file while the writer is saving it
+    signature = snapshot['signature'] if snapshot is not None and path == REQUESTS_FILE else file_signature(path)
+    payload = json.dumps([os.path.basename(path), signature, list(extra)], sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:20]
+
+def conditional_read(path, if_none_match, read, *extra):
+    """Run a read operation unless the caller already has the current data.
+    
+    Returns {'tag', 'notModified'} without touching the workbook when
+    if_none_match equals the current tag, else {'tag', 'notModified', 'data'}.
+    """
+    tag = dataset_tag(path, *extra)
+    if if_none_match and if_none_match == tag:
+        return {'tag': tag, 'notModified': True}
+    
+    data = read()
+    # The file may have been rewritten while we were reading it
+    if dataset_tag(path, *extra) != tag:
+        tag = None
+    return {'tag': tag, 'notModified': False, 'data': data}
+
+def load_requests_meta():
+    """Load the requests sidecar metadata, or an empty dict if unavailable."""
+    try:
+        with open(REQUESTS_META_FILE, 'r') as f:
+            meta = json.load(f)
+        return meta if isinstance(meta, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+def save_requests_meta(meta):
+    """Atomically write the requests sidecar metadata."""
+    tmp_file = REQUESTS_META_FILE + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_file, REQUESTS_META_FILE)
+
+def bump_count(counter, keys, delta):
+    """Add delta to a nested counter, pruning entries that drop to zero."""
+    if len(keys) == 1:
+        value = counter.get(keys[0], 0) + delta
+        if value > 0:
+            counter[keys[0]] = value
+        else:
+            counter.pop(keys[0], None)
+        return
+    child = counter.setdefault(keys[0], {})
+    bump_count(child, keys[1:], delta)
+    if not child:
+        del counter[keys[0]]
+
+def apply_request_stats(stats, request, delta):
+    """Add (delta=1) or remove (delta=-1) a raw request row from the aggregates."""
+    status = str(request.get('status') or 'Unknown')
+    department = str(request.get('department') or 'Unknown')
+    request_type = str(request.get('type') or 'request')
+    
+    stats['total'] = stats.get('total', 0) + delta
+    bump_count(stats.setdefault('counts', {}), [status, department, request_type], delta)
+    
+    if status == 'Pending':
+        created_date = parse_created_date(request)
+        day = created_date.date().isoformat() if created_date else 'unknown'
+        bump_count(stats.setdefault('pendingByDay', {}), [day], delta)
+    
+    if status in OPEN_STATUSES:
+        users = set(str(user) for user in parse_json_list(request.get('acceptedBy')))
+        if request.get('creator'):
+            users.add(str(request.get('creator')))
+        open_by_user = stats.setdefault('openByUser', {})
+        for user in users:
+            bump_count(open_by_user, [user], delta)
+
+def build_request_stats(requests):
+    """Build the aggregates from scratch with a single pass over raw rows."""
+    stats = {'total': 0, 'counts': {}, 'pendingByDay': {}, 'openByUser': {}}
+    for request in requests:
+        apply_request_stats(stats, request, 1)
+    return stats
+
+def row_version(request):
+    """Get the data version a request row was last written at (0 if never)."""
+    try:
+        return int(request.get(ROW_VERSION_COLUMN) or 0)
+    except (TypeError, ValueError):
+        return 0
+
+def next_rebuild_version(meta, requests):
+    """Get a data version newer than both the sidecar and every stamped row."""
+    max_row_version = max([row_version(request) for request in requests] + [0])
+    return max(int(meta.get('version', 0)), max_row_version) + 1
+
+def rebuild_requests_meta(meta, requests, version=None):
+    """Rebuild the sidecar from raw rows after it was lost or went stale.
+    
+    Deletions since the last known version cannot be recovered, so the
+    version jumps past every stamped row and becomes the new tombstone
+    horizon: change feed clients older than that are told to reset.
+    """
+    if version is None:
+        version = next_rebuild_version(meta, requests)
+    
+    meta['stats'] = build_request_stats(requests)
+    meta['version'] = version
+    meta['horizon'] = version
+    meta['tombstones'] = []
+    return meta
+
+def load_fresh_requests_meta():
+    """Load the requests sidecar, rebuilding it if it does not match requests.xlsx."""
+    signature = file_signature(REQUESTS_FILE)
+    meta = load_requests_meta()
+    
+    if meta.get('stats') is None or meta.get('signature') != signature:
+        requests = []
+        if signature is not None:
+            requests = rows_to_dicts(REQUESTS_FILE)
+        
+        rebuild_requests_meta(meta, requests)
+        meta['signature'] = signature
+        save_requests_meta(meta)
+    
+    return meta
+
+def bump_data_version():
+    """Advance the data version for writes that do not touch requests.xlsx."""
+    try:
+        meta = load_requests_meta()
+        meta['version'] = int(meta.get('version', 0)) + 1
+        save_requests_meta(meta)
+        return meta['version']
+    except Exception as e:
+        print(f"Error updating data version: {str(e)}", file=sys.stderr)
+        return None
+
+def ensure_column(worksheet, column_name):
+    """Get the 1-based index of a header column, appending it if missing."""
+    columns = get_column_names(worksheet)
+    if column_name in columns:
+        return columns.index(column_name) + 1
+    
+    while columns and columns[-1] is None:
+        columns.pop()
+    col_idx = len(columns) + 1
+    worksheet.cell(row=1, column=col_idx, value=column_name)
+    return col_idx
+
+def stamp_row_versions(worksheet, request_ids, version):
+    """Write the data version into the rowVersion cell of the given requests."""
+    col_idx = ensure_column(worksheet, ROW_VERSION_COLUMN)
+    remaining = set(str(request_id) for request_id in request_ids)
+    
+    for row_idx, row in enumerate(worksheet.iter_rows(min_row=2, max_col=1, values_only=True), start=2):
+        if not remaining:
+            break
+        if str(row[0]) in remaining:
+            worksheet.cell(row=row_idx, column=col_idx, value=version)
+            remaining.discard(str(row[0]))
+
+def find_request_row(worksheet, request_id):
+    """Get the row index of a request by ID, or None if it is not in the sheet."""
+    for row_idx, row in enumerate(worksheet.iter_rows(min_row=2, max_col=1, values_only=True), start=2):
+        if str(row[0]) == str(request_id):
+            return row_idx
+    return None
+
+def append_request_row(worksheet, request, row_idx=None):
+    """Write a raw request dictionary to a new row (or over row row_idx), adding missing columns."""
+    for col_name in request:
+        if col_name is not None and col_name not in get_column_names(worksheet):
+            ensure_column(worksheet, col_name)
+    
+    next_row = row_idx or worksheet.max_row + 1
+    for col_idx, col_name in enumerate(get_column_names(worksheet), start=1):
+        if col_name in request:
+            worksheet.cell(row=next_row, column=col_idx, value=request[col_name])
+    return next_row
+
+def read_header(path):
+    """Read just the header row of a workbook."""
+    rows = iter_sheet_values(path)
+    try:
+        return [name for name in next(rows, ()) if name is not None]
+    finally:
+        rows.close()
+
+def open_archive_workbook(columns):
+    """Load the archive workbook, or create one with the given header."""
+    if os.path.exists(ARCHIVE_FILE):
+        return openpyxl.load_workbook(ARCHIVE_FILE)
+    
+    wb = openpyxl.Workbook()
+    for col_idx, col_name in enumerate(columns, start=1):
+        wb.active.cell(row=1, column=col_idx, value=col_name)
+    return wb
+
+# Group commit state used by serve mode; see begin_commit_batch
+commit_batch = {'active': False}
+
+def begin_commit_batch():
+    """Start deferring requests.xlsx saves into one shared workbook.
+    
+    While a batch is active, open_requests_workbook hands every caller the
+    same in-memory workbook and save_requests_workbook only stamps the rows
+    and collects the changes; flush_commit_batch does the single save.
+    """
+    commit_batch.clear()
+    commit_batch.update({'active': True, 'wb': None, 'signature': None, 'write': None, 'changes': [],
+                         'failed': False, 'external': False})
+
+def fail_commit_batch_write():
+    """Flag that a write failed part way, so the batch workbook may hold partial edits."""
+    if commit_batch['active']:
+        commit_batch['failed'] = True
+
+def note_external_save():
+    """Flag that a write inside a batch saved a file itself instead of deferring to the batch."""
+    if commit_batch['active']:
+        commit_batch['external'] = True
+
+def discard_commit_batch():
+    """Drop the batch workbook and any writes deferred to it."""
+    commit_batch.clear()
+    commit_batch['active'] = False
+
+def flush_commit_batch():
+    """Save the batch workbook once for every write deferred to it and end the batch.
+    
+    Returns {'signature', 'changes'} (the signature the workbook was loaded
+    at and the saved changes), or None if nothing was written.
+    """
+    try:
+        wb = commit_batch.get('wb')
+        write = commit_batch.get('write')
+        if wb is None or write is None:
+            return None
+        
+        save_request_rows(wb, commit_batch['signature'], commit_batch['changes'])
+        record_requests_write(wb, write, commit_batch['changes'])
+        return {'signature': commit_batch['signature'], 'changes': commit_batch['changes']}
+    finally:
+        discard_commit_batch()
+
+def save_request_rows(wb, signature, changes):
+    """Save requests.xlsx, rewriting only the changed rows when that is safe.
+    
+    When every change updates an existing row and the file is still the one
+    the workbook was loaded from, with the same header, just those rows are
+    patched into it (see patch_xlsx_rows). Anything else (creates, deletes,
+    new columns, a file changed underneath us) gets a full save.
+    """
+    ws = wb.active
+    ids = set()
+    for before, after in changes:
+        if not before or not after or str(before.get('id')) != str(after.get('id')):
+            ids = None
+            break
+        ids.add(str(after.get('id')))
+    
+    if (ids and signature is not None and file_signature(REQUESTS_FILE) == signature and
+            read_header(REQUESTS_FILE) == [name for name in get_column_names(ws) if name is not None]):
+        rows = {}
+        for row_idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
+            if str(row[0]) in ids:
+                rows[row_idx] = row
+        if len(rows) == len(ids) and patch_xlsx_rows(REQUESTS_FILE, rows):
+            return
+    
+    save_workbook(wb, REQUESTS_FILE)
+
+def open_requests_workbook():
+    """Load requests.xlsx together with the signature it was read at."""
+    if commit_batch['active']:
+        if commit_batch['wb'] is None:
+            commit_batch['signature'] = file_signature(REQUESTS_FILE)
+            commit_batch['wb'] = openpyxl.load_workbook(REQUESTS_FILE)
+        return commit_batch['wb'], commit_batch['signature']
+    
+    signature = file_signature(REQUESTS_FILE)
+    return openpyxl.load_workbook(REQUESTS_FILE), signature
+
+def prepare_requests_write(wb, signature):
+    """Pick the data version of a write to requests.xlsx.
+    
+    The write is fresh when the sidecar matches the file we loaded; then
+    the aggregates can be adjusted incrementally after the save.
+    """
+    meta = load_requests_meta()
+    fresh = (meta.get('stats') is not None and signature is not None and
+             meta.get('signature') == signature)
+    
+    if fresh:
+        version = int(meta.get('version', 0)) + 1
+    else:
+        version = next_rebuild_version(meta, rows_to_dicts(wb.active))
+    return {'meta': meta, 'fresh': fresh, 'version': version}
+
+def record_requests_write(wb, write, changes):
+    """Record a saved write in the requests sidecar."""
+    meta = write['meta']
+    version = write['version']
+    try:
+        if write['fresh']:
+            stats = meta['stats']
+            tombstones = meta.setdefault('tombstones', [])
+            for before, after in changes:
+                if before:
+                    apply_request_stats(stats, before, -1)
+                if after:
+                    apply_request_stats(stats, after, 1)
+                # A renamed request is gone under its old id as well
+                if before and before.get('id') and (not after or str(after.get('id')) != str(before.get('id'))):
+                    tombstones.append([str(before.get('id')), version])
+            
+            if len(tombstones) > TOMBSTONE_LIMIT:
+                dropped = tombstones[:-TOMBSTONE_LIMIT]
+                meta['tombstones'] = tombstones[-TOMBSTONE_LIMIT:]
+                meta['horizon'] = max(int(meta.get('horizon', 0)), dropped[-1][1])
+            meta['version'] = version
+        else:
+            rebuild_requests_meta(meta, rows_to_dicts(wb.active), version)
+        
+        meta['signature'] = file_signature(REQUESTS_FILE)
+        save_requests_meta(meta)
+    except Exception as e:
+        print(f"Error updating request metadata: {str(e)}", file=sys.stderr)
+        # A stale sidecar is worse than none; readers rebuild a missing one
+        if os.path.exists(REQUESTS_META_FILE):
+            os.remove(REQUESTS_META_FILE)
+
+def save_requests_workbook(wb, signature, changes):
+    """Save requests.xlsx and record the write in the requests sidecar.
+    
+    changes is a list of (before, after) raw row dictionaries, with None
+    standing for a row that did not exist before or no longer exists after.
+    The write gets the next data version: it is stamped into the rowVersion
+    cell of every surviving changed row (and into the after dictionaries),
+    deleted ids become tombstones, and the aggregates are adjusted. If the
+    sidecar does not match the file we loaded (first run, or the file was
+    replaced externally) it is rebuilt from the saved sheet instead.
+    
+    Inside a commit batch the save is deferred to flush_commit_batch and
+    all writes of the batch share one data version.
+    
+    Returns the data version of the write.
+    """
+    deferred = commit_batch['active'] and wb is commit_batch['wb']
+    if deferred and commit_batch['write'] is not None:
+        write = commit_batch['write']
+    else:
+        write = prepare_requests_write(wb, signature)
+    version = write['version']
+    
+    updated_ids = [after.get('id') for _, after in changes if after and after.get('id')]
+    stamp_row_versions(wb.active, updated_ids, version)
+    for _, after in changes:
+        if after:
+            after[ROW_VERSION_COLUMN] = version
+    
+    if deferred:
+        commit_batch['write'] = write
+        commit_batch['changes'].extend(changes)
+        return version
+    
+    note_external_save()
+    save_request_rows(wb, signature, changes)
+    record_requests_write(wb, write, changes)
+    return version
+
+def get_departments(if_none_match=None):
+    """Get all departments from Excel.
+    
+    Passing if_none_match (a tag, or '' for none) returns a conditional_read
+    envelope instead of the bare list.
+    """
+    if if_none_match is not None:
+        return conditional_read(DEPARTMENTS_FILE, if_none_match, get_departments)
+    
     try:
         if not os.path.exists(DEPARTMENTS_FILE):
             return []
         
-        wb = openpyxl.load_workbook(DEPARTMENTS_FILE)
-        ws = wb.active
-        departments = rows_to_dicts(ws)
+        departments = rows_to_dicts(DEPARTMENTS_FILE)
         
         return departments
     except Exception as e:
         print(f"Error getting departments: {str(e)}", file=sys.stderr)
         return []
 
-def get_users():
-    """Get all users from Excel."""
+# Users kept in memory (warm in serve mode), rebuilt when users.xlsx changes
+user_directory = {'signature': None}
+
+def load_user_directory():
+    """Get the cached user directory, reloading it if users.xlsx changed.
+    
+    The directory holds the columns, the users (with passwords) in sheet
+    order, a username index, and an index from the first column (the user
+    id) to the worksheet row.
+    """
+    signature = file_signature(USERS_FILE)
+    if signature is None:
+        return None
+    if user_directory['signature'] == signature:
+        return user_directory
+    
+    columns = []
+    users = []
+    by_username = {}
+    rows_by_id = {}
+    for row_idx, row in enumerate(iter_sheet_values(USERS_FILE), start=1):
+        if row_idx == 1:
+            columns = list(row)
+            continue
+        
+        user = {columns[i]: value for i, value in enumerate(row) if i < len(columns)}
+        if not any(user.values()):  # Skip empty rows
+            continue
+        
+        users.append(user)
+        # The first matching row wins, as with the old linear scan
+        by_username.setdefault(user.get('username'), user)
+        rows_by_id.setdefault(row[0] if row else None, row_idx)
+    
+    user_directory.clear()
+    user_directory.update({
+        'signature': signature,
+        'columns': columns,
+        'users': users,
+        'byUsername': by_username,
+        'rowsById': rows_by_id
+    })
+    return user_directory
+
+def public_user(user):
+    """Copy a user without sensitive information."""
+    user = dict(user)
+    if 'password' in user:
+        del user['password']
+    return user
+
+def get_users(if_none_match=None):
+    """Get all users from Excel.
+    
+    Passing if_none_match (a tag, or '' for none) returns a conditional_read
+    envelope instead of the bare list.
+    """
+    if if_none_match is not None:
+        return conditional_read(USERS_FILE, if_none_match, get_users)
+    
     try:
-        if not os.path.exists(USERS_FILE):
+        directory = load_user_directory()
+        if directory is None:
             return []
         
-        wb = openpyxl.load_workbook(USERS_FILE)
-        ws = wb.active
-        users = rows_to_dicts(ws)
-        
         # Remove sensitive information
-        for user in users:
-            if 'password' in user:
-                del user['password']
-        
-        return users
+        return [public_user(user) for user in directory['users']]
     except Exception as e:
         print(f"Error getting users: {str(e)}", file=sys.stderr)
         return []
@@ -88,20 +1274,16 @@ def get_users():
 def login_user(username, password):
     """Authenticate user by username and password."""
     try:
-        if not os.path.exists(USERS_FILE):
+        directory = load_user_directory()
+        if directory is None:
             return None
         
-        wb = openpyxl.load_workbook(USERS_FILE)
-        ws = wb.active
-        users = rows_to_dicts(ws)
-        
-        for user in users:
-            if user.get('username') == username:
-                # For demo purposes, allow login without password check
-                if not password or user.get('password') == password:
-                    if 'password' in user:
-                        del user['password']
-                    return user
+        user = directory['byUsername'].get(username)
+        # For demo purposes, allow login without password check
+        if user and (not password or user.get('password') == password):
+            user = public_user(user)
+            user['sessionToken'] = create_session(user)
+            return user
         
         return None
     except Exception as e:
@@ -116,31 +1298,40 @@ def update_user(user_id, user_data):
         
         user_data = json.loads(user_data)
         
-        wb = openpyxl.load_workbook(USERS_FILE)
-        ws = wb.active
-        columns = get_column_names(ws)
-        
         # Find user row by ID
-        user_row = None
-        for row_idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-            if row[0] == user_id:
-                user_row = row_idx
-                break
-        
+        directory = load_user_directory()
+        user_row = directory['rowsById'].get(user_id) if directory else None
         if not user_row:
             return None
         
+        wb = openpyxl.load_workbook(USERS_FILE)
+        ws = wb.active
+        columns = get_column_names(ws)
+        
         # Update user data
         for col_idx, col_name in enumerate(columns, start=1):
             if col_name in user_data:
                 ws.cell(row=user_row, column=col_idx, value=user_data[col_name])
         
-        wb.save(USERS_FILE)
+        save_workbook(wb, USERS_FILE)
+        bump_data_version()
         
         # Return updated user
         updated_user = {col_name: ws.cell(row=user_row, column=col_idx+1).value 
                       for col_idx, col_name in enumerate(columns)}
         
+        # Keep the warm directory in step with the file we just wrote
+        refresh_user_sessions(updated_user)
+        
+        cached = next((user for user in directory['users'] if user.get(columns[0]) == user_id), None)
+        if (columns == directory['columns'] and cached is not None and
+            cached.get('username') == updated_user.get('username')):
+            cached.update(updated_user)
+            directory['signature'] = file_signature(USERS_FILE)
+        else:
+            # Renames can change which row a username resolves to; rebuild on next use
+            directory['signature'] = None
+        
         if 'password' in updated_user:
             del updated_user['password']
         
@@ -149,53 +1340,744 @@ def update_user(user_id, user_data):
         print(f"Error updating user: {str(e)}", file=sys.stderr)
         return None
 
-def get_requests():
-    """Get all requests from Excel."""
-    try:
-        if not os.path.exists(REQUESTS_FILE):
-            return []
-        
-        wb = openpyxl.load_workbook(REQUESTS_FILE)
-        ws = wb.active
-        requests = rows_to_dicts(ws)
-        
-        # Process JSON fields
-        for request in requests:
-            # Convert string fields to proper types
-            for field in ['acceptedBy', 'departments', 'rejections', 'participantsCompleted']:
-                if field in request and request[field] and isinstance(request[field], str):
-                    try:
-                        request[field] = json.loads(request[field])
-                    except:
-                        request[field] = []
-            
-            # Convert boolean fields
-            for field in ['multiDepartment', 'archived']:
-                if field in request and request[field] in ['TRUE', 'True', 'true', 1]:
-                    request[field] = True
-                elif field in request and request[field] in ['FALSE', 'False', 'false', 0, None, '']:
-                    request[field] = False
-            
-            # Convert numeric fields
-            for field in ['usersNeeded', 'usersAccepted']:
-                if field in request and request[field] not in [None, '']:
-                    try:
-                        request[field] = int(request[field])
-                    except:
-                        pass
-        
-        return requests
-    except Exception as e:
-        print(f"Error getting requests: {str(e)}", file=sys.stderr)
-        return []
+# Sessions kept in memory (warm in serve mode): sessions.json as of the last
+# compaction plus the sessions.log lines read up to offset; serve sets memory
+# when the files are not used
+session_store = {'signature': None, 'sessions': OrderedDict(), 'offset': 0, 'logged': 0, 'memory': False}
 
-def create_request(request_data):
-    """Create a new request in Excel."""
-    try:
-        request_data = json.loads(request_data)
-        
-        # Generate ID if not provided
-        if 'id' not in request_data:
+def session_key(token):
+    """Get the key a session token is stored under."""
+    return hashlib.sha256(str(token).encode('utf-8')).hexdigest()
+
+@contextmanager
+def sessions_lock():
+    """Hold an exclusive lock on sessions.lock, shared by every process."""
+    with open(SESSIONS_LOCK_FILE, 'a+') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def load_sessions():
+    """Get the sessions (oldest first), catching up with sessions.json and sessions.log."""
+    if session_store['memory']:
+        return session_store['sessions']
+    with sessions_lock():
+        return read_sessions()
+
+def read_sessions():
+    """Catch up with sessions.json and sessions.log; the caller holds sessions_lock.
+    
+    sessions.log holds one JSON line per session change since sessions.json
+    was written; only the lines added since the last call are read, and
+    both files are read again after another process compacted them.
+    """
+    signature = file_signature(SESSIONS_FILE)
+    log_signature = file_signature(SESSIONS_LOG_FILE)
+    log_size = log_signature[1] if log_signature is not None else 0
+    if session_store['signature'] != signature or log_size < session_store['offset']:
+        sessions = OrderedDict()
+        if signature is not None:
+            try:
+                with open(SESSIONS_FILE, 'r') as f:
+                    sessions = OrderedDict(json.load(f))
+            except (OSError, ValueError):
+                pass
+        session_store.update({'signature': signature, 'sessions': sessions, 'offset': 0, 'logged': 0})
+    
+    if log_size > session_store['offset']:
+        with open(SESSIONS_LOG_FILE, 'rb') as f:
+            f.seek(session_store['offset'])
+            data = f.read()
+        # A line still being appended is read on a later call
+        data = data[:data.rfind(b'\n') + 1]
+        sessions = session_store['sessions']
+        for line in data.splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get('session') is None:
+                sessions.pop(entry.get('key'), None)
+            else:
+                sessions[entry['key']] = entry['session']
+            session_store['logged'] += 1
+        session_store['offset'] += len(data)
+    return session_store['sessions']
+
+def log_sessions(changes):
+    """Append (key, session) changes, None ending a session, to sessions.log.
+    
+    The log is folded into sessions.json, dropping expired sessions and
+    the oldest beyond SESSION_LIMIT, once it has SESSION_LOG_LIMIT lines;
+    a login therefore appends one line instead of rewriting every session.
+    The lock keeps another process from appending between the read and
+    the compaction. In memory-only mode the changes are just applied.
+    """
+    if session_store['memory']:
+        sessions = session_store['sessions']
+        for key, session in changes:
+            if session is None:
+                sessions.pop(key, None)
+            else:
+                sessions[key] = session
+        prune_sessions(sessions)
+        return
+    
+    with sessions_lock():
+        with open(SESSIONS_LOG_FILE, 'a') as f:
+            f.write(''.join(json.dumps({'key': key, 'session': session}) + '\n' for key, session in changes))
+        sessions = read_sessions()
+        if session_store['logged'] >= SESSION_LOG_LIMIT:
+            compact_sessions(sessions)
+
+def prune_sessions(sessions):
+    """Drop expired sessions and the oldest beyond SESSION_LIMIT."""
+    # Every session has the same lifetime, so the oldest are the first to expire
+    now = time.time()
+    while sessions and next(iter(sessions.values()))['expiresAt'] <= now:
+        sessions.popitem(last=False)
+    while len(sessions) > SESSION_LIMIT:
+        sessions.popitem(last=False)
+
+def compact_sessions(sessions):
+    """Prune the sessions, atomically write sessions.json and start a new sessions.log.
+    
+    The caller holds sessions_lock.
+    """
+    prune_sessions(sessions)
+    
+    tmp_file = SESSIONS_FILE + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(sessions, f)
+    os.replace(tmp_file, SESSIONS_FILE)
+    if os.path.exists(SESSIONS_LOG_FILE):
+        os.remove(SESSIONS_LOG_FILE)
+    session_store.update({'signature': file_signature(SESSIONS_FILE), 'offset': 0, 'logged': 0})
+
+def create_session(user):
+    """Issue a session token for a logged in user."""
+    token = secrets.token_urlsafe(32)
+    session = {field: user.get(field) for field in SESSION_FIELDS}
+    session['expiresAt'] = time.time() + SESSION_TTL_SECONDS
+    log_sessions([(session_key(token), session)])
+    return token
+
+def resolve_session(token):
+    """Get the user behind a session token, or None if it is unknown or expired."""
+    try:
+        session = load_sessions().get(session_key(token))
+        if not session or session['expiresAt'] <= time.time():
+            return None
+        return dict(session)
+    except Exception as e:
+        print(f"Error resolving session: {str(e)}", file=sys.stderr)
+        return None
+
+def end_session(token):
+    """Invalidate a session token."""
+    try:
+        if session_key(token) not in load_sessions():
+            return False
+        log_sessions([(session_key(token), None)])
+        return True
+    except Exception as e:
+        print(f"Error ending session: {str(e)}", file=sys.stderr)
+        return False
+
+def refresh_user_sessions(user):
+    """Copy updated user fields into the sessions of that user."""
+    changes = []
+    for key, session in load_sessions().items():
+        if session.get('id') == user.get('id'):
+            session = dict(session)
+            session.update({field: user.get(field) for field in SESSION_FIELDS})
+            changes.append((key, session))
+    if changes:
+        log_sessions(changes)
+
+def decode_request(request):
+    """Convert a raw request row to API types in place and return it."""
+    # Convert string fields to proper types
+    for field in ['acceptedBy', 'departments', 'rejections', 'participantsCompleted']:
+        if field in request and request[field] and isinstance(request[field], str):
+            try:
+                request[field] = json.loads(request[field])
+            except:
+                request[field] = []
+    
+    # Convert boolean fields
+    for field in ['multiDepartment', 'archived']:
+        if field in request and request[field] in ['TRUE', 'True', 'true', 1]:
+            request[field] = True
+        elif field in request and request[field] in ['FALSE', 'False', 'false', 0, None, '']:
+            request[field] = False
+    
+    # Convert numeric fields
+    for field in ['usersNeeded', 'usersAccepted']:
+        if field in request and request[field] not in [None, '']:
+            try:
+                request[field] = int(request[field])
+            except:
+                pass
+    
+    return request
+
+# Serve mode: readers are answered from an immutable snapshot of requests.xlsx
+# that the writer thread replaces after every write (see publish_requests_snapshot).
+# The only thing added to a published snapshot is its lazily built
+# creator/participant indexes, under snapshot_index_lock.
+requests_snapshot = {'current': None}
+# The snapshot the current thread is reading from, if any
+snapshot_reads = threading.local()
+snapshot_index_lock = threading.Lock()
+
+def reading_snapshot():
+    """Get the requests snapshot the current thread reads from, or None to read the file."""
+    return getattr(snapshot_reads, 'snapshot', None)
+
+# Bitmap positions are read back a byte at a time, skipping zero bytes
+NONZERO_BYTE = re.compile(b'[^\x00]')
+BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+# Deleting more rows than this rebuilds the bitmaps instead of splicing them
+BITMAP_SPLICE_LIMIT = 1000
+
+def bitmap_key(request, field):
+    """Get the value a decoded request is filed under in the bitmap index of field."""
+    if field in ('multiDepartment', 'archived'):
+        return request.get(field) in ['TRUE', 'True', 'true', True, 1]
+    return request.get(field)
+
+def build_bitmaps(requests, fields=BITMAP_FILTER_FIELDS):
+    """Build {field: {value: bitmap}} for fields; bit i stands for requests[i]."""
+    size = (len(requests) + 7) // 8
+    bitmaps = {}
+    for field in fields:
+        arrays = {}
+        for position, request in enumerate(requests):
+            key = bitmap_key(request, field)
+            array = arrays.get(key)
+            if array is None:
+                array = arrays[key] = bytearray(size)
+            array[position >> 3] |= 1 << (position & 7)
+        bitmaps[field] = {key: int.from_bytes(array, 'little') for key, array in arrays.items()}
+    return bitmaps
+
+def advance_bitmaps(bitmaps, updates, removed):
+    """Apply (position, old request or None, new request) updates to copies of bitmaps,
+    then close the gaps left by the removed positions."""
+    bitmaps = {field: dict(values) for field, values in bitmaps.items()}
+    for position, old, new in updates:
+        bit = 1 << position
+        for field, values in bitmaps.items():
+            key = bitmap_key(new, field)
+            if old is not None:
+                old_key = bitmap_key(old, field)
+                if old_key == key:
+                    continue
+                values[old_key] &= ~bit
+                if not values[old_key]:
+                    del values[old_key]
+            values[key] = values.get(key, 0) | bit
+    
+    # Every later row moves up by one for each removed row before it
+    for position in sorted(removed, reverse=True):
+        below = (1 << position) - 1
+        for values in bitmaps.values():
+            for key, bits in list(values.items()):
+                bits = (bits & below) | (bits >> (position + 1) << position)
+                if bits:
+                    values[key] = bits
+                else:
+                    del values[key]
+    return bitmaps
+
+def bitmap_positions(bits):
+    """List the set bits of a bitmap in ascending order."""
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+    return [match.start() * 8 + bit for match in NONZERO_BYTE.finditer(data)
+            for bit in BYTE_BITS[data[match.start()]]]
+
+def popcount(bits):
+    """Count the set bits of a bitmap."""
+    return bin(bits).count('1')
+
+def positions_bitmap(positions, size):
+    """Build a bitmap of size rows with the given positions set."""
+    array = bytearray((size + 7) // 8)
+    for position in positions:
+        array[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(array, 'little')
+
+def epoch_seconds(value, text_format=None):
+    """Convert a stored time (datetime or text) to epoch seconds, or None if it does not parse.
+    
+    Text is read as ISO, or with text_format when given.
+    """
+    try:
+        if not isinstance(value, datetime):
+            if not value:
+                return None
+            if text_format:
+                value = datetime.strptime(str(value), text_format)
+            else:
+                value = datetime.fromisoformat(str(value))
+        return value.timestamp()
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+
+def request_time(request, key):
+    """Get one of the TIME_KEYS times of a decoded request as epoch seconds, or None."""
+    if key == 'archivedAt':
+        return epoch_seconds(request.get('archivedAt'))
+    if key == 'updatedAt' and request.get('lastStatusUpdate'):
+        return epoch_seconds(request.get('lastStatusUpdate'))
+    # Same precedence as parse_created_date
+    if request.get('createdAt'):
+        return epoch_seconds(request.get('createdAt'))
+    return epoch_seconds(request.get('dateCreated'), "%d/%m/%Y")
+
+def sort_time_indexes(times):
+    """Sort {key: epoch per position} into {key: sorted [(epoch, position)]}, leaving out missing times."""
+    return {key: sorted((epoch, position) for position, epoch in enumerate(values) if epoch is not None)
+            for key, values in times.items()}
+
+def advance_time_indexes(times, time_indexes, updates, removed):
+    """Apply (position, old request or None, new request) updates and removed positions
+    to copies of the snapshot times and their sorted indexes; returns both."""
+    times = {key: list(values) for key, values in times.items()}
+    moved = {key: [] for key in times}
+    for position, old, new in updates:
+        for key, values in times.items():
+            epoch = request_time(new, key)
+            if position < len(values):
+                if values[position] != epoch:
+                    moved[key].append((position, values[position], epoch))
+                values[position] = epoch
+            else:
+                moved[key].append((position, None, epoch))
+                values.append(epoch)
+    
+    if removed:
+        # Positions after a removed row shift, so the indexes are sorted again
+        times = {key: [epoch for position, epoch in enumerate(values) if position not in removed]
+                 for key, values in times.items()}
+        return times, sort_time_indexes(times)
+    
+    time_indexes = dict(time_indexes)
+    for key, changes in moved.items():
+        if not changes:
+            continue
+        entries = time_indexes[key] = list(time_indexes[key])
+        for position, old_epoch, epoch in changes:
+            if old_epoch is not None:
+                del entries[bisect.bisect_left(entries, (old_epoch, position))]
+            if epoch is not None:
+                bisect.insort(entries, (epoch, position))
+    return times, time_indexes
+
+def make_requests_snapshot(signature, requests, maintained=None):
+    """Build a snapshot from decoded requests in sheet order.
+    
+    maintained holds the snapshot's bitmaps, times and time indexes when
+    the caller kept them up to date (advance_requests_snapshot); otherwise
+    they are built here.
+    """
+    positions = {}
+    for position, request in enumerate(requests):
+        positions.setdefault(str(request.get('id')), position)
+    
+    # The sidecar aggregates are only valid for the file they were written with
+    meta = load_requests_meta()
+    if meta.get('stats') is not None and meta.get('signature') == signature:
+        stats = meta['stats']
+    else:
+        stats = build_request_stats(requests)
+    
+    if maintained is None:
+        # Times are parsed once here and on writes, never per query
+        times = {key: [request_time(request, key) for request in requests] for key in TIME_KEYS}
+        maintained = {'bitmaps': build_bitmaps(requests), 'times': times,
+                      'timeIndexes': sort_time_indexes(times)}
+    
+    return {
+        'signature': signature,
+        'requests': tuple(requests),
+        'positions': positions,
+        'stats': stats,
+        'bitmaps': maintained['bitmaps'],
+        'times': maintained['times'],
+        'timeIndexes': maintained['timeIndexes'],
+        # creator/participant indexes, built on first use (see snapshot_filter_index)
+        'indexes': {}
+    }
+
+def build_requests_snapshot():
+    """Decode requests.xlsx into a new snapshot."""
+    signature = file_signature(REQUESTS_FILE)
+    requests = []
+    if signature is not None:
+        requests = [decode_request(request) for request in iter_request_rows(REQUESTS_FILE)]
+    return make_requests_snapshot(signature, requests)
+
+def advance_requests_snapshot(snapshot, changes, signature):
+    """Build the snapshot that follows a saved list of (before, after) changes.
+    
+    Untouched requests are shared with the old snapshot, so this costs a
+    list copy rather than decoding the sheet again; the bitmap and time
+    indexes are updated for the changed rows only.
+    
+    Writes change the first row with an id, so a change is located by its
+    before id; an update that renames the request stays at that position.
+    """
+    requests = list(snapshot['requests'])
+    positions = dict(snapshot['positions'])
+    removed = set()
+    updates = []
+    duplicates = len(positions) < len(requests)
+    
+    def release(request_id):
+        # Point the id at its next row, if rows with duplicate ids exist
+        positions.pop(request_id, None)
+        if duplicates:
+            for position, request in enumerate(requests):
+                if position not in removed and str(request.get('id')) == request_id:
+                    positions[request_id] = position
+                    break
+    
+    for before, after in changes:
+        position = positions.get(str(before.get('id'))) if before else None
+        if after:
+            request_id = str(after.get('id'))
+            request = decode_request({key: value for key, value in after.items() if key is not None})
+            if position is None:
+                position = len(requests)
+                updates.append((position, None, request))
+                requests.append(request)
+            else:
+                updates.append((position, requests[position], request))
+                requests[position] = request
+                if str(before.get('id')) != request_id:
+                    release(str(before.get('id')))
+            if request_id in positions and positions[request_id] != position:
+                duplicates = True
+                positions[request_id] = min(positions[request_id], position)
+            else:
+                positions[request_id] = position
+        elif position is not None:
+            removed.add(position)
+            release(str(before.get('id')))
+    
+    if removed:
+        requests = [request for position, request in enumerate(requests) if position not in removed]
+    if len(removed) > BITMAP_SPLICE_LIMIT:
+        bitmaps = build_bitmaps(requests)
+    else:
+        bitmaps = advance_bitmaps(snapshot['bitmaps'], updates, removed)
+    times, time_indexes = advance_time_indexes(snapshot['times'], snapshot['timeIndexes'], updates, removed)
+    return make_requests_snapshot(signature, requests,
+                                  {'bitmaps': bitmaps, 'times': times, 'timeIndexes': time_indexes})
+
+def changes_add_columns(snapshot, changes):
+    """Check whether saved changes added a column to the sheet.
+    
+    A new column (rowVersion, a field of an imported record, ...) gives
+    every row a new key, so such a snapshot cannot be advanced and is read
+    again instead.
+    """
+    columns = set(snapshot['requests'][0]) if snapshot['requests'] else set()
+    return any(after and columns and any(key is not None and key not in columns for key in after)
+               for _, after in changes)
+
+def publish_requests_snapshot(saved=None):
+    """Replace the requests snapshot if requests.xlsx changed since it was built.
+    
+    saved is the result of flush_commit_batch; when that batch started from
+    the current snapshot, its changes are applied instead of re-reading.
+    """
+    current = requests_snapshot['current']
+    signature = file_signature(REQUESTS_FILE)
+    if current is not None and current['signature'] == signature:
+        if current['archiveSignature'] != file_signature(ARCHIVE_FILE):
+            # Only the archive workbook changed; requests.xlsx answers carry over
+            snapshot = dict(current)
+            snapshot['archiveSignature'], snapshot['archive'] = snapshot_archive(current)
+            carry_result_cache(snapshot, [])
+            requests_snapshot['current'] = snapshot
+        return
+    
+    if (saved and current is not None and saved['signature'] == current['signature'] and
+            not changes_add_columns(current, saved['changes'])):
+        snapshot = advance_requests_snapshot(current, saved['changes'], signature)
+        carry_result_cache(snapshot, saved['changes'])
+    else:
+        snapshot = build_requests_snapshot()
+        carry_result_cache(snapshot, None)
+    snapshot['archiveSignature'], snapshot['archive'] = snapshot_archive(current)
+    # Readers pick up the new snapshot on their next request
+    requests_snapshot['current'] = snapshot
+
+def snapshot_archive(previous):
+    """Get the archive signature and decoded archive rows for a new snapshot.
+    
+    Runs on the writer thread, so the archive matches requests.xlsx at the
+    time of the snapshot; rows are read again only when the file changed.
+    """
+    signature = file_signature(ARCHIVE_FILE)
+    if previous is not None and previous['archiveSignature'] == signature:
+        return signature, previous['archive']
+    return signature, tuple(get_archived_requests())
+
+# Serve-mode LRU cache of get_user_requests and filter_requests answers, keyed
+# by normalized query. Each entry belongs to one snapshot and is only served
+# for reads of that snapshot.
+result_cache = {'entries': OrderedDict(), 'bytes': 0, 'hits': 0, 'misses': 0,
+                'evictions': 0, 'invalidations': 0}
+result_cache_lock = threading.Lock()
+
+def cached_result(snapshot, key, matches, compute):
+    """Answer a snapshot read from the result cache, calling compute() on a miss.
+    
+    matches(request) tells whether a decoded request could be part of the
+    answer; carry_result_cache keeps the entry across writes that touch no
+    such request.
+    """
+    if RESULT_CACHE_MAX_ENTRIES <= 0:
+        return compute()
+    
+    entries = result_cache['entries']
+    with result_cache_lock:
+        entry = entries.get(key)
+        if entry is not None and entry['snapshot'] is snapshot:
+            entries.move_to_end(key)
+            result_cache['hits'] += 1
+            return list(entry['result'])
+        result_cache['misses'] += 1
+    
+    result = compute()
+    size = len(json.dumps(result, default=str))
+    if size > RESULT_CACHE_MAX_BYTES:
+        return result
+    
+    with result_cache_lock:
+        # Only keep answers for the snapshot readers currently get
+        if requests_snapshot['current'] is not snapshot:
+            return result
+        previous = entries.pop(key, None)
+        if previous is not None:
+            result_cache['bytes'] -= previous['size']
+        entries[key] = {'snapshot': snapshot, 'result': result, 'size': size, 'matches': matches}
+        result_cache['bytes'] += size
+        
+        while entries and (len(entries) > RESULT_CACHE_MAX_ENTRIES or result_cache['bytes'] > RESULT_CACHE_MAX_BYTES):
+            _, evicted = entries.popitem(last=False)
+            result_cache['bytes'] -= evicted['size']
+            result_cache['evictions'] += 1
+    return list(result)
+
+def carry_result_cache(snapshot, changes):
+    """Move result cache entries over to the next snapshot.
+    
+    An entry is dropped when one of the (before, after) changes matches
+    it before or after the write, since that request enters, leaves or
+    changes inside the answer. changes None (the snapshot was read from
+    the file again) drops every entry.
+    """
+    touched = None
+    if changes is not None:
+        touched = [decode_request({key: value for key, value in row.items() if key is not None})
+                   for change in changes for row in change if row]
+    
+    with result_cache_lock:
+        current = requests_snapshot['current']
+        entries = result_cache['entries']
+        for key, entry in list(entries.items()):
+            if entry['snapshot'] is current and touched is not None and \
+                    not any(entry['matches'](request) for request in touched):
+                entry['snapshot'] = snapshot
+                continue
+            
+            del entries[key]
+            result_cache['bytes'] -= entry['size']
+            if entry['snapshot'] is current:
+                result_cache['invalidations'] += 1
+
+def get_result_cache_stats():
+    """Get the size and hit/miss/eviction/invalidation counters of the result cache."""
+    with result_cache_lock:
+        return {
+            'entries': len(result_cache['entries']),
+            'bytes': result_cache['bytes'],
+            'maxEntries': RESULT_CACHE_MAX_ENTRIES,
+            'maxBytes': RESULT_CACHE_MAX_BYTES,
+            'hits': result_cache['hits'],
+            'misses': result_cache['misses'],
+            'evictions': result_cache['evictions'],
+            'invalidations': result_cache['invalidations']
+        }
+
+def get_requests(if_none_match=None, include_archived=False):
+    """Get all requests from Excel.
+    
+    Archived requests live in the archive workbook and are only read when
+    include_archived is set. Passing if_none_match (a tag, or '' for none)
+    returns a conditional_read envelope instead of the bare list.
+    """
+    if if_none_match is not None:
+        extra = ['archived', file_signature(ARCHIVE_FILE)] if include_archived else []
+        return conditional_read(REQUESTS_FILE, if_none_match,
+                                lambda: get_requests(include_archived=include_archived), *extra)
+    
+    try:
+        snapshot = reading_snapshot()
+        if snapshot is not None:
+            requests = list(snapshot['requests'])
+        else:
+            requests = []
+            if os.path.exists(REQUESTS_FILE):
+                requests = rows_to_dicts(REQUESTS_FILE)
+            
+            # Process JSON, boolean and numeric fields
+            for request in requests:
+                decode_request(request)
+        
+        if include_archived and os.path.exists(ARCHIVE_FILE):
+            requests.extend(decode_request(request) for request in iter_request_rows(ARCHIVE_FILE))
+        
+        return requests
+    except Exception as e:
+        print(f"Error getting requests: {str(e)}", file=sys.stderr)
+        return []
+
+def get_requests_since(since_version):
+    """Get requests created or updated after a data version.
+    
+    Returns the current version, the changed rows and the ids deleted since
+    then. When the caller's version predates the retained tombstones (or the
+    sidecar had to be rebuilt) 'reset' is set and every row is returned so
+    the client can replace its copy instead of merging.
+    """
+    try:
+        since = int(since_version)
+        if not os.path.exists(REQUESTS_FILE):
+            meta = load_requests_meta()
+            return {'version': int(meta.get('version', 0)), 'reset': True, 'requests': [], 'deleted': []}
+        
+        meta = load_fresh_requests_meta()
+        version = int(meta.get('version', 0))
+        reset = since < int(meta.get('horizon', 0)) or since > version
+        
+        # Nothing was written since the caller last polled
+        if not reset and since == version:
+            return {'version': version, 'reset': False, 'requests': [], 'deleted': []}
+        
+        rows = iter_sheet_values(REQUESTS_FILE)
+        columns = list(next(rows, ()))
+        version_idx = columns.index(ROW_VERSION_COLUMN) if ROW_VERSION_COLUMN in columns else None
+        
+        changed = []
+        for row in rows:
+            # Only decode rows stamped after the caller's version
+            if not reset:
+                if version_idx is None or version_idx >= len(row):
+                    continue
+                if row_version({ROW_VERSION_COLUMN: row[version_idx]}) <= since:
+                    continue
+            
+            item = {columns[i]: value for i, value in enumerate(row) if i < len(columns)}
+            if any(item.values()):
+                changed.append(decode_request(item))
+        
+        deleted = []
+        if not reset:
+            changed_ids = set(str(request.get('id')) for request in changed)
+            for request_id, deleted_version in meta.get('tombstones', []):
+                if deleted_version > since and request_id not in changed_ids and request_id not in deleted:
+                    deleted.append(request_id)
+        
+        return {'version': version, 'reset': reset, 'requests': changed, 'deleted': deleted}
+    except Exception as e:
+        print(f"Error getting request changes: {str(e)}", file=sys.stderr)
+        return None
+
+def summarize_request_stats(stats, now=None):
+    """Turn stored aggregates into the dashboard tile payload."""
+    now = now or datetime.now()
+    today = now.date()
+    counts = stats.get('counts', {})
+    
+    by_status = {}
+    by_department = {}
+    by_type = {}
+    for status, departments in counts.items():
+        for department, types in departments.items():
+            for request_type, count in types.items():
+                by_status[status] = by_status.get(status, 0) + count
+                by_department[department] = by_department.get(department, 0) + count
+                by_type[request_type] = by_type.get(request_type, 0) + count
+    
+    pending_by_age = {label: 0 for label, _, _ in PENDING_AGE_BUCKETS}
+    pending_by_age['unknown'] = 0
+    for day, count in stats.get('pendingByDay', {}).items():
+        try:
+            age_days = (today - datetime.strptime(day, "%Y-%m-%d").date()).days
+        except ValueError:
+            pending_by_age['unknown'] += count
+            continue
+        for label, min_days, max_days in PENDING_AGE_BUCKETS:
+            if age_days >= min_days and (max_days is None or age_days < max_days):
+                pending_by_age[label] += count
+                break
+        else:
+            # Creation dates in the future land in the newest bucket
+            pending_by_age[PENDING_AGE_BUCKETS[0][0]] += count
+    
+    return {
+        'total': stats.get('total', 0),
+        'byStatus': by_status,
+        'byDepartment': by_department,
+        'byType': by_type,
+        'byStatusDepartmentType': counts,
+        'pendingByAge': pending_by_age,
+        'openByUser': stats.get('openByUser', {})
+    }
+
+def get_request_stats():
+    """Get dashboard aggregates for requests.
+    
+    The aggregates are maintained by every write in the requests sidecar, so
+    this only decodes requests.xlsx when the sidecar is missing or stale.
+    """
+    try:
+        snapshot = reading_snapshot()
+        if snapshot is not None:
+            return summarize_request_stats(snapshot['stats'])
+        
+        if not os.path.exists(REQUESTS_FILE):
+            return summarize_request_stats(build_request_stats([]))
+        
+        meta = load_fresh_requests_meta()
+        return summarize_request_stats(meta['stats'])
+    except Exception as e:
+        print(f"Error getting request stats: {str(e)}", file=sys.stderr)
+        return None
+
+def create_request(request_data):
+    """Create a new request in Excel."""
+    try:
+        request_data = json.loads(request_data)
+        
+        # Generate ID if not provided
+        if 'id' not in request_data:
             request_data['id'] = f"#{uuid.uuid4().hex[:6].upper()}"
         
         # Set created timestamp
@@ -216,14 +2098,7 @@ def create_request(request_data):
             ws = wb.active
             
             # Define columns
-            columns = [
-                'id', 'title', 'description', 'department', 'status', 'dateCreated', 
-                'creator', 'type', 'multiDepartment', 'usersNeeded', 'archived', 
-                'archivedAt', 'acceptedBy', 'usersAccepted', 'departments', 
-                'rejections', 'participantsCompleted', 'createdAt', 'creatorDepartment',
-                'creatorRole', 'lastStatusUpdate', 'lastStatusUpdateTime', 'priority',
-                'relatedProject'
-            ]
+            columns = list(REQUEST_COLUMNS)
             
             # Write header row
             for col_idx, col_name in enumerate(columns, start=1):
@@ -234,11 +2109,11 @@ def create_request(request_data):
                 if col_name in request_data:
                     ws.cell(row=2, column=col_idx, value=request_data[col_name])
             
-            wb.save(REQUESTS_FILE)
+            version = save_requests_workbook(wb, None, [(None, row_to_dict(ws, 2, columns))])
             
         else:
             # Append to existing file
-            wb = openpyxl.load_workbook(REQUESTS_FILE)
+            wb, signature = open_requests_workbook()
             ws = wb.active
             columns = get_column_names(ws)
             
@@ -250,7 +2125,9 @@ def create_request(request_data):
                 if col_name in request_data:
                     ws.cell(row=next_row, column=col_idx, value=request_data[col_name])
             
-            wb.save(REQUESTS_FILE)
+            version = save_requests_workbook(wb, signature, [(None, row_to_dict(ws, next_row, columns))])
+        
+        request_data[ROW_VERSION_COLUMN] = version
         
         # Return created request with parsed fields
         for field in ['acceptedBy', 'departments', 'rejections', 'participantsCompleted']:
@@ -263,17 +2140,246 @@ def create_request(request_data):
         return request_data
     except Exception as e:
         print(f"Error creating request: {str(e)}", file=sys.stderr)
+        fail_commit_batch_write()
+        return None
+
+def parse_bool(value):
+    """Parse a boolean from JSON or spreadsheet/CSV text, None if unrecognised."""
+    if isinstance(value, bool):
+        return value
+    if value in [1, 0]:
+        return bool(value)
+    text = str(value).strip().lower()
+    if text in ['true', '1', 'yes', 'y']:
+        return True
+    if text in ['false', '0', 'no', 'n']:
+        return False
+    return None
+
+def parse_list_field(value, field):
+    """Parse a list column from JSON, a JSON string or ';'-joined text."""
+    if isinstance(value, list):
+        return value
+    text = str(value).strip()
+    if text.startswith('['):
+        parsed = json.loads(text)
+        if not isinstance(parsed, list):
+            raise ValueError(f"{field} must be a list")
+        return parsed
+    if field == 'rejections':
+        raise ValueError("rejections must be a JSON list")
+    return [part.strip() for part in text.split(';') if part.strip()]
+
+def normalize_request_record(record, now):
+    """Validate an incoming request record and convert it to a storage row.
+    
+    Applies the same defaults as create_request and checks the values the
+    rest of this module relies on. Raises ValueError with a readable reason.
+    """
+    if not isinstance(record, dict):
+        raise ValueError("record must be an object")
+    
+    # Blank CSV cells mean "not provided"
+    record = {key: value for key, value in record.items()
+              if key is not None and value is not None and value != ''}
+    record.pop('rowVersion', None)
+    
+    unknown = [key for key in record if key not in REQUEST_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+    
+    if not str(record.get('title', '')).strip():
+        raise ValueError("title is required")
+    
+    for field in REQUEST_LIST_FIELDS:
+        if field in record:
+            try:
+                record[field] = parse_list_field(record[field], field)
+            except ValueError as e:
+                raise ValueError(f"Invalid {field}: {e}")
+    
+    departments = record.get('departments', [])
+    if not record.get('department'):
+        if not departments:
+            raise ValueError("department or departments is required")
+        record['department'] = departments[0]
+    
+    record['status'] = record.get('status', 'Pending')
+    if record['status'] not in REQUEST_STATUSES:
+        raise ValueError(f"Invalid status: {record['status']}")
+    
+    record['type'] = str(record.get('type', 'request')).lower()
+    if record['type'] not in REQUEST_TYPES:
+        raise ValueError(f"Invalid type: {record['type']}")
+    
+    for field, default in [('multiDepartment', len(departments) > 1), ('archived', False)]:
+        value = parse_bool(record[field]) if field in record else default
+        if value is None:
+            raise ValueError(f"Invalid {field}: {record[field]}")
+        record[field] = value
+    
+    for field, default, minimum in [('usersNeeded', 1, 1),
+                                    ('usersAccepted', len(record.get('acceptedBy', [])), 0)]:
+        try:
+            value = int(record[field]) if field in record else default
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid {field}: {record[field]}")
+        if value < minimum:
+            raise ValueError(f"{field} must be at least {minimum}")
+        record[field] = value
+    
+    if 'createdAt' in record:
+        try:
+            created_at = datetime.fromisoformat(str(record['createdAt']))
+        except ValueError:
+            raise ValueError(f"Invalid createdAt: {record['createdAt']}")
+    else:
+        created_at = now
+        record['createdAt'] = now.isoformat()
+    if 'dateCreated' not in record:
+        record['dateCreated'] = created_at.strftime("%d/%m/%Y")
+    
+    # Convert complex fields to strings for Excel storage
+    for field in REQUEST_LIST_FIELDS:
+        if field in record:
+            record[field] = json.dumps(record[field])
+    
+    return record
+
+def iter_import_records(path, file_format):
+    """Stream (line number, record or parse error) pairs from a CSV or JSONL file."""
+    if file_format == 'csv':
+        with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            for record in reader:
+                yield reader.line_num, record
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_number, json.loads(line)
+                except ValueError as e:
+                    yield line_number, ValueError(f"Invalid JSON: {e}")
+
+def bulk_import_requests(path, file_format=None, chunk_size=BULK_IMPORT_CHUNK_SIZE, rejects_path=None):
+    """Import many requests from a CSV or JSONL file.
+    
+    Records are streamed from the file, validated with
+    normalize_request_record and given ids where missing. Valid rows are
+    appended to requests.xlsx in chunks of chunk_size with one save per
+    chunk; rejected records are written with their line number and reason
+    to rejects_path (default: <path>.rejects.jsonl).
+    """
+    try:
+        if file_format is None:
+            file_format = 'csv' if path.lower().endswith('.csv') else 'jsonl'
+        if file_format not in ['csv', 'jsonl']:
+            raise ValueError(f"Unsupported format: {file_format}")
+        chunk_size = max(int(chunk_size), 1)
+        rejects_path = rejects_path or path + '.rejects.jsonl'
+        
+        if os.path.exists(REQUESTS_FILE):
+            wb, signature = open_requests_workbook()
+            ws = wb.active
+        else:
+            wb, signature = openpyxl.Workbook(), None
+            ws = wb.active
+            ws.append(list(REQUEST_COLUMNS))
+        
+        existing_ids = set(str(row[0]) for row in ws.iter_rows(min_row=2, max_col=1, values_only=True)
+                           if row[0] is not None)
+        
+        imported = 0
+        rejected = 0
+        chunks = 0
+        version = None
+        chunk = []
+        rejects_file = None
+        now = datetime.now()
+        
+        def flush():
+            nonlocal signature, chunks, version
+            columns = get_column_names(ws)
+            for record in chunk:
+                for col_name in record:
+                    if col_name not in columns:
+                        ensure_column(ws, col_name)
+                        columns = get_column_names(ws)
+                ws.append([record.get(col_name) for col_name in columns])
+            
+            version = save_requests_workbook(wb, signature, [(None, record) for record in chunk])
+            signature = file_signature(REQUESTS_FILE)
+            chunks += 1
+            chunk.clear()
+        
+        try:
+            for line_number, record in iter_import_records(path, file_format):
+                try:
+                    if isinstance(record, Exception):
+                        raise record
+                    row = normalize_request_record(record, now)
+                    
+                    if 'id' in row:
+                        row['id'] = str(row['id'])
+                        if row['id'] in existing_ids:
+                            raise ValueError(f"Duplicate id: {row['id']}")
+                    else:
+                        row['id'] = f"#{uuid.uuid4().hex[:6].upper()}"
+                        while row['id'] in existing_ids:
+                            row['id'] = f"#{uuid.uuid4().hex[:6].upper()}"
+                except ValueError as e:
+                    if rejects_file is None:
+                        rejects_file = open(rejects_path, 'w', encoding='utf-8')
+                    rejects_file.write(json.dumps({'line': line_number, 'error': str(e),
+                                                   'record': None if isinstance(record, Exception) else record},
+                                                  default=str) + '\n')
+                    rejected += 1
+                    continue
+                
+                existing_ids.add(row['id'])
+                chunk.append(row)
+                imported += 1
+                if len(chunk) >= chunk_size:
+                    flush()
+            
+            if chunk:
+                flush()
+        finally:
+            if rejects_file is not None:
+                rejects_file.close()
+        
+        return {
+            'imported': imported,
+            'rejected': rejected,
+            'chunks': chunks,
+            'version': version,
+            'rejectsFile': rejects_path if rejected else None
+        }
+    except Exception as e:
+        print(f"Error bulk importing requests: {str(e)}", file=sys.stderr)
         return None
 
 def update_request(request_id, request_data):
-    """Update a request in Excel."""
+    """Update a request in Excel.
+    
+    An update setting archived moves the row to the archive workbook through
+    archive_request, after applying any other fields it carries.
+    """
     try:
+        request_data = json.loads(request_data)
+        
+        if parse_bool(request_data.get('archived')):
+            fields = {key: value for key, value in request_data.items() if key != 'archived'}
+            if fields:
+                update_request(request_id, json.dumps(fields))
+            return archive_request(request_id)
+        
         if not os.path.exists(REQUESTS_FILE):
             return None
         
-        request_data = json.loads(request_data)
-        
-        wb = openpyxl.load_workbook(REQUESTS_FILE)
+        wb, signature = open_requests_workbook()
         ws = wb.active
         columns = get_column_names(ws)
         
@@ -292,16 +2398,15 @@ def update_request(request_id, request_data):
             if field in request_data and isinstance(request_data[field], (list, dict)):
                 request_data[field] = json.dumps(request_data[field])
         
+        before = row_to_dict(ws, request_row, columns)
+        
         # Update request data
         for col_idx, col_name in enumerate(columns, start=1):
             if col_name in request_data:
                 ws.cell(row=request_row, column=col_idx, value=request_data[col_name])
         
-        wb.save(REQUESTS_FILE)
-        
-        # Return updated request
-        updated_request = {col_name: ws.cell(row=request_row, column=col_idx+1).value 
-                         for col_idx, col_name in enumerate(columns)}
+        updated_request = row_to_dict(ws, request_row, columns)
+        save_requests_workbook(wb, signature, [(before, updated_request)])
         
         # Process JSON fields
         for field in ['acceptedBy', 'departments', 'rejections', 'participantsCompleted']:
@@ -329,16 +2434,18 @@ def update_request(request_id, request_data):
         return updated_request
     except Exception as e:
         print(f"Error updating request: {str(e)}", file=sys.stderr)
+        fail_commit_batch_write()
         return None
 
 def delete_request(request_id):
     """Delete a request from Excel."""
     try:
         if not os.path.exists(REQUESTS_FILE):
-            return False
+            return delete_archived_request(request_id)
         
-        wb = openpyxl.load_workbook(REQUESTS_FILE)
+        wb, signature = open_requests_workbook()
         ws = wb.active
+        columns = get_column_names(ws)
         
         # Find request row by ID
         request_row = None
@@ -348,16 +2455,133 @@ def delete_request(request_id):
                 break
         
         if not request_row:
-            return False
+            return delete_archived_request(request_id)
+        
+        before = row_to_dict(ws, request_row, columns)
         
         # Delete row
         ws.delete_rows(request_row, 1)
         
-        wb.save(REQUESTS_FILE)
+        save_requests_workbook(wb, signature, [(before, None)])
         return True
     except Exception as e:
         print(f"Error deleting request: {str(e)}", file=sys.stderr)
+        fail_commit_batch_write()
+        return False
+
+def delete_archived_request(request_id):
+    """Delete a request from the archive workbook."""
+    if not os.path.exists(ARCHIVE_FILE):
+        return False
+    
+    archive_wb = openpyxl.load_workbook(ARCHIVE_FILE)
+    archive_ws = archive_wb.active
+    archive_row = find_request_row(archive_ws, request_id)
+    if not archive_row:
         return False
+    
+    archive_ws.delete_rows(archive_row, 1)
+    note_external_save()
+    save_workbook(archive_wb, ARCHIVE_FILE)
+    return True
+
+def archive_request(request_id):
+    """Archive a request by moving it from requests.xlsx to the archive workbook.
+    
+    The archive copy is saved before the row is removed from requests.xlsx,
+    so an interrupted move leaves a duplicate rather than losing the row;
+    archiving the request again replaces that copy.
+    """
+    try:
+        request_row = None
+        if os.path.exists(REQUESTS_FILE):
+            wb, signature = open_requests_workbook()
+            ws = wb.active
+            columns = get_column_names(ws)
+            request_row = find_request_row(ws, request_id)
+        
+        if not request_row:
+            # Archiving an already archived request returns it unchanged
+            for request in get_archived_requests():
+                if str(request.get('id')) == str(request_id):
+                    return request
+            return None
+        
+        before = row_to_dict(ws, request_row, columns)
+        archived = dict(before)
+        archived['archived'] = True
+        archived['archivedAt'] = before.get('archivedAt') or datetime.now().isoformat()
+        
+        archive_wb = open_archive_workbook(columns)
+        append_request_row(archive_wb.active, archived, find_request_row(archive_wb.active, request_id))
+        note_external_save()
+        save_workbook(archive_wb, ARCHIVE_FILE)
+        
+        ws.delete_rows(request_row, 1)
+        save_requests_workbook(wb, signature, [(before, None)])
+        
+        return decode_request(archived)
+    except Exception as e:
+        print(f"Error archiving request: {str(e)}", file=sys.stderr)
+        fail_commit_batch_write()
+        return None
+
+def unarchive_request(request_id):
+    """Restore an archived request from the archive workbook into requests.xlsx.
+    
+    A row with the same id left in requests.xlsx by an interrupted move is
+    overwritten rather than duplicated.
+    """
+    try:
+        archive_row = None
+        if os.path.exists(ARCHIVE_FILE):
+            archive_wb = openpyxl.load_workbook(ARCHIVE_FILE)
+            archive_ws = archive_wb.active
+            archive_row = find_request_row(archive_ws, request_id)
+        
+        if not archive_row:
+            # Requests archived before the archive tier existed only carry the flag
+            return update_request(request_id, json.dumps({'archived': False, 'archivedAt': None}))
+        
+        restored = row_to_dict(archive_ws, archive_row, get_column_names(archive_ws))
+        restored.pop(None, None)
+        restored['archived'] = False
+        restored['archivedAt'] = None
+        
+        if os.path.exists(REQUESTS_FILE):
+            wb, signature = open_requests_workbook()
+        else:
+            wb, signature = openpyxl.Workbook(), None
+            for col_idx, col_name in enumerate(REQUEST_COLUMNS, start=1):
+                wb.active.cell(row=1, column=col_idx, value=col_name)
+        
+        ws = wb.active
+        request_row = find_request_row(ws, request_id)
+        if request_row:
+            columns = get_column_names(ws)
+            before = row_to_dict(ws, request_row, columns)
+            append_request_row(ws, restored, request_row)
+            restored = row_to_dict(ws, request_row, get_column_names(ws))
+            save_requests_workbook(wb, signature, [(before, restored)])
+        else:
+            append_request_row(ws, restored)
+            save_requests_workbook(wb, signature, [(None, restored)])
+        
+        archive_ws.delete_rows(archive_row, 1)
+        note_external_save()
+        save_workbook(archive_wb, ARCHIVE_FILE)
+        
+        return decode_request(restored)
+    except Exception as e:
+        print(f"Error unarchiving request: {str(e)}", file=sys.stderr)
+        fail_commit_batch_write()
+        return None
+
+def get_archived_requests():
+    """Get all requests from the archive workbook."""
+    if not os.path.exists(ARCHIVE_FILE):
+        return []
+    return [decode_request(request) for request in iter_request_rows(ARCHIVE_FILE)]
 
 def accept_request(request_id, username):
     """Accept a request by adding user to acceptedBy."""
@@ -365,7 +2589,7 @@ def accept_request(request_id, username):
         if not os.path.exists(REQUESTS_FILE):
             return None
         
-        wb = openpyxl.load_workbook(REQUESTS_FILE)
+        wb, signature = open_requests_workbook()
         ws = wb.active
         columns = get_column_names(ws)
         column_indices = {name: idx+1 for idx, name in enumerate(columns)}
@@ -420,10 +2644,9 @@ def accept_request(request_id, username):
         ws.cell(row=request_row, column=column_indices.get('status', 0), 
                value=status if 'status' in column_indices else None)
         
-        wb.save(REQUESTS_FILE)
-        
         # Return updated request
-        updated_request = rows_to_dicts(ws)[request_row - 2]
+        updated_request = row_to_dict(ws, request_row, columns)
+        save_requests_workbook(wb, signature, [(request_data, updated_request)])
         
         # Process JSON fields
         for field in ['acceptedBy', 'departments', 'rejections', 'participantsCompleted']:
@@ -436,6 +2659,7 @@ def accept_request(request_id, username):
         return updated_request
     except Exception as e:
         print(f"Error accepting request: {str(e)}", file=sys.stderr)
+        fail_commit_batch_write()
         return None
 
 def complete_request(request_id, username):
@@ -444,7 +2668,7 @@ def complete_request(request_id, username):
         if not os.path.exists(REQUESTS_FILE):
             return None
         
-        wb = openpyxl.load_workbook(REQUESTS_FILE)
+        wb, signature = open_requests_workbook()
         ws = wb.active
         columns = get_column_names(ws)
         column_indices = {name: idx+1 for idx, name in enumerate(columns)}
@@ -516,10 +2740,9 @@ def complete_request(request_id, username):
             ws.cell(row=request_row, column=column_indices.get('lastStatusUpdateTime', 0), 
                    value=now.strftime("%H:%M:%S") if 'lastStatusUpdateTime' in column_indices else None)
         
-        wb.save(REQUESTS_FILE)
-        
         # Return updated request
-        updated_request = rows_to_dicts(ws)[request_row - 2]
+        updated_request = row_to_dict(ws, request_row, columns)
+        save_requests_workbook(wb, signature, [(request_data, updated_request)])
         
         # Process JSON fields
         for field in ['acceptedBy', 'departments', 'rejections', 'participantsCompleted']:
@@ -532,6 +2755,7 @@ def complete_request(request_id, username):
         return updated_request
     except Exception as e:
         print(f"Error completing request: {str(e)}", file=sys.stderr)
+        fail_commit_batch_write()
         return None
 
 def abandon_request(request_id, username):
@@ -540,7 +2764,7 @@ def abandon_request(request_id, username):
         if not os.path.exists(REQUESTS_FILE):
             return None
         
-        wb = openpyxl.load_workbook(REQUESTS_FILE)
+        wb, signature = open_requests_workbook()
         ws = wb.active
         columns = get_column_names(ws)
         column_indices = {name: idx+1 for idx, name in enumerate(columns)}
@@ -657,13 +2881,13 @@ def abandon_request(request_id, username):
                    value=now.isoformat() if 'lastStatusUpdate' in column_indices else None)
             ws.cell(row=request_row, column=column_indices.get('lastStatusUpdateTime', 0), 
                    value=now.strftime("%H:%M:%S") if 'lastStatusUpdateTime' in column_indices else None)
-            ws.cell(row=request_row, column=column_indices.get('statusChangedBy', 0), 
-                   value=username if 'statusChangedBy' in column_indices else None)
-        
-        wb.save(REQUESTS_FILE)
+            # Sheets without a statusChangedBy column do not record who did it
+            if 'statusChangedBy' in column_indices:
+                ws.cell(row=request_row, column=column_indices['statusChangedBy'], value=username)
         
         # Return updated request
-        updated_request = rows_to_dicts(ws)[request_row - 2]
+        updated_request = row_to_dict(ws, request_row, columns)
+        save_requests_workbook(wb, signature, [(request_data, updated_request)])
         
         # Process JSON fields
         for field in ['acceptedBy', 'departments', 'rejections', 'participantsCompleted']:
@@ -676,6 +2900,7 @@ def abandon_request(request_id, username):
         return updated_request
     except Exception as e:
         print(f"Error abandoning request: {str(e)}", file=sys.stderr)
+        fail_commit_batch_write()
         return None
 
 def reject_request(request_id, username, reason=''):
@@ -684,7 +2909,7 @@ def reject_request(request_id, username, reason=''):
         if not os.path.exists(REQUESTS_FILE):
             return None
         
-        wb = openpyxl.load_workbook(REQUESTS_FILE)
+        wb, signature = open_requests_workbook()
         ws = wb.active
         columns = get_column_names(ws)
         column_indices = {name: idx+1 for idx, name in enumerate(columns)}
@@ -728,13 +2953,13 @@ def reject_request(request_id, username, reason=''):
                value=now.isoformat() if 'lastStatusUpdate' in column_indices else None)
         ws.cell(row=request_row, column=column_indices.get('lastStatusUpdateTime', 0), 
                value=now.strftime("%H:%M:%S") if 'lastStatusUpdateTime' in column_indices else None)
-        ws.cell(row=request_row, column=column_indices.get('statusChangedBy', 0), 
-               value=username if 'statusChangedBy' in column_indices else None)
-        
-        wb.save(REQUESTS_FILE)
+        # Sheets without a statusChangedBy column do not record who did it
+        if 'statusChangedBy' in column_indices:
+            ws.cell(row=request_row, column=column_indices['statusChangedBy'], value=username)
         
         # Return updated request
-        updated_request = rows_to_dicts(ws)[request_row - 2]
+        updated_request = row_to_dict(ws, request_row, columns)
+        save_requests_workbook(wb, signature, [(request_data, updated_request)])
         
         # Process JSON fields
         for field in ['acceptedBy', 'departments', 'rejections', 'participantsCompleted']:
@@ -747,431 +2972,1899 @@ def reject_request(request_id, username, reason=''):
         return updated_request
     except Exception as e:
         print(f"Error rejecting request: {str(e)}", file=sys.stderr)
+        fail_commit_batch_write()
         return None
 
-def get_user_requests(username):
-    """Get requests for a specific user."""
+def request_involves_user(request, username):
+    """Check whether a decoded request was created or accepted by a user."""
+    # Check if user is creator
+    if request.get('creator') == username:
+        return True
+    
+    # Check if user is in acceptedBy
+    accepted_by = request.get('acceptedBy', [])
+    return isinstance(accepted_by, list) and username in accepted_by
+
+def get_user_requests(username, include_archived=False):
+    """Get requests for a specific user."""
     try:
-        all_requests = get_requests()
-        user_requests = []
-        
-        for request in all_requests:
-            # Check if user is creator
-            if request.get('creator') == username:
-                user_requests.append(request)
-                continue
-            
-            # Check if user is in acceptedBy
-            accepted_by = request.get('acceptedBy', [])
-            if isinstance(accepted_by, list) and username in accepted_by:
-                user_requests.append(request)
-                continue
+        snapshot = reading_snapshot()
+        if snapshot is not None:
+            requests = cached_result(snapshot, ('user', username),
+                                     lambda request: request_involves_user(request, username),
+                                     lambda: [request for request in snapshot['requests']
+                                              if request_involves_user(request, username)])
+            if include_archived:
+                # The archive part is keyed by the archive file it was read from
+                # and is not affected by writes to requests.xlsx
+                requests.extend(cached_result(snapshot, ('user-archived', username, str(snapshot['archiveSignature'])),
+                                              lambda request: False,
+                                              lambda: [request for request in snapshot['archive']
+                                                       if request_involves_user(request, username)]))
+            return requests
         
-        return user_requests
+        all_requests = get_requests(include_archived=include_archived)
+        return [request for request in all_requests if request_involves_user(request, username)]
     except Exception as e:
         print(f"Error getting user requests: {str(e)}", file=sys.stderr)
         return []
 
-def filter_requests(filters_json):
-    """Filter requests based on criteria."""
+def filter_requests(filters_json, if_none_match=None):
+    """Filter requests based on criteria.
+    
+    Passing if_none_match (a tag, or '' for none) returns a conditional_read
+    envelope instead of the bare list; the tag covers the filters too.
+    """
+    if if_none_match is not None:
+        try:
+            filters_key = json.dumps(json.loads(filters_json), sort_keys=True)
+        except ValueError:
+            filters_key = filters_json
+        return conditional_read(REQUESTS_FILE, if_none_match,
+                                lambda: filter_requests(filters_json), filters_key,
+                                file_signature(ARCHIVE_FILE))
+    
     try:
         filters = json.loads(filters_json)
-        all_requests = get_requests()
-        filtered_requests = []
+        # includeArchived extends the search to the archive workbook
+        include_archived = parse_bool(filters.get('includeArchived', False)) is True
+        filters = normalize_filters(filters)
         
-        for request in all_requests:
-            include = True
-            
-            # Apply filters
-            for field, value in filters.items():
-                if field == 'department' and value:
-                    if request.get('department') != value:
-                        include = False
-                        break
-                
-                elif field == 'status' and value and value != 'All':
-                    if request.get('status') != value:
-                        include = False
-                        break
-                
-                elif field == 'type' and value:
-                    if request.get('type') != value:
-                        include = False
-                        break
-                
-                elif field == 'multiDepartment' and value:
-                    multi_department = request.get('multiDepartment')
-                    if multi_department not in ['TRUE', 'True', 'true', True, 1]:
-                        include = False
-                        break
-                
-                elif field == 'search' and value:
-                    search_value = value.lower()
-                    title = str(request.get('title', '')).lower()
-                    description = str(request.get('description', '')).lower()
-                    department = str(request.get('department', '')).lower()
-                    creator = str(request.get('creator', '')).lower()
-                    
-                    if (search_value not in title and search_value not in description and 
-                        search_value not in department and search_value not in creator):
-                        include = False
-                        break
-            
-            if include:
-                filtered_requests.append(request)
+        snapshot = reading_snapshot()
+        if snapshot is not None and not include_archived:
+            return cached_result(snapshot, ('filter', json.dumps(filters, sort_keys=True)),
+                                 lambda request: request_matches_filters(request, filters),
+                                 lambda: run_filter_query(filters, False))
         
-        return filtered_requests
+        return run_filter_query(filters, include_archived)
     except Exception as e:
         print(f"Error filtering requests: {str(e)}", file=sys.stderr)
         return []
 
-def check_expired_requests():
-    """Check and update expired requests."""
-    try:
-        if not os.path.exists(REQUESTS_FILE):
-            return {'updated': False}
+def run_filter_query(filters, include_archived):
+    """Collect the requests matching normalized filters using the plan_filter_query plan."""
+    snapshot = reading_snapshot() if not include_archived else None
+    plan = plan_filter_query(filters, snapshot)
+    # Residual criteria are checked in plan order, cheapest rejection first
+    residual = {predicate['field']: predicate['value'] for predicate in plan['residual']}
+    order_by = filters.get('orderBy')
+    descending = filters.get('order') == 'desc'
+    
+    if plan['access'] == 'scan':
+        matched = None
+        if not include_archived:
+            partitions = parallel_query(filter_partition, residual)
+            if partitions is not None:
+                matched = [request for partition in partitions for request in partition]
+        if matched is None and snapshot is None:
+            all_requests = get_requests(include_archived=include_archived)
+            matched = [request for request in all_requests if request_matches_filters(request, residual)]
         
-        wb = openpyxl.load_workbook(REQUESTS_FILE)
-        ws = wb.active
-        columns = get_column_names(ws)
-        column_indices = {name: idx+1 for idx, name in enumerate(columns)}
+        if matched is not None:
+            if order_by:
+                matched = order_by_time(matched, [request_time(request, order_by) for request in matched],
+                                        descending)
+            return matched
+        positions = range(len(snapshot['requests']))
+    elif plan['access'] == 'bitmap':
+        positions = bitmap_positions(plan['candidateBitmap'])
+    else:
+        driver = plan['driver']
+        positions = snapshot_filter_index(snapshot, driver['field']).get(driver['value'], ())
+    
+    requests = snapshot['requests']
+    positions = [position for position in positions if request_matches_filters(requests[position], residual)]
+    if order_by:
+        times = snapshot['times'][order_by]
+        positions = order_by_time(positions, [times[position] for position in positions], descending)
+    return [requests[position] for position in positions]
+
+def order_by_time(items, times, descending=False):
+    """Order items by their epoch times (ties keep their order); items without a time go last."""
+    timed = sorted((i for i in range(len(items)) if times[i] is not None), key=times.__getitem__,
+                   reverse=descending)
+    return [items[i] for i in timed] + [items[i] for i in range(len(items)) if times[i] is None]
+
+def normalize_filters(filters):
+    """Reduce filter_requests criteria to the ones that select something.
+    
+    Empty values, status 'All' and unknown fields match every request, search
+    is case-insensitive, a list of departments, statuses or types is sorted
+    (a single one is a plain value) and createdFrom/createdTo become ISO
+    timestamps (a bare createdTo date covers that whole day), so equivalent
+    queries share a cache entry. archived is kept when it is true or false.
+    orderBy (one of TIME_KEYS) and order ('asc' or 'desc') are kept as they
+    are and only sort the result.
+    """
+    normalized = {}
+    for field, value in filters.items():
+        if field == 'orderBy' and value:
+            if value not in TIME_KEYS:
+                raise ValueError(f"Unsupported orderBy: {value}")
+            normalized[field] = value
+            continue
+        if field == 'order' and value:
+            if value not in ['asc', 'desc']:
+                raise ValueError(f"Unsupported order: {value}")
+            # Ascending is the default
+            if value == 'desc':
+                normalized[field] = value
+            continue
+        if field == 'archived':
+            value = parse_bool(value)
+            if value is not None:
+                normalized[field] = value
+            continue
+        if not value or field not in FILTER_FIELDS:
+            continue
+        if isinstance(value, list) and field in ('department', 'status', 'type'):
+            value = sorted(set(value), key=str)
+            if field == 'status' and 'All' in value:
+                continue
+            if len(value) == 1:
+                value = value[0]
+        if field == 'status' and value == 'All':
+            continue
+        if field == 'multiDepartment':
+            value = True
+        elif field == 'search':
+            value = value.lower()
+        elif field in TIME_FILTERS:
+            value = parse_filter_date(value, field == 'createdTo').isoformat()
+        normalized[field] = value
+    return normalized
+
+def parse_filter_date(value, end_of_day=False):
+    """Parse a date filter to a naive local datetime; end_of_day moves a bare date to 23:59:59.999999."""
+    text = str(value).strip()
+    bound = datetime.fromisoformat(text.replace('Z', '+00:00'))
+    if bound.tzinfo is not None:
+        bound = bound.astimezone().replace(tzinfo=None)
+    if end_of_day and len(text) == 10:
+        bound = datetime.combine(bound.date(), datetime.max.time())
+    return bound
+
+def filter_value_matches(actual, value):
+    """Check a column value against a filter value or list of values."""
+    if isinstance(value, list):
+        return actual in value
+    return actual == value
+
+def request_matches_filters(request, filters):
+    """Check a decoded request against the filter_requests criteria."""
+    for field, value in filters.items():
+        if field == 'department' and value:
+            if not filter_value_matches(request.get('department'), value):
+                return False
         
-        now = datetime.now()
-        updated = False
-        expired_count = 0
-        archived_count = 0
+        elif field == 'status' and value and value != 'All':
+            if not filter_value_matches(request.get('status'), value):
+                return False
         
-        # Process each row
-        rows_to_delete = []
-        for row_idx, row in enumerate(ws.iter_rows(min_row=2), start=2):
-            request_data = {col: row[i].value for i, col in enumerate(columns)}
-            request_id = request_data.get('id')
-            
-            # Skip if no ID
-            if not request_id:
-                continue
-            
-            # Check completed or rejected requests
-            if request_data.get('status') in ['Completed', 'Rejected'] and request_data.get('lastStatusUpdate'):
-                try:
-                    status_date = datetime.fromisoformat(request_data.get('lastStatusUpdate'))
-                    one_day_later = datetime.fromtimestamp(status_date.timestamp() + (24 * 60 * 60))
-                    
-                    if now > one_day_later and not request_data.get('isExpired'):
-                        # Mark as expired
-                        ws.cell(row=row_idx, column=column_indices.get('isExpired', 0), 
-                               value=True if 'isExpired' in column_indices else None)
-                        updated = True
-                    
-                    if request_data.get('isExpired') in ['TRUE', 'True', 'true', True, 1]:
-                        # Delete expired request
-                        rows_to_delete.append(row_idx)
-                        updated = True
-                        expired_count += 1
-                except:
-                    pass
+        elif field == 'type' and value:
+            if not filter_value_matches(request.get('type'), value):
+                return False
+        
+        elif field == 'multiDepartment' and value:
+            multi_department = request.get('multiDepartment')
+            if multi_department not in ['TRUE', 'True', 'true', True, 1]:
+                return False
+        
+        elif field == 'archived' and value is not None:
+            if (request.get('archived') in ['TRUE', 'True', 'true', True, 1]) != value:
+                return False
+        
+        elif field == 'creator' and value:
+            if request.get('creator') != value:
+                return False
+        
+        elif field == 'participant' and value:
+            accepted_by = request.get('acceptedBy')
+            if not isinstance(accepted_by, list) or value not in accepted_by:
+                return False
+        
+        elif field in TIME_FILTERS and value:
+            # Compared as epoch seconds, exactly as the snapshot time indexes do
+            key, side = TIME_FILTERS[field]
+            moment = request_time(request, key)
+            if moment is None:
+                return False
+            bound = datetime.fromisoformat(value).timestamp()
+            if moment < bound if side == 'from' else moment > bound:
+                return False
+        
+        elif field == 'search' and value:
+            search_value = value.lower()
+            title = str(request.get('title', '')).lower()
+            description = str(request.get('description', '')).lower()
+            department = str(request.get('department', '')).lower()
+            creator = str(request.get('creator', '')).lower()
             
-            # Check pending requests
-            if request_data.get('status') == 'Pending':
-                created_date = None
-                try:
-                    if request_data.get('createdAt'):
-                        created_date = datetime.fromisoformat(request_data.get('createdAt'))
-                    elif request_data.get('dateCreated'):
-                        created_date = datetime.strptime(request_data.get('dateCreated'), "%d/%m/%Y")
-                except:
-                    continue
-                
-                if not created_date:
-                    continue
-                
-                # Set expiry days based on request type
-                expiry_days = 30  # Default for regular requests
-                
-                if request_data.get('type') == 'project':
-                    expiry_days = 60  # Projects get 60 days
-                elif request_data.get('multiDepartment') in ['TRUE', 'True', 'true', True, 1]:
-                    expiry_days = 45  # Multi-department requests get 45 days
-                
-                expiry_date = datetime.fromtimestamp(created_date.timestamp() + (expiry_days * 24 * 60 * 60))
-                
-                if request_data.get('type') == 'project':
-                    # Projects get archived after expiry
-                    if now > expiry_date and request_data.get('archived') not in ['TRUE', 'True', 'true', True, 1]:
-                        ws.cell(row=row_idx, column=column_indices.get('archived', 0), 
-                               value=True if 'archived' in column_indices else None)
-                        ws.cell(row=row_idx, column=column_indices.get('archivedAt', 0), 
-                               value=now.isoformat() if 'archivedAt' in column_indices else None)
-                        updated = True
-                        archived_count += 1
-                    
-                    # Archived projects get deleted after 7 days
-                    if (request_data.get('archived') in ['TRUE', 'True', 'true', True, 1] and 
-                        request_data.get('archivedAt')):
-                        try:
-                            archived_date = datetime.fromisoformat(request_data.get('archivedAt'))
-                            delete_date = datetime.fromtimestamp(archived_date.timestamp() + (7 * 24 * 60 * 60))
-                            
-                            if now > delete_date:
-                                rows_to_delete.append(row_idx)
-                                updated = True
-                                expired_count += 1
-                        except:
-                            pass
+            if (search_value not in title and search_value not in description and 
+                search_value not in department and search_value not in creator):
+                return False
+    
+    return True
+
+def snapshot_filter_index(snapshot, field):
+    """Get {value: [positions in sheet order]} for a creator/participant filter.
+    
+    The index is built on first use and kept with the snapshot, so it is
+    shared by every query until the next write. Reader threads build it
+    under snapshot_index_lock, so only one of them does.
+    """
+    index = snapshot['indexes'].get(field)
+    if index is not None:
+        return index
+    
+    with snapshot_index_lock:
+        index = snapshot['indexes'].get(field)
+        if index is None:
+            index = {}
+            for position, request in enumerate(snapshot['requests']):
+                if field == 'participant':
+                    accepted_by = request.get('acceptedBy')
+                    values = set(user for user in accepted_by if isinstance(user, str)) if isinstance(accepted_by, list) else ()
                 else:
-                    # Regular requests get deleted after expiry
-                    if now > expiry_date:
-                        rows_to_delete.append(row_idx)
-                        updated = True
-                        expired_count += 1
+                    values = (request.get(field),)
+                for value in values:
+                    index.setdefault(value, []).append(position)
+            snapshot['indexes'][field] = index
+    return index
+
+def time_filter_range(snapshot, field, value):
+    """Find the rows of a time criterion in the sorted time index by binary search.
+    
+    Returns (index entries, start, end); entries[start:end] are the
+    (epoch, position) pairs the criterion keeps.
+    """
+    key, side = TIME_FILTERS[field]
+    entries = snapshot['timeIndexes'][key]
+    bound = datetime.fromisoformat(value).timestamp()
+    if side == 'from':
+        return entries, bisect.bisect_left(entries, (bound,)), len(entries)
+    return entries, 0, bisect.bisect_right(entries, (bound, float('inf')))
+
+def time_filter_ranges(snapshot, predicates):
+    """Narrow the time criteria among predicates to one {time key: (start, end)} slice per sorted index."""
+    ranges = {}
+    for predicate in predicates:
+        if predicate['field'] not in TIME_FILTERS:
+            continue
+        entries, start, end = time_filter_range(snapshot, predicate['field'], predicate['value'])
+        key = TIME_FILTERS[predicate['field']][0]
+        low, high = ranges.get(key, (0, len(entries)))
+        ranges[key] = (max(low, start), min(high, end))
+    return ranges
+
+def filter_bitmap(snapshot, field, value):
+    """Get the bitmap of the snapshot rows a bitmap-indexed criterion keeps (OR over a list)."""
+    values = snapshot['bitmaps'][field]
+    if field == 'multiDepartment':
+        return values.get(True, 0)
+    bits = 0
+    for key in (value if isinstance(value, list) else [value]):
+        bits |= values.get(key, 0)
+    return bits
+
+def combine_filter_bitmaps(snapshot, predicates):
+    """AND the bitmaps of several criteria; time ranges become bitmaps of their index slices."""
+    size = len(snapshot['requests'])
+    bits = (1 << size) - 1
+    for predicate in predicates:
+        if predicate['field'] not in TIME_FILTERS:
+            bits &= filter_bitmap(snapshot, predicate['field'], predicate['value'])
+    for key, (start, end) in time_filter_ranges(snapshot, predicates).items():
+        entries = snapshot['timeIndexes'][key]
+        bits &= positions_bitmap((position for _, position in entries[start:end]), size)
+    return bits
+
+def count_stats_matching(counts, keys):
+    """Sum a nested status/department/type counter over keys (None matches any value)."""
+    if not keys:
+        return counts
+    return sum(count_stats_matching(child, keys[1:]) for key, child in counts.items()
+               if keys[0] is None or key in keys[0])
+
+def filter_statistics(snapshot):
+    """Get the (stats, row count) the planner estimates from; (None, None) if the sidecar is stale."""
+    if snapshot is not None:
+        return snapshot['stats'], len(snapshot['requests'])
+    meta = load_requests_meta()
+    if meta.get('stats') is not None and meta.get('signature') == file_signature(REQUESTS_FILE):
+        return meta['stats'], meta['stats'].get('total', 0)
+    return None, None
+
+def estimate_selectivity(field, value, stats, total, snapshot):
+    """Estimate the fraction of rows a normalized criterion keeps.
+    
+    On a snapshot the bitmaps, the time indexes and the creator/participant
+    indexes (built here if no query has built them yet) give exact counts;
+    otherwise status, department and type are counted in the sidecar
+    aggregates and anything else falls back to DEFAULT_FILTER_SELECTIVITY.
+    """
+    if not total:
+        return DEFAULT_FILTER_SELECTIVITY[field]
+    if snapshot is not None:
+        if field in BITMAP_FILTER_FIELDS:
+            return popcount(filter_bitmap(snapshot, field, value)) / total
+        if field in TIME_FILTERS:
+            _, start, end = time_filter_range(snapshot, field, value)
+            return (end - start) / total
+        if field in INDEXED_FILTER_FIELDS:
+            return len(snapshot_filter_index(snapshot, field).get(value, ())) / total
+    if stats is not None and field in ('status', 'department', 'type'):
+        values = value if isinstance(value, list) else [value]
+        keys = [values if name == field else None for name in ('status', 'department', 'type')]
+        return min(count_stats_matching(stats.get('counts', {}), keys) / total, 1.0)
+    return DEFAULT_FILTER_SELECTIVITY[field]
+
+def check_cost(predicates):
+    """Expected cost per row of checking predicates in order, stopping at the first miss."""
+    cost = 0
+    reached = 1.0
+    for predicate in predicates:
+        cost += reached * predicate['cost']
+        reached *= predicate['selectivity']
+    return cost
+
+def plan_filter_query(filters, snapshot=None):
+    """Choose how to run a normalized filter_requests query.
+    
+    Every criterion gets an estimated selectivity and a per-row check cost.
+    A full scan checks them all, cheapest rejection first. On a snapshot the
+    bitmap criteria and time ranges (read from the sorted time indexes) can
+    instead be ANDed into the candidate rows, or a creator/participant index
+    can drive candidate generation, with the rest checked on the candidates.
+    The cheapest of these plans is returned as {'access', 'driver',
+    'bitmaps', 'candidates', 'residual', 'orderBy', 'order', 'rows',
+    'estimatedRows', 'cost'}, plus 'candidateBitmap', the AND of a bitmap
+    plan that run_filter_query reuses (None for the other plans).
+    """
+    stats, total = filter_statistics(snapshot)
+    row_count = total or 0
+    
+    predicates = []
+    for field, value in filters.items():
+        # orderBy and order only sort the result
+        if field not in FILTER_CHECK_COSTS:
+            continue
+        predicates.append({'field': field, 'value': value,
+                           'selectivity': estimate_selectivity(field, value, stats, total, snapshot),
+                           'cost': FILTER_CHECK_COSTS[field]})
+    # Ordering by cost per rejected row minimizes the expected cost of the checks
+    predicates.sort(key=lambda predicate: predicate['cost'] / max(1 - predicate['selectivity'], 1e-9))
+    
+    estimated = row_count
+    for predicate in predicates:
+        estimated *= predicate['selectivity']
+    
+    plan = {'access': 'scan', 'driver': None, 'bitmaps': [], 'candidates': total, 'residual': predicates,
+            'candidateBitmap': None, 'cost': row_count * check_cost(predicates)}
+    if snapshot is not None:
+        bitmapped = []
+        residual = []
+        for predicate in predicates:
+            if predicate['field'] in BITMAP_FILTER_FIELDS or predicate['field'] in TIME_FILTERS:
+                bitmapped.append(predicate)
+            else:
+                residual.append(predicate)
+        if bitmapped:
+            bitmap = combine_filter_bitmaps(snapshot, bitmapped)
+            candidates = popcount(bitmap)
+            # Time ranges are turned into bitmaps one row at a time
+            range_rows = sum(max(end - start, 0) for start, end in time_filter_ranges(snapshot, bitmapped).values())
+            cost = (len(bitmapped) * row_count / 64 * BITMAP_WORD_COST + range_rows * INDEX_FETCH_COST +
+                    candidates * (INDEX_FETCH_COST + check_cost(residual)))
+            # The AND is exact, so only the residual criteria are estimated
+            estimated = candidates
+            for predicate in residual:
+                estimated *= predicate['selectivity']
+            if cost < plan['cost']:
+                plan.update({'access': 'bitmap', 'bitmaps': bitmapped, 'candidates': candidates,
+                             'residual': residual, 'candidateBitmap': bitmap, 'cost': cost})
         
-        # Delete rows in reverse order to avoid index shifting
-        for row_idx in sorted(rows_to_delete, reverse=True):
-            ws.delete_rows(row_idx)
+        for predicate in predicates:
+            if predicate['field'] not in INDEXED_FILTER_FIELDS:
+                continue
+            residual = [other for other in predicates if other is not predicate]
+            candidates = row_count * predicate['selectivity']
+            cost = candidates * (INDEX_FETCH_COST + check_cost(residual))
+            if cost < plan['cost']:
+                plan.update({'access': 'index', 'driver': predicate, 'bitmaps': [], 'candidates': round(candidates),
+                             'residual': residual, 'candidateBitmap': None, 'cost': cost})
+    
+    plan['orderBy'] = filters.get('orderBy')
+    plan['order'] = filters.get('order', 'asc') if plan['orderBy'] else None
+    plan['rows'] = total
+    plan['estimatedRows'] = round(estimated) if total is not None else None
+    plan['cost'] = round(plan['cost'], 1) if total is not None else None
+    return plan
+
+def explain_filter_requests(filters_json):
+    """Show the plan filter_requests would run for filters, without running it."""
+    try:
+        filters = json.loads(filters_json)
+        include_archived = parse_bool(filters.get('includeArchived', False)) is True
+        filters = normalize_filters(filters)
         
-        if updated:
-            wb.save(REQUESTS_FILE)
+        snapshot = reading_snapshot()
+        if snapshot is not None and not include_archived:
+            plan = plan_filter_query(filters, snapshot)
+            plan['source'] = 'snapshot'
+            with result_cache_lock:
+                entry = result_cache['entries'].get(('filter', json.dumps(filters, sort_keys=True)))
+                plan['cached'] = entry is not None and entry['snapshot'] is snapshot
+        else:
+            plan = plan_filter_query(filters)
+            plan['source'] = 'file+archive' if include_archived else 'file'
+            plan['cached'] = False
         
-        return {
-            'updated': updated,
-            'expired_count': expired_count,
-            'archived_count': archived_count
-        }
+        plan['filters'] = filters
+        # The candidate rows are shown by their count
+        del plan['candidateBitmap']
+        for predicate in [plan['driver']] + plan['bitmaps'] + plan['residual']:
+            if predicate is not None:
+                predicate['selectivity'] = round(predicate['selectivity'], 4)
+        return plan
     except Exception as e:
-        print(f"Error checking expired requests: {str(e)}", file=sys.stderr)
-        return {'updated': False, 'error': str(e)}
+        print(f"Error explaining filter: {str(e)}", file=sys.stderr)
+        return None
 
-def can_user_accept_request(request_id, username, department):
-    """Check if user can accept a request."""
+def iter_request_rows(path):
+    """Stream raw request rows from a requests workbook."""
+    rows = iter_sheet_values(path)
     try:
-        all_requests = get_requests()
-        target_request = None
-        
-        for request in all_requests:
-            if str(request.get('id')) == str(request_id):
-                target_request = request
-                break
+        columns = list(next(rows, ()))
+        for row in rows:
+            item = {columns[i]: value for i, value in enumerate(row)
+                    if i < len(columns) and columns[i] is not None}
+            if any(item.values()):  # Skip empty rows
+                yield item
+    finally:
+        rows.close()
+
+def flatten_export_value(value, list_format):
+    """Convert a decoded value to its export representation."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if not isinstance(value, list) or list_format == 'native':
+        return value
+    if list_format == 'count':
+        return len(value)
+    if list_format == 'joined':
+        return ';'.join(item if isinstance(item, str) else json.dumps(item) for item in value)
+    return json.dumps(value)
+
+def write_export_rows(f, requests, file_format, fieldnames, list_format, include_archived, filters):
+    """Write the matching requests to an open export file and return how many were written."""
+    writer = None
+    if file_format == 'csv':
+        writer = csv.DictWriter(f, fieldnames=fieldnames or REQUEST_COLUMNS, extrasaction='ignore')
+    
+    exported = 0
+    for request in requests:
+        decode_request(request)
+        if not include_archived and request.get('archived'):
+            continue
+        if not request_matches_filters(request, filters):
+            continue
         
-        if not target_request:
-            return {'canAccept': False, 'reason': 'Request not found'}
+        row = {key: flatten_export_value(value, list_format) for key, value in request.items()}
+        if writer is not None:
+            writer.writerow(row)
+        else:
+            f.write(json.dumps(row, default=str) + '\n')
+        exported += 1
+    return exported
+
+def export_requests(path, file_format=None, filters_json=None, include_archived=False, list_format=None):
+    """Stream requests to a CSV or JSONL file in one pass.
+    
+    Rows are read, decoded, filtered and written one at a time, so memory
+    use does not depend on the size of the table. list_format controls how
+    list columns are written: 'json' (JSON text, the CSV default), 'joined'
+    (';'-separated), 'count' (number of items) or 'native' (JSON arrays,
+    the JSONL default). Archived requests are skipped unless include_archived.
+    The file is written under a temporary name and moved into place.
+    """
+    try:
+        if file_format is None:
+            file_format = 'csv' if path.lower().endswith('.csv') else 'jsonl'
+        if file_format not in ['csv', 'jsonl']:
+            raise ValueError(f"Unsupported format: {file_format}")
+        if list_format is None:
+            list_format = 'json' if file_format == 'csv' else 'native'
+        if list_format not in ['json', 'joined', 'count', 'native'] or (file_format == 'csv' and list_format == 'native'):
+            raise ValueError(f"Unsupported list format for {file_format}: {list_format}")
         
-        # Check if request is already accepted by user
-        accepted_by = target_request.get('acceptedBy', [])
-        if isinstance(accepted_by, list) and username in accepted_by:
-            return {'canAccept': False, 'reason': 'Already accepted'}
+        filters = normalize_filters(json.loads(filters_json)) if filters_json else {}
+        exported = 0
+        tmp_path = path + '.tmp'
         
-        # Check request status
-        if target_request.get('status') not in ['Pending', 'Rejected']:
-            return {'canAccept': False, 'reason': f"Cannot accept request with status: {target_request.get('status')}"}
+        sources = [REQUESTS_FILE]
+        if include_archived:
+            sources.append(ARCHIVE_FILE)
+        sources = [source for source in sources if os.path.exists(source)]
         
-        # Check if multi-department request
-        multi_department = target_request.get('multiDepartment')
-        request_type = target_request.get('type', 'request')
+        # The CSV header has to cover the columns of every source up front
+        fieldnames = []
+        for source in sources:
+            fieldnames.extend(name for name in read_header(source) if name not in fieldnames)
         
-        if (multi_department in ['TRUE', 'True', 'true', True, 1] or 
-            request_type in ['project', 'Project']):
-            # For multi-department or projects, check if the user's department is required
-            departments = target_request.get('departments', [])
-            if isinstance(departments, str):
-                try:
-                    departments = json.loads(departments)
-                except:
-                    departments = []
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+            if file_format == 'csv':
+                csv.DictWriter(f, fieldnames=fieldnames or REQUEST_COLUMNS).writeheader()
             
-            if departments and isinstance(departments, list) and department not in departments:
-                return {'canAccept': False, 'reason': 'Your department is not required for this request'}
-        else:
-            # For regular requests, check if department matches
-            if department != target_request.get('department'):
-                return {'canAccept': False, 'reason': 'Request is for a different department'}
+            for source in sources:
+                # Worker processes format their row ranges; chunks come back in sheet order
+                chunks = None
+                if source == REQUESTS_FILE:
+                    chunks = parallel_query(export_partition, file_format, fieldnames, list_format,
+                                            include_archived, filters)
+                
+                if chunks is not None:
+                    for text, count in chunks:
+                        f.write(text)
+                        exported += count
+                else:
+                    exported += write_export_rows(f, iter_request_rows(source), file_format, fieldnames,
+                                                  list_format, include_archived, filters)
         
-        return {'canAccept': True}
+        os.replace(tmp_path, path)
+        return {'exported': exported, 'path': path, 'format': file_format, 'listFormat': list_format}
     except Exception as e:
-        print(f"Error checking if user can accept request: {str(e)}", file=sys.stderr)
-        return {'canAccept': False, 'reason': 'Internal error'}
+        print(f"Error exporting requests: {str(e)}", file=sys.stderr)
+        return None
 
-def main():
-    if len(sys.argv) < 2:
-        print('Usage: python excel_operations.py <operation> [args...]', file=sys.stderr)
-        sys.exit(1)
+# Worker process side: the row range of requests.xlsx this process holds
+partition_cache = {'key': None, 'requests': []}
+
+def load_partition(signature, start_row, end_row):
+    """Get the decoded requests in a row range, loading them once per file signature."""
+    key = [signature, start_row, end_row]
+    if partition_cache['key'] != key:
+        if file_signature(REQUESTS_FILE) != signature:
+            raise RuntimeError('requests.xlsx changed')
+        
+        rows = iter_sheet_values(REQUESTS_FILE)
+        columns = list(next(rows, ()))
+        requests = []
+        for row_idx, row in enumerate(rows, start=2):
+            if row_idx < start_row:
+                continue
+            if end_row is not None and row_idx > end_row:
+                break
+            item = {columns[i]: value for i, value in enumerate(row)
+                    if i < len(columns) and columns[i] is not None}
+            if any(item.values()):  # Skip empty rows
+                requests.append(decode_request(item))
+        rows.close()
+        
+        # The file may have been rewritten while we were reading it
+        if file_signature(REQUESTS_FILE) != signature:
+            raise RuntimeError('requests.xlsx changed')
+        partition_cache['key'] = key
+        partition_cache['requests'] = requests
+    return partition_cache['requests']
+
+def filter_partition(signature, start_row, end_row, filters):
+    """Run filter_requests over one row range."""
+    return [request for request in load_partition(signature, start_row, end_row)
+            if request_matches_filters(request, filters)]
+
+def export_partition(signature, start_row, end_row, file_format, fieldnames, list_format, include_archived, filters):
+    """Format the export rows of one row range; returns (text, count)."""
+    # Rows are decoded in place when written; keep the cached partition intact
+    requests = [dict(request) for request in load_partition(signature, start_row, end_row)]
+    f = io.StringIO(newline='')
+    count = write_export_rows(f, requests, file_format, fieldnames, list_format, include_archived, filters)
+    return f.getvalue(), count
+
+# Coordinator side: one single-process pool per row range, so every worker keeps
+# the same partition between queries (see start_query_pools). 'partitions' is
+# (signature, ranges), replaced as a whole so reader threads never pair the
+# ranges of one version of requests.xlsx with the signature of another.
+query_pools = {'pools': [], 'partitions': (None, None)}
+
+def start_query_pools():
+    """Start the partition workers used by parallel_query (serve mode only)."""
+    if QUERY_WORKERS < 2:
+        return
+    # Spawned, not forked: the serving process runs threads
+    context = multiprocessing.get_context('spawn')
+    query_pools['pools'] = [ProcessPoolExecutor(max_workers=1, mp_context=context)
+                            for _ in range(QUERY_WORKERS)]
+
+def stop_query_pools():
+    """Shut the partition workers down."""
+    for pool in query_pools['pools']:
+        pool.shutdown(cancel_futures=True)
+    query_pools['pools'] = []
+
+def partition_ranges(signature):
+    """Split the rows of requests.xlsx into one range per worker, or None if too small."""
+    cached_signature, ranges = query_pools['partitions']
+    if cached_signature != signature:
+        wb = openpyxl.load_workbook(REQUESTS_FILE, read_only=True)
+        max_row = wb.active.max_row
+        wb.close()
+        
+        ranges = None
+        if max_row and max_row > PARALLEL_QUERY_MIN_ROWS:
+            size = -(-(max_row - 1) // len(query_pools['pools']))
+            ranges = [[start, start + size - 1] for start in range(2, max_row + 1, size)]
+            # The sheet dimension can be stale; the last worker reads to the end
+            ranges[-1][1] = None
+        query_pools['partitions'] = (signature, ranges)
+    return ranges
+
+def parallel_query(task, *args):
+    """Run task(signature, start_row, end_row, *args) on every partition worker.
     
-    operation = sys.argv[1]
+    Returns the per-partition results in sheet order, or None when fan-out
+    is off, the table is small, or a worker could not read the version of
+    requests.xlsx being queried (the caller then scans in-process).
+    
+    This waits on the workers, so in serve mode it runs on a reader thread
+    (see serve_async), never on the event loop; the pools accept tasks from
+    several reader threads at once.
+    """
+    if not query_pools['pools']:
+        return None
     
     try:
-        if operation == 'get_departments':
-            result = get_departments()
-            print(json.dumps(result))
-        
-        elif operation == 'get_users':
-            result = get_users()
-            print(json.dumps(result))
-        
-        elif operation == 'login_user':
-            if len(sys.argv) < 3:
-                print('Missing username', file=sys.stderr)
-                sys.exit(1)
-            
-            username = sys.argv[2]
-            password = sys.argv[3] if len(sys.argv) > 3 else ''
-            
-            result = login_user(username, password)
-            if result:
-                print(json.dumps(result))
-            else:
-                print(json.dumps(None))
+        snapshot = reading_snapshot()
+        signature = snapshot['signature'] if snapshot is not None else file_signature(REQUESTS_FILE)
+        if signature is None or file_signature(REQUESTS_FILE) != signature:
+            return None
         
-        elif operation == 'update_user':
-            if len(sys.argv) < 4:
-                print('Missing user ID or data', file=sys.stderr)
-                sys.exit(1)
-            
-            user_id = sys.argv[2]
-            user_data = sys.argv[3]
-            
-            result = update_user(user_id, user_data)
-            if result:
-                print(json.dumps(result))
-            else:
-                print(json.dumps(None))
+        ranges = partition_ranges(signature)
+        if not ranges:
+            return None
         
-        elif operation == 'get_requests':
-            result = get_requests()
-            print(json.dumps(result))
+        futures = [pool.submit(task, signature, start_row, end_row, *args)
+                   for pool, (start_row, end_row) in zip(query_pools['pools'], ranges)]
+        return [future.result() for future in futures]
+    except Exception as e:
+        print(f"Error running parallel query: {str(e)}", file=sys.stderr)
+        return None
+
+def check_expired_requests(request_ids=None):
+    """Check and update expired requests.
+    
+    request_ids limits the pass to those requests (the serve-mode expiry
+    timer passes the ones that are due); archived projects are always swept.
+    """
+    try:
+        if not os.path.exists(REQUESTS_FILE):
+            return {'updated': False}
         
-        elif operation == 'create_request':
-            if len(sys.argv) < 3:
-                print('Missing request data', file=sys.stderr)
-                sys.exit(1)
-            
-            request_data = sys.argv[2]
-            
-            result = create_request(request_data)
-            if result:
-                print(json.dumps(result))
-            else:
-                print(json.dumps(None))
+        now = datetime.now()
+        result = {'updated': False, 'expired_count': 0, 'archived_count': 0, 'retained_count': 0}
+        if request_ids is None or request_ids:
+            result = expire_request_rows(now, request_ids)
         
-        elif operation == 'update_request':
-            if len(sys.argv) < 4:
-                print('Missing request ID or data', file=sys.stderr)
-                sys.exit(1)
-            
-            request_id = sys.argv[2]
-            request_data = sys.argv[3]
-            
-            result = update_request(request_id, request_data)
-            if result:
-                print(json.dumps(result))
-            else:
-                print(json.dumps(None))
+        # Archived projects past their grace period are removed from the archive
+        swept = sweep_archived_projects(now)
+        if swept:
+            result['updated'] = True
+            result['expired_count'] += len(swept)
+            result['retained_count'] += len(swept)
         
-        elif operation == 'delete_request':
-            if len(sys.argv) < 3:
-                print('Missing request ID', file=sys.stderr)
-                sys.exit(1)
-            
-            request_id = sys.argv[2]
-            
-            result = delete_request(request_id)
-            print(json.dumps({'success': result}))
+        return result
+    except Exception as e:
+        print(f"Error checking expired requests: {str(e)}", file=sys.stderr)
+        return {'updated': False, 'error': str(e)}
+
+def expire_request_rows(now, request_ids=None):
+    """Apply the expiry, archive and delete rules to requests.xlsx.
+    
+    Returns the counts for check_expired_requests.
+    """
+    wb, signature = open_requests_workbook()
+    ws = wb.active
+    columns = get_column_names(ws)
+    wanted = set(str(request_id) for request_id in request_ids) if request_ids is not None else None
+    # Sheets without an isExpired column never mark (or delete) finished requests
+    expired_col = columns.index('isExpired') + 1 if 'isExpired' in columns else None
+    
+    updated = False
+    expired_count = 0
+    archived_count = 0
+    
+    # Process each row
+    rows_to_delete = []
+    rows_to_archive = []
+    rows_before = {}
+    for row_idx, row in enumerate(ws.iter_rows(min_row=2), start=2):
+        request_data = {col: row[i].value for i, col in enumerate(columns)}
+        request_id = request_data.get('id')
+        
+        # Skip if no ID
+        if not request_id or (wanted is not None and str(request_id) not in wanted):
+            continue
+        
+        rows_before[row_idx] = request_data
+        
+        # Check completed or rejected requests
+        if request_data.get('status') in ['Completed', 'Rejected'] and request_data.get('lastStatusUpdate'):
+            try:
+                status_date = datetime.fromisoformat(request_data.get('lastStatusUpdate'))
+                one_day_later = datetime.fromtimestamp(status_date.timestamp() + (24 * 60 * 60))
+                
+                if now > one_day_later and not request_data.get('isExpired') and expired_col:
+                    # Mark as expired
+                    ws.cell(row=row_idx, column=expired_col, value=True)
+                    updated = True
+                
+                if request_data.get('isExpired') in ['TRUE', 'True', 'true', True, 1]:
+                    # Delete expired request
+                    rows_to_delete.append(row_idx)
+                    updated = True
+                    expired_count += 1
+            except:
+                pass
         
-        elif operation == 'accept_request':
-            if len(sys.argv) < 4:
-                print('Missing request ID or username', file=sys.stderr)
-                sys.exit(1)
+        # Check pending requests
+        if request_data.get('status') == 'Pending':
+            created_date = None
+            try:
+                if request_data.get('createdAt'):
+                    created_date = datetime.fromisoformat(request_data.get('createdAt'))
+                elif request_data.get('dateCreated'):
+                    created_date = datetime.strptime(request_data.get('dateCreated'), "%d/%m/%Y")
+            except:
+                continue
             
-            request_id = sys.argv[2]
-            username = sys.argv[3]
+            if not created_date:
+                continue
             
-            result = accept_request(request_id, username)
-            if result:
-                print(json.dumps(result))
-            else:
-                print(json.dumps(None))
-        
-        elif operation == 'complete_request':
-            if len(sys.argv) < 4:
-                print('Missing request ID or username', file=sys.stderr)
-                sys.exit(1)
+            # Set expiry days based on request type
+            expiry_days = 30  # Default for regular requests
             
-            request_id = sys.argv[2]
-            username = sys.argv[3]
+            if request_data.get('type') == 'project':
+                expiry_days = 60  # Projects get 60 days
+            elif request_data.get('multiDepartment') in ['TRUE', 'True', 'true', True, 1]:
+                expiry_days = 45  # Multi-department requests get 45 days
             
-            result = complete_request(request_id, username)
-            if result:
-                print(json.dumps(result))
+            expiry_date = datetime.fromtimestamp(created_date.timestamp() + (expiry_days * 24 * 60 * 60))
+            
+            if request_data.get('type') == 'project':
+                # Projects get moved to the archive workbook after expiry
+                if now > expiry_date and request_data.get('archived') not in ['TRUE', 'True', 'true', True, 1]:
+                    rows_to_archive.append(row_idx)
+                    updated = True
+                    archived_count += 1
+                
+                # Archived projects get deleted after 7 days (rows flagged
+                # before the archive workbook existed are still in this sheet)
+                if (request_data.get('archived') in ['TRUE', 'True', 'true', True, 1] and 
+                    request_data.get('archivedAt')):
+                    try:
+                        archived_date = datetime.fromisoformat(request_data.get('archivedAt'))
+                        delete_date = datetime.fromtimestamp(archived_date.timestamp() + (7 * 24 * 60 * 60))
+                        
+                        if now > delete_date:
+                            rows_to_delete.append(row_idx)
+                            updated = True
+                            expired_count += 1
+                    except:
+                        pass
             else:
-                print(json.dumps(None))
+                # Regular requests get deleted after expiry
+                if now > expiry_date:
+                    rows_to_delete.append(row_idx)
+                    updated = True
+                    expired_count += 1
+    
+    # Collect changed rows for the aggregates before deleting anything
+    changes = []
+    for row_idx, before in rows_before.items():
+        if row_idx in rows_to_delete or row_idx in rows_to_archive:
+            changes.append((before, None))
+        else:
+            after = row_to_dict(ws, row_idx, columns)
+            if any(after.get(key) != before.get(key) for key in set(after) | set(before)):
+                changes.append((before, after))
+    
+    # Move expired projects to the archive before they leave this sheet
+    if rows_to_archive:
+        archive_wb = open_archive_workbook(columns)
+        # Rows left in the archive by a pass whose requests.xlsx save failed are overwritten
+        archive_rows = {str(row[0]): row_idx for row_idx, row in
+                        enumerate(archive_wb.active.iter_rows(min_row=2, max_col=1, values_only=True), start=2)}
+        for row_idx in rows_to_archive:
+            archived = dict(rows_before[row_idx])
+            archived['archived'] = True
+            archived['archivedAt'] = now.isoformat()
+            append_request_row(archive_wb.active, archived, archive_rows.get(str(archived.get('id'))))
+        save_workbook(archive_wb, ARCHIVE_FILE)
+    
+    # Keep history of deleted rows in the retention store before they go
+    retained_count = retain_requests([rows_before[row_idx] for row_idx in sorted(set(rows_to_delete))],
+                                     now, 'requests')
+    
+    # Delete rows in reverse order to avoid index shifting
+    for row_idx in sorted(set(rows_to_delete) | set(rows_to_archive), reverse=True):
+        ws.delete_rows(row_idx)
+    
+    if updated:
+        save_requests_workbook(wb, signature, changes)
+    
+    return {
+        'updated': updated,
+        'expired_count': expired_count,
+        'archived_count': archived_count,
+        'retained_count': retained_count
+    }
+
+def sweep_archived_projects(now):
+    """Move pending projects archived more than 7 days ago to the retention store.
+    
+    Returns the raw rows that were removed from the archive workbook.
+    """
+    if not os.path.exists(ARCHIVE_FILE):
+        return []
+    
+    archive_wb = openpyxl.load_workbook(ARCHIVE_FILE)
+    archive_ws = archive_wb.active
+    columns = get_column_names(archive_ws)
+    
+    swept = []
+    rows_to_delete = []
+    for row_idx, row in enumerate(archive_ws.iter_rows(min_row=2, values_only=True), start=2):
+        request_data = {col: row[i] for i, col in enumerate(columns) if i < len(row)}
+        if request_data.get('type') != 'project' or request_data.get('status') != 'Pending':
+            continue
+        try:
+            archived_date = datetime.fromisoformat(str(request_data.get('archivedAt')))
+        except ValueError:
+            continue
+        
+        delete_date = datetime.fromtimestamp(archived_date.timestamp() + (7 * 24 * 60 * 60))
+        if now > delete_date:
+            rows_to_delete.append(row_idx)
+            swept.append(request_data)
+    
+    if not rows_to_delete:
+        return []
+    
+    retain_requests(swept, now, 'archive')
+    for row_idx in reversed(rows_to_delete):
+        archive_ws.delete_rows(row_idx)
+    
+    save_workbook(archive_wb, ARCHIVE_FILE)
+    return swept
+
+def days_after(moment, days):
+    """Add days to a datetime the way the expiry rules do (via timestamps)."""
+    return datetime.fromtimestamp(moment.timestamp() + (days * 24 * 60 * 60))
+
+def request_expiry_deadline(request_data):
+    """Get when check_expired_requests next has work to do for a request.
+    
+    Mirrors the rules of expire_request_rows (and, for archived projects,
+    sweep_archived_projects). Returns None if no rule will ever apply.
+    """
+    truthy = ['TRUE', 'True', 'true', True, 1]
+    status = request_data.get('status')
+    try:
+        if status in ['Completed', 'Rejected'] and request_data.get('lastStatusUpdate'):
+            if 'isExpired' not in request_data:
+                return None
+            # Marked isExpired at this point, deleted by the pass after that
+            return days_after(datetime.fromisoformat(request_data.get('lastStatusUpdate')), 1)
+        if status != 'Pending':
+            return None
+        
+        if request_data.get('createdAt'):
+            created_date = datetime.fromisoformat(request_data.get('createdAt'))
+        elif request_data.get('dateCreated'):
+            created_date = datetime.strptime(request_data.get('dateCreated'), "%d/%m/%Y")
+        else:
+            return None
+        
+        if request_data.get('type') == 'project' and request_data.get('archived') in truthy:
+            if not request_data.get('archivedAt'):
+                return None
+            return days_after(datetime.fromisoformat(request_data.get('archivedAt')), 7)
+    except (TypeError, ValueError):
+        return None
+    
+    if request_data.get('type') == 'project':
+        return days_after(created_date, 60)
+    if request_data.get('multiDepartment') in truthy:
+        return days_after(created_date, 45)
+    return days_after(created_date, 30)
+
+# Expiry deadlines for the serve-mode timer: per request id the decoded
+# request they were computed from, and the earliest archive sweep
+expiry_schedule = {'deadlines': {}, 'archiveSignature': None, 'archiveDeadline': None}
+
+def archive_expiry_deadline():
+    """Get the earliest sweep deadline in the archive workbook, or None."""
+    signature = file_signature(ARCHIVE_FILE)
+    if signature != expiry_schedule['archiveSignature']:
+        deadline = None
+        if signature is not None:
+            for request_data in rows_to_dicts(ARCHIVE_FILE):
+                if request_data.get('type') != 'project' or request_data.get('status') != 'Pending':
+                    continue
+                try:
+                    candidate = days_after(datetime.fromisoformat(str(request_data.get('archivedAt'))), 7)
+                except ValueError:
+                    continue
+                if deadline is None or candidate < deadline:
+                    deadline = candidate
+        expiry_schedule['archiveSignature'] = signature
+        expiry_schedule['archiveDeadline'] = deadline
+    return expiry_schedule['archiveDeadline']
+
+def expiry_due(snapshot, now):
+    """Split the expiry deadlines of a requests snapshot and the archive at now.
+    
+    Returns (ids of the requests that are due, whether the archive sweep is
+    due, the earliest deadline still to come or None). Deadlines are only
+    recomputed for requests the snapshot replaced since the last call, and
+    only looked at for rows whose status can have one.
+    """
+    cached = expiry_schedule['deadlines']
+    deadlines = {}
+    due = []
+    upcoming = None
+    # Only these statuses have deadlines; other rows are skipped via the status bitmaps
+    requests = snapshot['requests']
+    candidates = filter_bitmap(snapshot, 'status', ['Pending', 'Completed', 'Rejected'])
+    for position in bitmap_positions(candidates):
+        request = requests[position]
+        request_id = str(request.get('id'))
+        entry = cached.get(request_id)
+        if entry is None or entry[0] is not request:
+            entry = (request, request_expiry_deadline(request))
+        deadlines[request_id] = entry
         
-        elif operation == 'abandon_request':
-            if len(sys.argv) < 4:
-                print('Missing request ID or username', file=sys.stderr)
-                sys.exit(1)
+        deadline = entry[1]
+        if deadline is None:
+            continue
+        if deadline < now:
+            due.append(request_id)
+        elif upcoming is None or deadline < upcoming:
+            upcoming = deadline
+    expiry_schedule['deadlines'] = deadlines
+    
+    archive_deadline = archive_expiry_deadline()
+    archive_due = archive_deadline is not None and archive_deadline < now
+    if archive_deadline is not None and not archive_due and (upcoming is None or archive_deadline < upcoming):
+        upcoming = archive_deadline
+    return due, archive_due, upcoming
+
+def bloom_positions(value, bits):
+    """Get the bit positions of a value in a bloom filter of the given size."""
+    digest = hashlib.sha1(str(value).encode('utf-8')).digest()
+    h1 = int.from_bytes(digest[:8], 'big')
+    h2 = int.from_bytes(digest[8:16], 'big') | 1
+    return [(h1 + i * h2) % bits for i in range(RETENTION_BLOOM_HASHES)]
+
+def bloom_add(bloom, values):
+    """Add values to a bloom filter stored in a bytearray."""
+    bits = len(bloom) * 8
+    for value in values:
+        for position in bloom_positions(value, bits):
+            bloom[position >> 3] |= 1 << (position & 7)
+
+def bloom_contains(bloom, value):
+    """Check whether a value may be in a bloom filter (no false negatives)."""
+    bits = len(bloom) * 8
+    if not bits:
+        return False
+    return all(bloom[position >> 3] & (1 << (position & 7)) for position in bloom_positions(value, bits))
+
+def load_retention_manifest():
+    """Load the retention manifest, or an empty one."""
+    try:
+        with open(RETENTION_MANIFEST_FILE, 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    manifest.setdefault('partitions', {})
+    return manifest
+
+def save_retention_manifest(manifest):
+    """Atomically write the retention manifest."""
+    tmp_file = RETENTION_MANIFEST_FILE + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_file, RETENTION_MANIFEST_FILE)
+
+def iter_retention_partition(partition):
+    """Stream the records of a retention partition."""
+    path = os.path.join(RETENTION_DIR, partition['file'])
+    if not os.path.exists(path):
+        return
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def retention_date(record, field):
+    """Get the createdAt or retiredAt of a retained record as a naive ISO string."""
+    if field == 'createdAt':
+        value = parse_created_date(record)
+    else:
+        try:
+            value = datetime.fromisoformat(str(record.get(field)))
+        except ValueError:
+            value = None
+    return value.replace(tzinfo=None).isoformat() if value else None
+
+def widen_range(date_range, value):
+    """Extend a [min, max] pair of ISO strings to include value."""
+    if value is None:
+        return date_range
+    low, high = date_range or [None, None]
+    return [value if low is None or value < low else low,
+            value if high is None or value > high else high]
+
+def retain_requests(rows, now, source):
+    """Roll raw request rows into the retention partition for the current month.
+    
+    Each partition is a gzipped JSONL file that is only ever appended to (as
+    a new gzip member). The manifest records per partition the row count,
+    the createdAt and retiredAt ranges and a bloom filter of ids, so queries
+    can skip partitions without opening them. The manifest is written before
+    the rows: a crash in between can only produce false positives.
+    
+    Rows are retained before they are removed from their workbook, so when
+    that save fails the next pass offers them again; ids that a partition
+    already holds are skipped. Returns how many rows were added.
+    """
+    if not rows:
+        return 0
+    
+    os.makedirs(RETENTION_DIR, exist_ok=True)
+    month = now.strftime('%Y-%m')
+    manifest = load_retention_manifest()
+    partition = manifest['partitions'].setdefault(month, {
+        'file': f'requests-{month}.jsonl.gz',
+        'count': 0,
+        'capacity': 0,
+        'bloom': '',
+        'createdAt': None,
+        'retiredAt': None
+    })
+    
+    records = []
+    for row in rows:
+        record = {key: value for key, value in row.items() if key is not None}
+        record['retiredAt'] = now.isoformat()
+        record['retiredFrom'] = source
+        records.append(record)
+    retained = retained_ids(manifest, set(str(record.get('id')) for record in records))
+    if retained:
+        records = [record for record in records if str(record.get('id')) not in retained]
+        if not records:
+            return 0
+    new_ids = [str(record.get('id')) for record in records]
+    
+    count = partition['count'] + len(records)
+    if count > partition['capacity']:
+        # Resize by doubling so rebuilding from the partition stays amortized O(1) per id
+        capacity = max(RETENTION_BLOOM_MIN_CAPACITY, partition['capacity'] * 2, count)
+        bloom = bytearray((capacity * RETENTION_BLOOM_BITS_PER_ID + 7) // 8)
+        bloom_add(bloom, (str(record.get('id')) for record in iter_retention_partition(partition)))
+        partition['capacity'] = capacity
+    else:
+        bloom = bytearray(base64.b64decode(partition['bloom']))
+    bloom_add(bloom, new_ids)
+    
+    partition['bloom'] = base64.b64encode(bytes(bloom)).decode('ascii')
+    partition['count'] = count
+    for record in records:
+        partition['createdAt'] = widen_range(partition['createdAt'], retention_date(record, 'createdAt'))
+        partition['retiredAt'] = widen_range(partition['retiredAt'], retention_date(record, 'retiredAt'))
+    save_retention_manifest(manifest)
+    
+    with gzip.open(os.path.join(RETENTION_DIR, partition['file']), 'at', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, default=str) + '\n')
+    
+    return len(records)
+
+def retained_ids(manifest, ids):
+    """Get the ids that some retention partition already holds.
+    
+    Only partitions whose bloom filter matches one of the ids are read.
+    """
+    found = set()
+    for partition in manifest['partitions'].values():
+        bloom = base64.b64decode(partition['bloom'])
+        candidates = set(request_id for request_id in ids if bloom_contains(bloom, request_id))
+        if candidates:
+            found.update(str(record.get('id')) for record in iter_retention_partition(partition)
+                         if str(record.get('id')) in candidates)
+    return found
+
+def query_retained_requests(query_json):
+    """Search retained requests by id and/or date range.
+    
+    query_json may contain 'id', 'from' and 'to' (ISO dates, inclusive),
+    'field' ('createdAt', the default, or 'retiredAt') and 'limit'. Only
+    partitions whose manifest entry can match are decompressed and scanned.
+    """
+    try:
+        query = json.loads(query_json) if query_json else {}
+        field = query.get('field', 'createdAt')
+        if field not in ['createdAt', 'retiredAt']:
+            raise ValueError(f"Unsupported date field: {field}")
+        
+        date_from = datetime.fromisoformat(query['from']).isoformat() if query.get('from') else None
+        date_to = datetime.fromisoformat(query['to']).isoformat() if query.get('to') else None
+        # A bare end date covers that whole day
+        if query.get('to') and len(query['to']) == 10:
+            date_to = query['to'] + 'T23:59:59.999999'
+        request_id = str(query['id']) if query.get('id') else None
+        limit = int(query.get('limit', 1000))
+        
+        manifest = load_retention_manifest()
+        results = []
+        scanned = 0
+        
+        for month in sorted(manifest['partitions']):
+            partition = manifest['partitions'][month]
             
-            request_id = sys.argv[2]
-            username = sys.argv[3]
+            if request_id and not bloom_contains(base64.b64decode(partition['bloom']), request_id):
+                continue
+            low, high = partition.get(field) or [None, None]
+            if (date_from or date_to) and low is None:
+                continue
+            if date_from and high < date_from:
+                continue
+            if date_to and low > date_to:
+                continue
             
-            result = abandon_request(request_id, username)
-            if result:
-                print(json.dumps(result))
-            else:
-                print(json.dumps(None))
+            scanned += 1
+            for record in iter_retention_partition(partition):
+                if request_id and str(record.get('id')) != request_id:
+                    continue
+                value = retention_date(record, field)
+                if date_from and (value is None or value < date_from):
+                    continue
+                if date_to and (value is None or value > date_to):
+                    continue
+                
+                results.append(decode_request(record))
+                if len(results) >= limit:
+                    break
+            if len(results) >= limit:
+                break
         
-        elif operation == 'reject_request':
-            if len(sys.argv) < 4:
-                print('Missing request ID or username', file=sys.stderr)
-                sys.exit(1)
+        return {
+            'requests': results,
+            'partitionsScanned': scanned,
+            'partitionsTotal': len(manifest['partitions'])
+        }
+    except Exception as e:
+        print(f"Error querying retained requests: {str(e)}", file=sys.stderr)
+        return None
+
+# Acceptance rules per request (warm in serve mode), rebuilt when requests.xlsx changes
+acceptance_index = {'signature': None}
+
+def load_acceptance_index():
+    """Get the acceptance index, rebuilding it if requests.xlsx changed.
+    
+    'requests' maps each id to (status, acceptedBy, restricted to listed
+    departments) and 'byStatus' holds a bitmap over 'ids' per status;
+    'byDepartment' maps a department to the ids its members may accept by
+    the department rule and 'openToAll' holds the ids any department may
+    accept. Status and acceptedBy are checked per id.
+    """
+    signature = file_signature(REQUESTS_FILE)
+    if acceptance_index['signature'] == signature:
+        return acceptance_index
+    
+    requests = {}
+    by_department = {}
+    open_to_all = set()
+    statuses = []
+    if signature is not None:
+        for request in iter_request_rows(REQUESTS_FILE):
+            if not request.get('id'):
+                continue
+            request_id = str(request.get('id'))
+            # The first row with an id wins, as with the old linear scan
+            if request_id in requests:
+                continue
+            statuses.append({'status': request.get('status')})
             
-            request_id = sys.argv[2]
-            username = sys.argv[3]
-            reason = sys.argv[4] if len(sys.argv) > 4 else ''
+            multi_department = (request.get('multiDepartment') in ['TRUE', 'True', 'true', True, 1] or
+                                request.get('type', 'request') in ['project', 'Project'])
+            requests[request_id] = (request.get('status'), parse_json_list(request.get('acceptedBy')),
+                                    multi_department)
             
-            result = reject_request(request_id, username, reason)
-            if result:
-                print(json.dumps(result))
+            if multi_department:
+                # Multi-department requests and projects are open to the listed departments
+                departments = parse_json_list(request.get('departments'))
+                if not departments:
+                    open_to_all.add(request_id)
+                for department in departments:
+                    by_department.setdefault(department, set()).add(request_id)
             else:
-                print(json.dumps(None))
+                by_department.setdefault(request.get('department'), set()).add(request_id)
+    
+    acceptance_index.clear()
+    acceptance_index.update({
+        'signature': signature,
+        'requests': requests,
+        'ids': list(requests),
+        'byStatus': build_bitmaps(statuses, ['status'])['status'],
+        'byDepartment': by_department,
+        'openToAll': open_to_all
+    })
+    return acceptance_index
+
+def check_acceptance(index, request_id, username, department):
+    """Check one request against the acceptance index."""
+    entry = index['requests'].get(str(request_id))
+    if entry is None:
+        return {'canAccept': False, 'reason': 'Request not found'}
+    
+    status, accepted_by, multi_department = entry
+    # Check if request is already accepted by user
+    if username in accepted_by:
+        return {'canAccept': False, 'reason': 'Already accepted'}
+    
+    # Check request status
+    if status not in ['Pending', 'Rejected']:
+        return {'canAccept': False, 'reason': f"Cannot accept request with status: {status}"}
+    
+    request_id = str(request_id)
+    if request_id in index['openToAll'] or request_id in index['byDepartment'].get(department, ()):
+        return {'canAccept': True}
+    
+    if multi_department:
+        return {'canAccept': False, 'reason': 'Your department is not required for this request'}
+    return {'canAccept': False, 'reason': 'Request is for a different department'}
+
+def can_user_accept_request(request_id, username, department):
+    """Check if user can accept a request."""
+    try:
+        return check_acceptance(load_acceptance_index(), request_id, username, department)
+    except Exception as e:
+        print(f"Error checking if user can accept request: {str(e)}", file=sys.stderr)
+        return {'canAccept': False, 'reason': 'Internal error'}
+
+def can_user_accept_requests(request_ids, username, department):
+    """Check if user can accept each of many requests in one pass.
+    
+    request_ids is a JSON list of ids or 'all_pending' for every pending
+    request. Returns {id: {'canAccept', 'reason'?}}.
+    """
+    try:
+        index = load_acceptance_index()
+        if request_ids == 'all_pending':
+            ids = index['ids']
+            request_ids = [ids[position] for position in bitmap_positions(index['byStatus'].get('Pending', 0))]
+        else:
+            request_ids = json.loads(request_ids)
+            if not isinstance(request_ids, list):
+                raise ValueError('Request ids must be a list or "all_pending"')
+        
+        return {str(request_id): check_acceptance(index, request_id, username, department)
+                for request_id in request_ids}
+    except Exception as e:
+        print(f"Error checking if user can accept requests: {str(e)}", file=sys.stderr)
+        return None
+
+def pop_option(args, name):
+    """Remove '<name> <value>' from args and return the value (None if absent)."""
+    if name not in args:
+        return None
+    
+    idx = args.index(name)
+    value = args[idx + 1] if idx + 1 < len(args) else ''
+    del args[idx:idx + 2]
+    return value
+
+def pop_flag(args, name):
+    """Remove a boolean flag from args and return whether it was present."""
+    if name not in args:
+        return False
+    
+    args.remove(name)
+    return True
+
+def dispatch(operation, args):
+    """Run one operation with its CLI arguments and return the JSON-able result.
+    
+    args is the argument list after the operation name; it is consumed by the
+    option parsing. Usage errors raise ValueError.
+    """
+    args = list(args)
+    # Read operations answer with a {tag, notModified, data} envelope when given a tag
+    if_none_match = pop_option(args, '--if-none-match')
+    
+    if operation == 'get_departments':
+        result = get_departments(if_none_match)
+        return result
+    
+    elif operation == 'get_users':
+        result = get_users(if_none_match)
+        return result
+    
+    elif operation == 'login_user':
+        if len(args) < 1:
+            raise ValueError('Missing username')
+        
+        username = args[0]
+        password = args[1] if len(args) > 1 else ''
+        
+        result = login_user(username, password)
+        return result or None
+    
+    elif operation == 'resolve_session':
+        if len(args) < 1:
+            raise ValueError('Missing session token')
+        
+        token = args[0]
+        
+        result = resolve_session(token)
+        return result
+    
+    elif operation == 'end_session':
+        if len(args) < 1:
+            raise ValueError('Missing session token')
+        
+        token = args[0]
+        
+        result = end_session(token)
+        return {'success': result}
+    
+    elif operation == 'update_user':
+        if len(args) < 2:
+            raise ValueError('Missing user ID or data')
+        
+        user_id = args[0]
+        user_data = args[1]
+        
+        result = update_user(user_id, user_data)
+        return result or None
+    
+    elif operation == 'get_requests':
+        include_archived = pop_flag(args, '--include-archived')
+        result = get_requests(if_none_match, include_archived)
+        return result
+    
+    elif operation == 'get_requests_since':
+        if len(args) < 1:
+            raise ValueError('Missing version')
+        
+        since_version = args[0]
+        
+        result = get_requests_since(since_version)
+        return result
+    
+    elif operation == 'get_request_stats':
+        result = get_request_stats()
+        return result
+    
+    elif operation == 'create_request':
+        if len(args) < 1:
+            raise ValueError('Missing request data')
+        
+        request_data = args[0]
+        
+        result = create_request(request_data)
+        return result or None
+    
+    elif operation == 'bulk_import_requests':
+        file_format = pop_option(args, '--format')
+        chunk_size = pop_option(args, '--chunk-size') or BULK_IMPORT_CHUNK_SIZE
+        rejects_path = pop_option(args, '--rejects')
+        if len(args) < 1:
+            raise ValueError('Missing import file path')
+        
+        import_path = args[0]
+        
+        result = bulk_import_requests(import_path, file_format, chunk_size, rejects_path)
+        if result is None:
+            raise RuntimeError(f'{operation} failed')
+        return result
+    
+    elif operation == 'update_request':
+        if len(args) < 2:
+            raise ValueError('Missing request ID or data')
+        
+        request_id = args[0]
+        request_data = args[1]
+        
+        result = update_request(request_id, request_data)
+        return result or None
+    
+    elif operation == 'delete_request':
+        if len(args) < 1:
+            raise ValueError('Missing request ID')
         
-        elif operation == 'get_user_requests':
-            if len(sys.argv) < 3:
-                print('Missing username', file=sys.stderr)
-                sys.exit(1)
+        request_id = args[0]
+        
+        result = delete_request(request_id)
+        return {'success': result}
+    
+    elif operation == 'archive_request':
+        if len(args) < 1:
+            raise ValueError('Missing request ID')
+        
+        request_id = args[0]
+        
+        result = archive_request(request_id)
+        return result or None
+    
+    elif operation == 'unarchive_request':
+        if len(args) < 1:
+            raise ValueError('Missing request ID')
+        
+        request_id = args[0]
+        
+        result = unarchive_request(request_id)
+        return result or None
+    
+    elif operation == 'accept_request':
+        if len(args) < 2:
+            raise ValueError('Missing request ID or username')
+        
+        request_id = args[0]
+        username = args[1]
+        
+        result = accept_request(request_id, username)
+        return result or None
+    
+    elif operation == 'complete_request':
+        if len(args) < 2:
+            raise ValueError('Missing request ID or username')
+        
+        request_id = args[0]
+        username = args[1]
+        
+        result = complete_request(request_id, username)
+        return result or None
+    
+    elif operation == 'abandon_request':
+        if len(args) < 2:
+            raise ValueError('Missing request ID or username')
+        
+        request_id = args[0]
+        username = args[1]
+        
+        result = abandon_request(request_id, username)
+        return result or None
+    
+    elif operation == 'reject_request':
+        if len(args) < 2:
+            raise ValueError('Missing request ID or username')
+        
+        request_id = args[0]
+        username = args[1]
+        reason = args[2] if len(args) > 2 else ''
+        
+        result = reject_request(request_id, username, reason)
+        return result or None
+    
+    elif operation == 'get_user_requests':
+        include_archived = pop_flag(args, '--include-archived')
+        if len(args) < 1:
+            raise ValueError('Missing username')
+        
+        username = args[0]
+        
+        result = get_user_requests(username, include_archived)
+        return result
+    
+    elif operation == 'filter_requests':
+        if len(args) < 1:
+            raise ValueError('Missing filters')
+        
+        filters = args[0]
+        
+        result = filter_requests(filters, if_none_match)
+        return result
+    
+    elif operation == 'explain_filter_requests':
+        if len(args) < 1:
+            raise ValueError('Missing filters')
+        
+        filters = args[0]
+        
+        result = explain_filter_requests(filters)
+        if result is None:
+            raise RuntimeError(f'{operation} failed')
+        return result
+    
+    elif operation == 'export_requests':
+        file_format = pop_option(args, '--format')
+        filters = pop_option(args, '--filters')
+        list_format = pop_option(args, '--list-format')
+        include_archived = pop_flag(args, '--include-archived')
+        if len(args) < 1:
+            raise ValueError('Missing export file path')
+        
+        export_path = args[0]
+        
+        result = export_requests(export_path, file_format, filters, include_archived, list_format)
+        if result is None:
+            raise RuntimeError(f'{operation} failed')
+        return result
+    
+    elif operation == 'get_result_cache_stats':
+        return get_result_cache_stats()
+    
+    elif operation == 'check_expired_requests':
+        request_ids = pop_option(args, '--ids')
+        result = check_expired_requests(json.loads(request_ids) if request_ids else None)
+        return result
+    
+    elif operation == 'query_retained_requests':
+        query = args[0] if args else '{}'
+        
+        result = query_retained_requests(query)
+        return result
+    
+    elif operation == 'can_user_accept_request':
+        if len(args) < 3:
+            raise ValueError('Missing parameters')
+        
+        request_id = args[0]
+        username = args[1]
+        department = args[2]
+        
+        result = can_user_accept_request(request_id, username, department)
+        return result
+    
+    elif operation == 'can_user_accept_requests':
+        if len(args) < 3:
+            raise ValueError('Missing parameters')
+        
+        request_ids = args[0]
+        username = args[1]
+        department = args[2]
+        
+        result = can_user_accept_requests(request_ids, username, department)
+        return result
+    
+    else:
+        raise ValueError(f'Unknown operation: {operation}')
+
+def handle_message(message):
+    """Run one serve-mode message and build its response."""
+    message_id = message.get('id')
+    try:
+        args = [str(arg) for arg in message.get('args', [])]
+        if not args:
+            raise ValueError('Missing operation')
+        return {'id': message_id, 'result': dispatch(args[0], args[1:])}
+    except Exception as e:
+        print(f"Error handling message: {str(e)}", file=sys.stderr)
+        return {'id': message_id, 'error': str(e)}
+
+def is_group_commit_message(message):
+    """Check whether a serve-mode message is a write that can share a group commit."""
+    args = message.get('args') or []
+    if not (COMMIT_WINDOW_MS > 0 and bool(args) and args[0] in GROUP_COMMIT_OPERATIONS):
+        return False
+    if args[0] == 'update_request' and len(args) > 2:
+        # Archiving saves the archive workbook on its own, so it runs alone
+        try:
+            return not parse_bool(json.loads(args[2]).get('archived'))
+        except Exception:
+            return False
+    return True
+
+def run_commit_batch(messages):
+    """Run write messages against one workbook and save it once.
+    
+    A write that raised (whether dispatch reported it or the operation
+    caught it, see fail_commit_batch_write) may have left partial edits in
+    the shared workbook, so the batch is reloaded and the earlier writes
+    replayed without it. Answers such as not found or not allowed are
+    returned as they are. Nobody has been answered yet, so the replayed
+    results are the ones returned. A write that saved a file itself (an
+    archived delete, the first create) is not replayed: its answer is kept
+    and it takes no part in the shared save. If the shared save fails,
+    every write deferred to it fails.
+    
+    Returns the responses and the flush_commit_batch result.
+    """
+    failed = {}
+    saved_alone = {}
+    while True:
+        begin_commit_batch()
+        responses = {}
+        for index, message in enumerate(messages):
+            if index in failed:
+                continue
+            if index in saved_alone:
+                responses[index] = saved_alone[index]
+                continue
             
-            username = sys.argv[2]
+            response = handle_message(message)
+            if 'error' in response or commit_batch['failed']:
+                failed[index] = response
+                break
+            if commit_batch['external']:
+                saved_alone[index] = response
+                commit_batch['external'] = False
+            responses[index] = response
+        else:
+            break
+        discard_commit_batch()
+    
+    saved = None
+    try:
+        saved = flush_commit_batch()
+    except Exception as e:
+        print(f"Error saving group commit: {str(e)}", file=sys.stderr)
+        responses = {index: {'id': message.get('id'), 'error': f'Commit failed: {str(e)}'}
+                     for index, message in enumerate(messages) if index in responses and index not in saved_alone}
+        responses.update(saved_alone)
+    
+    responses.update(failed)
+    return [responses[index] for index in sorted(responses)], saved
+
+def is_snapshot_read(message):
+    """Check whether a serve-mode message can be answered from the requests snapshot."""
+    args = message.get('args') or []
+    if not args or args[0] not in SNAPSHOT_READ_OPERATIONS:
+        return False
+    if '--include-archived' in args:
+        # Snapshots carry the archive rows for the per-user view only
+        return args[0] == 'get_user_requests'
+    # Archived rows live in another workbook; let the writer thread read those
+    return not (args[0] in ['filter_requests', 'explain_filter_requests'] and 'includeArchived' in str(args[1:]))
+
+def read_from_snapshot(message, snapshot):
+    """Answer a read message from a requests snapshot."""
+    snapshot_reads.snapshot = snapshot
+    try:
+        return handle_message(message)
+    finally:
+        snapshot_reads.snapshot = None
+
+def write_messages(messages):
+    """Run messages on the writer thread, then publish the snapshot they produced."""
+    saved = None
+    if is_group_commit_message(messages[0]):
+        responses, saved = run_commit_batch(messages)
+    elif is_snapshot_read(messages[0]):
+        # Reads end up here when there is no current snapshot; build it first
+        try:
+            publish_requests_snapshot()
+        except Exception as e:
+            print(f"Error publishing requests snapshot: {str(e)}", file=sys.stderr)
+            requests_snapshot['current'] = None
+        snapshot = requests_snapshot['current']
+        if snapshot is not None:
+            return [read_from_snapshot(message, snapshot) for message in messages]
+        responses = [handle_message(message) for message in messages]
+    else:
+        responses = [handle_message(message) for message in messages]
+    
+    try:
+        publish_requests_snapshot(saved)
+    except Exception as e:
+        # Readers fall back to the writer thread until a snapshot can be built
+        print(f"Error publishing requests snapshot: {str(e)}", file=sys.stderr)
+        requests_snapshot['current'] = None
+    return responses
+
+def read_messages(put):
+    """Feed JSON-line messages from stdin to put(), then None at EOF."""
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            put(json.loads(line))
+        except ValueError as e:
+            put({'id': None, 'error': f'Invalid message: {str(e)}'})
+    put(None)
+
+async def serve_async():
+    """Event loop of serve mode; see serve."""
+    loop = asyncio.get_running_loop()
+    out = sys.stdout
+    # Anything printed by an operation must not end up in the protocol stream
+    sys.stdout = sys.stderr
+    
+    def respond(responses):
+        for response in responses:
+            out.write(json.dumps(response) + '\n')
+        out.flush()
+    
+    messages = asyncio.Queue()
+    writes = asyncio.Queue()
+    # Messages handed to the writer thread and not yet answered
+    state = {'queued': 0}
+    # Set after every writer batch, so the expiry timer looks at the new snapshot
+    expiry_wakeup = asyncio.Event()
+    
+    def queue_internal(args):
+        # Writer-thread work of our own; its response is not sent
+        state['queued'] += 1
+        writes.put_nowait({'id': None, 'args': args, 'internal': True})
+    
+    threading.Thread(target=read_messages, daemon=True,
+                     args=(lambda message: loop.call_soon_threadsafe(messages.put_nowait, message),)).start()
+    
+    async def run_writer(executor):
+        pending = None
+        done = False
+        while not done:
+            message = pending if pending is not None else await writes.get()
+            pending = None
+            if message is None:
+                break
             
-            result = get_user_requests(username)
-            print(json.dumps(result))
-        
-        elif operation == 'filter_requests':
-            if len(sys.argv) < 3:
-                print('Missing filters', file=sys.stderr)
-                sys.exit(1)
+            batch = [message]
+            if is_group_commit_message(message):
+                # Collect the writes that arrive within the commit window
+                deadline = loop.time() + COMMIT_WINDOW_MS / 1000.0
+                while len(batch) < COMMIT_BATCH_LIMIT:
+                    try:
+                        message = await asyncio.wait_for(writes.get(), max(deadline - loop.time(), 0))
+                    except asyncio.TimeoutError:
+                        break
+                    if message is None:
+                        done = True
+                        break
+                    if not is_group_commit_message(message):
+                        pending = message
+                        break
+                    batch.append(message)
             
-            filters = sys.argv[2]
+            responses = await loop.run_in_executor(executor, write_messages, batch)
+            state['queued'] -= len(batch)
+            respond([response for message, response in zip(batch, responses) if not message.get('internal')])
+            expiry_wakeup.set()
+    
+    async def run_expiry_timer():
+        # Loop time before which a request that is still due is not passed again
+        # (None stands for the archive sweep)
+        retry_at = {}
+        while True:
+            delay = None
+            snapshot = requests_snapshot['current']
+            if snapshot is not None:
+                now = datetime.now()
+                due, archive_due, upcoming = expiry_due(snapshot, now)
+                if archive_due:
+                    due.append(None)
+                
+                current = loop.time()
+                retry_at = {key: retry_at[key] for key in due if key in retry_at}
+                ready = [key for key in due if retry_at.get(key, 0) <= current]
+                if ready:
+                    for key in ready:
+                        retry_at[key] = current + EXPIRY_RETRY_SECONDS
+                    # Only the due requests are looked at; the writer wakes us once it is published
+                    queue_internal(['check_expired_requests', '--ids',
+                                    json.dumps([key for key in ready if key is not None])])
+                else:
+                    waits = [retry_at[key] - current for key in due]
+                    if upcoming is not None:
+                        waits.append((upcoming - now).total_seconds())
+                    delay = max(min(waits), 0) if waits else None
             
-            result = filter_requests(filters)
-            print(json.dumps(result))
-        
-        elif operation == 'check_expired_requests':
-            result = check_expired_requests()
-            print(json.dumps(result))
+            try:
+                await asyncio.wait_for(expiry_wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            expiry_wakeup.clear()
+    
+    # Snapshot reads in flight, kept referenced until they are answered
+    reads = set()
+    
+    async def run_read(message, snapshot):
+        respond([await loop.run_in_executor(readers, read_from_snapshot, message, snapshot)])
+    
+    start_query_pools()
+    with ThreadPoolExecutor(max_workers=1) as executor, ThreadPoolExecutor(max_workers=READ_THREADS) as readers:
+        writer = asyncio.ensure_future(run_writer(executor))
+        timer = None
+        if EXPIRY_TIMER:
+            # The timer works from the snapshot, so build it up front
+            queue_internal(['get_request_stats'])
+            timer = asyncio.ensure_future(run_expiry_timer())
         
-        elif operation == 'can_user_accept_request':
-            if len(sys.argv) < 5:
-                print('Missing parameters', file=sys.stderr)
-                sys.exit(1)
+        while True:
+            message = await messages.get()
+            if message is None:
+                break
+            if 'error' in message:
+                respond([message])
+                continue
             
-            request_id = sys.argv[2]
-            username = sys.argv[3]
-            department = sys.argv[4]
+            # While the writer is busy requests.xlsx may be half written, so
+            # readers get the last published snapshot. When it is idle, a
+            # changed signature means another process wrote the file and the
+            # writer thread reads it (and publishes a fresh snapshot).
+            snapshot = requests_snapshot['current']
+            if (is_snapshot_read(message) and snapshot is not None and
+                (state['queued'] or snapshot['signature'] == file_signature(REQUESTS_FILE))):
+                # Scans (and parallel_query waiting on its workers) run on a
+                # reader thread, so the loop keeps queueing writes meanwhile
+                read = asyncio.ensure_future(run_read(message, snapshot))
+                reads.add(read)
+                read.add_done_callback(reads.discard)
+                continue
             
-            result = can_user_accept_request(request_id, username, department)
-            print(json.dumps(result))
+            state['queued'] += 1
+            writes.put_nowait(message)
         
-        else:
-            print(f'Unknown operation: {operation}', file=sys.stderr)
-            sys.exit(1)
+        if timer is not None:
+            timer.cancel()
+        if reads:
+            await asyncio.wait(reads)
+        writes.put_nowait(None)
+        await writer
+    stop_query_pools()
+
+def serve():
+    """Answer operations sent as JSON lines on stdin until it closes.
+    
+    Each request line is {"id": ..., "args": [operation, ...]} and each
+    answer is {"id": ..., "result": ...} or {"id": ..., "error": "..."}.
+    Answers can come out of order. Keeping one process alive lets caches
+    such as the user directory stay warm between calls.
+    
+    Request reads (SNAPSHOT_READ_OPERATIONS) are answered on READ_THREADS
+    reader threads from an immutable snapshot of requests.xlsx, so they
+    never wait for a save and never hold up the event loop. Everything else
+    runs in arrival order on one writer thread, which publishes the next
+    snapshot before answering. Request writes (GROUP_COMMIT_OPERATIONS) that
+    arrive within COMMIT_WINDOW_MS of each other are group committed:
+    applied in order to one workbook, saved once, and only then answered.
+    
+    Unless EXCEL_EXPIRY_TIMER=0, a timer sleeps until the next expiry,
+    archive or delete deadline of the snapshot (or the archive) and then
+    queues check_expired_requests for just the requests that are due.
     
+    With EXCEL_SESSION_FILES=0 login sessions are only kept in memory.
+    """
+    session_store['memory'] = not SESSION_FILES
+    asyncio.run(serve_async())
+
+def main():
+    if len(sys.argv) < 2:
+        print('Usage: python excel_operations.py <operation> [args...]', file=sys.stderr)
+        sys.exit(1)
+    
+    operation = sys.argv[1]
+    if operation == 'serve':
+        serve()
+        return
+    
+    try:
+        result = dispatch(operation, sys.argv[2:])
+        print(json.dumps(result))
     except Exception as e:
         print(f'Error: {str(e)}', file=sys.stderr)
         sys.exit(1)
@@ -10,153 +10,230 @@ Requirements:
 - openpyxl
 
 Usage:
-python import_excel_data.py <excel_file_path>
+python import_excel_data.py <excel_file_path> [--jobs N]
+
+Source sheets are streamed in read-only mode and written with write-only
+workbooks, so large spreadsheets import in bounded memory. Each sheet is
+imported by its own worker process (--jobs 1 imports them in-process).
 """
 
 import sys
 import os
+import io
+import time
+import contextlib
 import openpyxl
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 import json
 
+# Defaults written when a source sheet has no data rows
+DEFAULT_DEPARTMENT_HEADERS = ["id", "name"]
+DEFAULT_DEPARTMENTS = [
+    ["IT", "Information Technology"],
+    ["HR", "Human Resources"],
+]
+
+DEFAULT_USER_HEADERS = ["username", "password", "fullName", "email", "role", "department", "phone"]
+DEFAULT_USERS = [
+    ["admin", "admin123", "Administrator", "admin@example.com", "admin", "IT", "123-456-7890"],
+    ["client", "client123", "Client User", "client@example.com", "client", "HR", "123-456-7891"],
+]
+
+DEFAULT_REQUEST_HEADERS = ["id", "title", "description", "department", "departments", "status", "creator", "createdAt",
+                           "type", "multiDepartment", "acceptedBy", "usersAccepted", "usersNeeded", "archived", "archivedAt"]
+
+def default_requests():
+    """Build the sample request written when the Requests sheet is empty."""
+    now = datetime.now().isoformat()
+    return [
+        ["#100001", "Sample Request", "This is a sample request for testing", "IT", json.dumps(["IT"]),
+         "Pending", "admin", now, "request", False, json.dumps([]), 0, 1, False, None],
+    ]
+
+def get_sheet(wb, sheet_name):
+    """Get a worksheet by name, or None if the source file does not have it."""
+    if sheet_name not in wb.sheetnames:
+        print(f"Sheet {sheet_name} not found, using defaults")
+        return None
+    return wb[sheet_name]
+
+def iter_source_rows(ws):
+    """Stream the non-empty rows of a (read-only) source worksheet as tuples."""
+    if ws is None:
+        return
+    
+    # Dimensions recorded by other tools can be wrong; read every row instead
+    if hasattr(ws, 'reset_dimensions'):
+        ws.reset_dimensions()
+    
+    for row in ws.iter_rows(values_only=True):
+        if any(value is not None for value in row):
+            yield row
+
+def copy_sheet(ws, output_file, default_headers, default_rows):
+    """Stream a source worksheet into a new single-sheet workbook.
+    
+    Rows are appended to a write-only workbook as they are read, so memory
+    use does not grow with the size of the sheet. If the sheet has no data
+    rows the default headers and rows are written instead.
+    
+    Returns the number of data rows written and whether defaults were used.
+    """
+    rows = iter_source_rows(ws)
+    headers = next(rows, None)
+    first_row = next(rows, None)
+    
+    output_wb = openpyxl.Workbook(write_only=True)
+    output_ws = output_wb.create_sheet()
+    
+    if first_row is None:
+        output_ws.append(list(default_headers))
+        for row in default_rows:
+            output_ws.append(row)
+        output_wb.save(output_file)
+        return len(default_rows), True
+    
+    output_ws.append(headers)
+    output_ws.append(first_row)
+    count = 1
+    for row in rows:
+        output_ws.append(row)
+        count += 1
+    
+    output_wb.save(output_file)
+    return count, False
+
 def import_departments(wb, output_path):
     """Import departments from Excel worksheet."""
     try:
-        ws = wb["Departments"]
-        output_wb = openpyxl.Workbook()
-        output_ws = output_wb.active
-        
-        # Copy headers
-        for col in range(1, ws.max_column + 1):
-            output_ws.cell(row=1, column=col, value=ws.cell(row=1, column=col).value)
-        
-        # Copy data
-        for row in range(2, ws.max_row + 1):
-            for col in range(1, ws.max_column + 1):
-                output_ws.cell(row=row, column=col, value=ws.cell(row=row, column=col).value)
-        
         output_file = os.path.join(output_path, 'departments.xlsx')
-        output_wb.save(output_file)
+        count, used_defaults = copy_sheet(get_sheet(wb, "Departments"), output_file,
+                                          DEFAULT_DEPARTMENT_HEADERS, DEFAULT_DEPARTMENTS)
         print(f"Successfully imported departments to {output_file}")
         
-        # Create a default department if none exists
-        if ws.max_row <= 1:
-            output_ws.cell(row=2, column=1, value="IT")
-            output_ws.cell(row=2, column=2, value="Information Technology")
-            output_ws.cell(row=3, column=1, value="HR")
-            output_ws.cell(row=3, column=2, value="Human Resources")
-            output_wb.save(output_file)
+        if used_defaults:
             print("Created default departments")
+        return count
     except Exception as e:
         print(f"Error importing departments: {e}")
 
 def import_users(wb, output_path):
     """Import users from Excel worksheet."""
     try:
-        ws = wb["Users"]
-        output_wb = openpyxl.Workbook()
-        output_ws = output_wb.active
-        
-        # Copy headers
-        for col in range(1, ws.max_column + 1):
-            output_ws.cell(row=1, column=col, value=ws.cell(row=1, column=col).value)
-        
-        # Copy data
-        for row in range(2, ws.max_row + 1):
-            for col in range(1, ws.max_column + 1):
-                output_ws.cell(row=row, column=col, value=ws.cell(row=row, column=col).value)
-        
         output_file = os.path.join(output_path, 'users.xlsx')
-        output_wb.save(output_file)
+        count, used_defaults = copy_sheet(get_sheet(wb, "Users"), output_file,
+                                          DEFAULT_USER_HEADERS, DEFAULT_USERS)
         print(f"Successfully imported users to {output_file}")
         
-        # Create default users if none exists
-        if ws.max_row <= 1:
-            # Create headers if they don't exist
-            headers = ["username", "password", "fullName", "email", "role", "department", "phone"]
-            for col, header in enumerate(headers, start=1):
-                output_ws.cell(row=1, column=col, value=header)
-                
-            # Add admin user
-            output_ws.cell(row=2, column=1, value="admin")
-            output_ws.cell(row=2, column=2, value="admin123")
-            output_ws.cell(row=2, column=3, value="Administrator")
-            output_ws.cell(row=2, column=4, value="admin@example.com")
-            output_ws.cell(row=2, column=5, value="admin")
-            output_ws.cell(row=2, column=6, value="IT")
-            output_ws.cell(row=2, column=7, value="123-456-7890")
-            
-            # Add client user
-            output_ws.cell(row=3, column=1, value="client")
-            output_ws.cell(row=3, column=2, value="client123")
-            output_ws.cell(row=3, column=3, value="Client User")
-            output_ws.cell(row=3, column=4, value="client@example.com")
-            output_ws.cell(row=3, column=5, value="client")
-            output_ws.cell(row=3, column=6, value="HR")
-            output_ws.cell(row=3, column=7, value="123-456-7891")
-            
-            output_wb.save(output_file)
+        if used_defaults:
             print("Created default users")
+        return count
     except Exception as e:
         print(f"Error importing users: {e}")
 
 def import_requests(wb, output_path):
     """Import requests from Excel worksheet."""
     try:
-        ws = wb["Requests"]
-        output_wb = openpyxl.Workbook()
-        output_ws = output_wb.active
-        
-        # Copy headers
-        for col in range(1, ws.max_column + 1):
-            output_ws.cell(row=1, column=col, value=ws.cell(row=1, column=col).value)
-        
-        # Copy data
-        for row in range(2, ws.max_row + 1):
-            for col in range(1, ws.max_column + 1):
-                output_ws.cell(row=row, column=col, value=ws.cell(row=row, column=col).value)
-        
         output_file = os.path.join(output_path, 'requests.xlsx')
-        output_wb.save(output_file)
+        count, used_defaults = copy_sheet(get_sheet(wb, "Requests"), output_file,
+                                          DEFAULT_REQUEST_HEADERS, default_requests())
         print(f"Successfully imported requests to {output_file}")
         
-        # Create a sample request if none exists
-        if ws.max_row <= 1:
-            # Create headers if they don't exist
-            headers = ["id", "title", "description", "department", "departments", "status", "creator", "createdAt", 
-                      "type", "multiDepartment", "acceptedBy", "usersAccepted", "usersNeeded", "archived", "archivedAt"]
-            for col, header in enumerate(headers, start=1):
-                output_ws.cell(row=1, column=col, value=header)
-                
-            # Add sample request
-            now = datetime.now().isoformat()
-            output_ws.cell(row=2, column=1, value="#100001")
-            output_ws.cell(row=2, column=2, value="Sample Request")
-            output_ws.cell(row=2, column=3, value="This is a sample request for testing")
-            output_ws.cell(row=2, column=4, value="IT")
-            output_ws.cell(row=2, column=5, value=json.dumps(["IT"]))
-            output_ws.cell(row=2, column=6, value="Pending")
-            output_ws.cell(row=2, column=7, value="admin")
-            output_ws.cell(row=2, column=8, value=now)
-            output_ws.cell(row=2, column=9, value="request")
-            output_ws.cell(row=2, column=10, value=False)
-            output_ws.cell(row=2, column=11, value=json.dumps([]))
-            output_ws.cell(row=2, column=12, value=0)
-            output_ws.cell(row=2, column=13, value=1)
-            output_ws.cell(row=2, column=14, value=False)
-            output_ws.cell(row=2, column=15, value=None)
-            
-            output_wb.save(output_file)
+        if used_defaults:
             print("Created sample request")
+        return count
     except Exception as e:
         print(f"Error importing requests: {e}")
 
+# Sheets imported from the source file, each into its own output workbook
+SHEET_IMPORTS = [
+    ("Departments", import_departments),
+    ("Users", import_users),
+    ("Requests", import_requests),
+]
+
+def run_sheet_import(excel_file, sheet_name, output_path):
+    """Import one sheet in a worker, opening the source file independently.
+    
+    Output printed by the import function is captured and returned so the
+    parent can report each sheet as one block instead of interleaved lines.
+    """
+    import_function = dict(SHEET_IMPORTS)[sheet_name]
+    log = io.StringIO()
+    started = time.time()
+    count = None
+    
+    with contextlib.redirect_stdout(log):
+        try:
+            wb = openpyxl.load_workbook(excel_file, read_only=True)
+            try:
+                count = import_function(wb, output_path)
+            finally:
+                wb.close()
+        except Exception as e:
+            print(f"Error opening {excel_file} for {sheet_name}: {e}")
+    
+    return {
+        'sheet': sheet_name,
+        'rows': count,
+        'ok': count is not None,
+        'seconds': time.time() - started,
+        'log': log.getvalue()
+    }
+
+def run_imports(excel_file, output_path, jobs):
+    """Run every sheet import, in parallel when jobs > 1, reporting as each finishes."""
+    sheet_names = [sheet_name for sheet_name, _ in SHEET_IMPORTS]
+    results = []
+    
+    def report(result):
+        results.append(result)
+        status = "done" if result['ok'] else "FAILED"
+        rows = result['rows'] if result['ok'] else 0
+        print(f"[{len(results)}/{len(sheet_names)}] {result['sheet']} {status}: "
+              f"{rows} rows in {result['seconds']:.2f}s")
+        for line in result['log'].splitlines():
+            print(f"    {line}")
+    
+    if jobs > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=min(jobs, len(sheet_names))) as pool:
+                futures = {pool.submit(run_sheet_import, excel_file, sheet_name, output_path): sheet_name
+                           for sheet_name in sheet_names}
+                for future in as_completed(futures):
+                    try:
+                        report(future.result())
+                    except Exception as e:
+                        report({'sheet': futures[future], 'rows': None, 'ok': False,
+                                'seconds': 0.0, 'log': f"Worker failed: {e}"})
+            return results
+        except (OSError, NotImplementedError) as e:
+            # Some sandboxes cannot start worker processes; import in-process instead
+            print(f"Process pool unavailable ({e}), importing sheets sequentially")
+            results = []
+    
+    for sheet_name in sheet_names:
+        report(run_sheet_import(excel_file, sheet_name, output_path))
+    return results
+
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python import_excel_data.py <excel_file_path>")
+    args = sys.argv[1:]
+    jobs = os.cpu_count() or 1
+    if '--jobs' in args:
+        idx = args.index('--jobs')
+        try:
+            jobs = max(int(args[idx + 1]), 1)
+        except (IndexError, ValueError):
+            print("--jobs expects a number")
+            sys.exit(1)
+        del args[idx:idx + 2]
+    
+    if len(args) != 1:
+        print("Usage: python import_excel_data.py <excel_file_path> [--jobs N]")
         sys.exit(1)
 
-    excel_file = sys.argv[1]
+    excel_file = args[0]
     output_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'excel')
     
     print(f"Excel input file: {excel_file}")
@@ -172,23 +249,20 @@ def main():
         print(f"Created output directory: {output_path}")
 
     try:
-        # Load Excel workbook
-        print(f"Loading Excel file: {excel_file}")
-        wb = openpyxl.load_workbook(excel_file)
+        # Each worker streams its own sheet; missing sheets fall back to defaults
+        print(f"Importing {len(SHEET_IMPORTS)} sheets from {excel_file} with up to {jobs} workers")
+        started = time.time()
+        results = run_imports(excel_file, output_path, jobs)
         
-        # Check if required sheets exist, if not create them
-        required_sheets = ["Departments", "Users", "Requests"]
-        for sheet_name in required_sheets:
-            if sheet_name not in wb.sheetnames:
-                print(f"Sheet {sheet_name} not found, creating...")
-                wb.create_sheet(sheet_name)
+        failed = [result['sheet'] for result in results if not result['ok']]
+        total_rows = sum(result['rows'] or 0 for result in results)
+        print(f"\nImported {total_rows} rows in {time.time() - started:.2f}s")
         
-        # Import data
-        import_departments(wb, output_path)
-        import_users(wb, output_path)
-        import_requests(wb, output_path)
+        if failed:
+            print(f"Import failed for: {', '.join(failed)}")
+            sys.exit(1)
         
-        print("\nImport completed successfully!")
+        print("Import completed successfully!")
         print(f"Data files have been created in: {output_path}")
 
     except Exception as e:
@@ -46,8 +46,87 @@ if (needsInitialization) {
   });
 }
 
+// Excel operations go to one long-running Python worker ('serve' mode) so its
+// caches stay warm between calls; set EXCEL_WORKER=0 to spawn a process per call
+const USE_WORKER = process.env.EXCEL_WORKER !== '0';
+let worker = null;
+let nextMessageId = 1;
+
+const startWorker = () => {
+  const scriptPath = path.join(__dirname, '..', 'scripts', 'excel_operations.py');
+  const child = spawn('python', [scriptPath, 'serve']);
+  child.pending = new Map();
+  
+  let buffer = '';
+  child.stdout.on('data', (data) => {
+    buffer += data.toString();
+    let newline;
+    while ((newline = buffer.indexOf('\n')) >= 0) {
+      const line = buffer.slice(0, newline);
+      buffer = buffer.slice(newline + 1);
+      if (!line.trim()) continue;
+      
+      let message;
+      try {
+        message = JSON.parse(line);
+      } catch (error) {
+        console.error('Failed to parse Python worker output:', line);
+        continue;
+      }
+      
+      const call = child.pending.get(message.id);
+      if (!call) continue;
+      child.pending.delete(message.id);
+      if (message.error !== undefined) {
+        call.reject(new Error(message.error));
+      } else {
+        call.resolve(message.result);
+      }
+    }
+  });
+  
+  child.stderr.on('data', (data) => {
+    console.error(`Python error: ${data.toString()}`);
+  });
+  
+  // A failed write means the worker is gone; 'close' rejects the pending calls
+  child.stdin.on('error', () => {});
+  child.on('error', (error) => {
+    console.error('Python worker failed:', error);
+  });
+  
+  child.on('close', (code) => {
+    console.error(`Python worker exited with code ${code}`);
+    if (worker === child) {
+      worker = null;
+    }
+    for (const call of child.pending.values()) {
+      call.reject(new Error(`Python worker exited with code ${code}`));
+    }
+    child.pending.clear();
+  });
+  
+  return child;
+};
+
+const callWorker = (args) => {
+  return new Promise((resolve, reject) => {
+    if (!worker) {
+      worker = startWorker();
+    }
+    
+    const id = nextMessageId++;
+    worker.pending.set(id, { resolve, reject });
+    worker.stdin.write(JSON.stringify({ id, args }) + '\n');
+  });
+};
+
 // Helper function to run Python scripts for Excel operations
 const runPythonScript = (scriptName, args = []) => {
+  if (USE_WORKER && scriptName === 'excel_operations.py') {
+    return callWorker(args);
+  }
+  
   return new Promise((resolve, reject) => {
     const scriptPath = path.join(__dirname, '..', 'scripts', scriptName);
     const pythonProcess = spawn('python', [scriptPath, ...args]);
@@ -81,27 +160,54 @@ const runPythonScript = (scriptName, args = []) => {
   });
 };
 
+// Read operations take an optional tag; when one is passed (even '') they
+// resolve to { tag, notModified, data } instead of the bare result
+const conditionalArgs = (ifNoneMatch) => {
+  return ifNoneMatch === undefined ? [] : ['--if-none-match', ifNoneMatch];
+};
+
 // User operations
-const getUsers = async () => {
-  return runPythonScript('excel_operations.py', ['get_users']);
+const getUsers = async (ifNoneMatch) => {
+  return runPythonScript('excel_operations.py', ['get_users', ...conditionalArgs(ifNoneMatch)]);
 };
 
 const loginUser = async (username, password) => {
   return runPythonScript('excel_operations.py', ['login_user', username, password || '']);
 };
 
+const resolveSession = async (token) => {
+  return runPythonScript('excel_operations.py', ['resolve_session', token]);
+};
+
+const endSession = async (token) => {
+  return runPythonScript('excel_operations.py', ['end_session', token]);
+};
+
 const updateUser = async (userId, userData) => {
   return runPythonScript('excel_operations.py', ['update_user', userId, JSON.stringify(userData)]);
 };
 
 // Department operations
-const getDepartments = async () => {
-  return runPythonScript('excel_operations.py', ['get_departments']);
+const getDepartments = async (ifNoneMatch) => {
+  return runPythonScript('excel_operations.py', ['get_departments', ...conditionalArgs(ifNoneMatch)]);
 };
 
 // Request operations
-const getRequests = async () => {
-  return runPythonScript('excel_operations.py', ['get_requests']);
+// Archived requests are only read from the archive workbook when asked for
+const archivedArgs = (includeArchived) => {
+  return includeArchived ? ['--include-archived'] : [];
+};
+
+const getRequests = async (ifNoneMatch, includeArchived = false) => {
+  return runPythonScript('excel_operations.py', ['get_requests', ...conditionalArgs(ifNoneMatch), ...archivedArgs(includeArchived)]);
+};
+
+const getRequestsSince = async (version) => {
+  return runPythonScript('excel_operations.py', ['get_requests_since', String(version)]);
+};
+
+const getRequestStats = async () => {
+  return runPythonScript('excel_operations.py', ['get_request_stats']);
 };
 
 const createRequest = async (requestData) => {
@@ -132,22 +238,40 @@ const rejectRequest = async (requestId, username, reason = '') => {
   return runPythonScript('excel_operations.py', ['reject_request', requestId, username, reason]);
 };
 
-const getUserRequests = async (username) => {
-  return runPythonScript('excel_operations.py', ['get_user_requests', username]);
+const getUserRequests = async (username, includeArchived = false) => {
+  return runPythonScript('excel_operations.py', ['get_user_requests', username, ...archivedArgs(includeArchived)]);
 };
 
-const filterRequests = async (filters) => {
-  return runPythonScript('excel_operations.py', ['filter_requests', JSON.stringify(filters)]);
+const filterRequests = async (filters, ifNoneMatch) => {
+  return runPythonScript('excel_operations.py', ['filter_requests', JSON.stringify(filters), ...conditionalArgs(ifNoneMatch)]);
+};
+
+const explainFilterRequests = async (filters) => {
+  return runPythonScript('excel_operations.py', ['explain_filter_requests', JSON.stringify(filters)]);
 };
 
 const checkExpiredRequests = async () => {
   return runPythonScript('excel_operations.py', ['check_expired_requests']);
 };
 
+const queryRetainedRequests = async (query) => {
+  return runPythonScript('excel_operations.py', ['query_retained_requests', JSON.stringify(query)]);
+};
+
+const getResultCacheStats = async () => {
+  return runPythonScript('excel_operations.py', ['get_result_cache_stats']);
+};
+
 const canUserAcceptRequest = async (requestId, username, department) => {
   return runPythonScript('excel_operations.py', ['can_user_accept_request', requestId, username, department]);
 };
 
+// requestIds is a list of ids or 'all_pending'
+const canUserAcceptRequests = async (requestIds, username, department) => {
+  const ids = requestIds === 'all_pending' ? requestIds : JSON.stringify(requestIds);
+  return runPythonScript('excel_operations.py', ['can_user_accept_requests', ids, username, department]);
+};
+
 // Archive request
 const archiveRequest = async (requestId) => {
   return runPythonScript('excel_operations.py', ['archive_request', requestId]);
@@ -161,9 +285,13 @@ const unarchiveRequest = async (requestId) => {
 module.exports = {
   getUsers,
   loginUser,
+  resolveSession,
+  endSession,
   updateUser,
   getDepartments,
   getRequests,
+  getRequestsSince,
+  getRequestStats,
   createRequest,
   updateRequest,
   deleteRequest,
@@ -173,8 +301,12 @@ module.exports = {
   rejectRequest,
   getUserRequests,
   filterRequests,
+  explainFilterRequests,
   checkExpiredRequests,
+  queryRetainedRequests,
+  getResultCacheStats,
   canUserAcceptRequest,
+  canUserAcceptRequests,
   archiveRequest,
   unarchiveRequest
 };
@@ -86,11 +86,35 @@ initializeData();
 // Create data access modules
 const dataAccess = require('./data-access');
 
+// Tag the client already holds, taken from the If-None-Match header
+const getIfNoneMatch = (req) => {
+  const header = req.get('If-None-Match') || '';
+  return header.replace(/^W\//, '').replace(/"/g, '');
+};
+
+// Send a conditional read result as 304 or as JSON tagged with an ETag
+const sendTagged = (res, result) => {
+  if (result.tag) {
+    res.set('ETag', `"${result.tag}"`);
+  }
+  if (result.notModified) {
+    res.status(304).end();
+  } else {
+    res.json(result.data);
+  }
+};
+
+// Session token from an 'Authorization: Bearer <token>' header
+const getSessionToken = (req) => {
+  const match = /^Bearer\s+(.+)$/i.exec(req.get('Authorization') || '');
+  return match ? match[1].trim() : null;
+};
+
 // User routes
 app.get('/api/users', async (req, res) => {
   try {
-    const users = await dataAccess.getUsers();
-    res.json(users);
+    const result = await dataAccess.getUsers(getIfNoneMatch(req));
+    sendTagged(res, result);
   } catch (error) {
     res.status(500).json({ error: error.message });
   }
@@ -110,6 +134,30 @@ app.post('/api/users/login', async (req, res) => {
   }
 });
 
+app.get('/api/users/session', async (req, res) => {
+  try {
+    const token = getSessionToken(req);
+    const session = token ? await dataAccess.resolveSession(token) : null;
+    if (session) {
+      res.json(session);
+    } else {
+      res.status(401).json({ error: 'Invalid or expired session' });
+    }
+  } catch (error) {
+    res.status(500).json({ error: error.message });
+  }
+});
+
+app.post('/api/users/logout', async (req, res) => {
+  try {
+    const token = getSessionToken(req);
+    const result = token ? await dataAccess.endSession(token) : { success: false };
+    res.json(result);
+  } catch (error) {
+    res.status(500).json({ error: error.message });
+  }
+});
+
 app.put('/api/users/:id', async (req, res) => {
   try {
     const { id } = req.params;
@@ -123,8 +171,8 @@ app.put('/api/users/:id', async (req, res) => {
 // Department routes
 app.get('/api/departments', async (req, res) => {
   try {
-    const departments = await dataAccess.getDepartments();
-    res.json(departments);
+    const result = await dataAccess.getDepartments(getIfNoneMatch(req));
+    sendTagged(res, result);
   } catch (error) {
     res.status(500).json({ error: error.message });
   }
@@ -133,14 +181,58 @@ app.get('/api/departments', async (req, res) => {
 // Request routes
 app.get('/api/requests', async (req, res) => {
   try {
-    const requests = await dataAccess.getRequests();
-    res.json(requests);
+    const includeArchived = req.query.includeArchived === 'true';
+    const result = await dataAccess.getRequests(getIfNoneMatch(req), includeArchived);
+    sendTagged(res, result);
   } catch (error) {
     console.error('Error getting requests:', error);
     res.status(500).json({ error: error.message });
   }
 });
 
+app.get('/api/requests/changes', async (req, res) => {
+  try {
+    const since = parseInt(req.query.since, 10) || 0;
+    const changes = await dataAccess.getRequestsSince(since);
+    res.json(changes);
+  } catch (error) {
+    console.error('Error getting request changes:', error);
+    res.status(500).json({ error: error.message });
+  }
+});
+
+app.get('/api/requests/retained', async (req, res) => {
+  try {
+    const { id, from, to, field, limit } = req.query;
+    const result = await dataAccess.queryRetainedRequests({ id, from, to, field, limit });
+    res.json(result);
+  } catch (error) {
+    console.error('Error querying retained requests:', error);
+    res.status(500).json({ error: error.message });
+  }
+});
+
+// Counters of the worker's result cache, for tuning EXCEL_RESULT_CACHE_ENTRIES/_MB
+app.get('/api/requests/cache-stats', async (req, res) => {
+  try {
+    const stats = await dataAccess.getResultCacheStats();
+    res.json(stats);
+  } catch (error) {
+    console.error('Error getting result cache stats:', error);
+    res.status(500).json({ error: error.message });
+  }
+});
+
+app.get('/api/requests/stats', async (req, res) => {
+  try {
+    const stats = await dataAccess.getRequestStats();
+    res.json(stats);
+  } catch (error) {
+    console.error('Error getting request stats:', error);
+    res.status(500).json({ error: error.message });
+  }
+});
+
 app.post('/api/requests', async (req, res) => {
   try {
     const newRequest = await dataAccess.createRequest(req.body);
@@ -249,7 +341,8 @@ app.post('/api/requests/:id/unarchive', async (req, res) => {
 app.get('/api/requests/user/:username', async (req, res) => {
   try {
     const { username } = req.params;
-    const requests = await dataAccess.getUserRequests(username);
+    const includeArchived = req.query.includeArchived === 'true';
+    const requests = await dataAccess.getUserRequests(username, includeArchived);
     res.json(requests);
   } catch (error) {
     res.status(500).json({ error: error.message });
@@ -259,8 +352,18 @@ app.get('/api/requests/user/:username', async (req, res) => {
 app.get('/api/requests/filter', async (req, res) => {
   try {
     const filters = req.query;
-    const requests = await dataAccess.filterRequests(filters);
-    res.json(requests);
+    const result = await dataAccess.filterRequests(filters, getIfNoneMatch(req));
+    sendTagged(res, result);
+  } catch (error) {
+    res.status(500).json({ error: error.message });
+  }
+});
+
+// Plan the worker would use for the same filters (driving index, residual checks, estimates)
+app.get('/api/requests/filter/explain', async (req, res) => {
+  try {
+    const plan = await dataAccess.explainFilterRequests(req.query);
+    res.json(plan);
   } catch (error) {
     res.status(500).json({ error: error.message });
   }
@@ -276,11 +379,44 @@ app.post('/api/requests/check-expiration', async (req, res) => {
   }
 });
 
+// Can user accept many requests ({ ids: [...] | 'all_pending', username, department })
+app.post('/api/requests/can-accept', async (req, res) => {
+  try {
+    let { ids = 'all_pending', username, department } = req.body;
+    
+    // A session token takes precedence over the user data sent by the client
+    const token = getSessionToken(req);
+    if (token) {
+      const session = await dataAccess.resolveSession(token);
+      if (!session) {
+        return res.status(401).json({ error: 'Invalid or expired session' });
+      }
+      ({ username, department } = session);
+    }
+    
+    const result = await dataAccess.canUserAcceptRequests(ids, username, department);
+    res.json(result);
+  } catch (error) {
+    res.status(500).json({ error: error.message });
+  }
+});
+
 // Can user accept
 app.post('/api/requests/:id/can-accept', async (req, res) => {
   try {
     const { id } = req.params;
-    const { username, department } = req.body;
+    let { username, department } = req.body;
+    
+    // A session token takes precedence over the user data sent by the client
+    const token = getSessionToken(req);
+    if (token) {
+      const session = await dataAccess.resolveSession(token);
+      if (!session) {
+        return res.status(401).json({ error: 'Invalid or expired session' });
+      }
+      ({ username, department } = session);
+    }
+    
     const result = await dataAccess.canUserAcceptRequest(id, username, department);
     res.json(result);
   } catch (error) {
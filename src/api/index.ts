@@ -83,6 +83,27 @@ export const api = {
     }
   },
   
+  // Rows created/updated after `version`, plus ids deleted since then
+  getRequestsSince: async (version: number) => {
+    try {
+      const response = await fetch(`${API_URL}/requests/changes?since=${version}`);
+      return handleResponse(response);
+    } catch (error) {
+      console.error("API getRequestsSince error:", error);
+      throw error;
+    }
+  },
+  
+  getRequestStats: async () => {
+    try {
+      const response = await fetch(`${API_URL}/requests/stats`);
+      return handleResponse(response);
+    } catch (error) {
+      console.error("API getRequestStats error:", error);
+      throw error;
+    }
+  },
+  
   createRequest: async (requestData: any) => {
     try {
       const response = await fetch(`${API_URL}/requests`, {
@@ -375,7 +396,8 @@ export const api = {
   
   getUserRequests: async (username: string) => {
     try {
-      const response = await fetch(`${API_URL}/requests/user/${username}`);
+      // The profile page lists archived items too, so include the archive tier
+      const response = await fetch(`${API_URL}/requests/user/${username}?includeArchived=true`);
       return handleResponse(response);
     } catch (error) {
       console.error("API getUserRequests error:", error);
@@ -457,6 +479,21 @@ export const api = {
     }
   },
   
+  // Check many requests at once; ids may be "all_pending"
+  canUserAcceptRequests: async (ids: string[] | "all_pending", username: string, department: string) => {
+    try {
+      const response = await fetch(`${API_URL}/requests/can-accept`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ ids, username, department })
+      });
+      return handleResponse(response);
+    } catch (error) {
+      console.error("API canUserAcceptRequests error:", error);
+      throw error;
+    }
+  },
+  
   // Archive request
   archiveRequest: async (requestId: string) => {
     try {
@@ -381,7 +381,7 @@ export const useRequests = () => {
   const handleArchive = async (id: string) => {
     try {
       // Call API to archive the request
-      await api.updateRequest(id, { archived: true, archivedAt: new Date().toISOString() });
+      await api.archiveRequest(id);
       
       // Update local state
       const updatedRequests = requests.filter(r => r.id !== id);